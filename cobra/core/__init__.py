@@ -6,6 +6,8 @@ from cobra.core.dictlist import DictList
 from cobra.core.gene import Gene
 from cobra.core.metabolite import Metabolite
 from cobra.core.model import Model
+from cobra.core.compactmodel import (
+    CompactMetabolite, CompactModel, CompactReaction)
 from cobra.core.object import Object
 from cobra.core.reaction import Reaction
 from cobra.core.solution import Solution, LegacySolution, get_solution
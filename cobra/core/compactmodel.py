@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+
+"""Provides a memory efficient, array based representation of models."""
+
+from __future__ import absolute_import
+
+import numpy as np
+
+from cobra.core.gene import Gene
+from cobra.core.metabolite import Metabolite
+from cobra.core.model import Model
+from cobra.core.reaction import Reaction
+from cobra.util.solver import linear_reaction_coefficients
+
+REACTION_FIELDS = ("id", "name", "subsystem", "gene_reaction_rule")
+METABOLITE_FIELDS = ("id", "name", "formula", "charge", "compartment")
+GENE_FIELDS = ("id", "name", "functional")
+
+
+class CompactModel(object):
+    """A memory efficient representation of a model based on arrays.
+
+    Bounds and objective coefficients are stored in numpy arrays and the
+    stoichiometry in the compressed column arrays of `Model.S`. Identifiers,
+    names and other fields are kept in tuples that share their strings with
+    the original model. Reactions and metabolites are accessed through
+    `CompactReaction` and `CompactMetabolite` views which only hold the
+    model and an index. A compact model has no solver, use `to_model` to
+    get a `cobra.Model` for optimization.
+
+    Parameters
+    ----------
+    model : cobra.Model
+        The model to represent.
+
+    Attributes
+    ----------
+    lower_bounds, upper_bounds, objective_coefficients : numpy.ndarray
+        The bounds and objective coefficients of the reactions.
+    objective_direction : string
+        Either "max" or "min".
+    data, indices, indptr : numpy.ndarray
+        The stoichiometric matrix in compressed column format as used by
+        `scipy.sparse.csc_matrix`. The arrays are read-only.
+
+    Notes
+    -----
+    `copy` shares everything but the bounds and objective coefficients with
+    the original, which makes it cheap to keep many variants of a model,
+    for instance a library of knockout strains, in memory.
+    """
+
+    __slots__ = ("id", "name", "lower_bounds", "upper_bounds",
+                 "objective_coefficients", "objective_direction", "data",
+                 "indices", "indptr", "_reactions", "_metabolites", "_genes",
+                 "_extra", "_index")
+
+    def __init__(self, model):
+        self.id = model.id
+        self.name = model.name
+        reactions = model.reactions
+        self._reactions = {field: tuple(getattr(rxn, field)
+                                        for rxn in reactions)
+                           for field in REACTION_FIELDS}
+        self._metabolites = {field: tuple(getattr(met, field)
+                                          for met in model.metabolites)
+                             for field in METABOLITE_FIELDS}
+        self._genes = {field: tuple(getattr(gene, field)
+                                    for gene in model.genes)
+                       for field in GENE_FIELDS}
+        bounds = np.array([rxn.bounds for rxn in reactions],
+                          dtype=float).reshape(-1, 2)
+        self.lower_bounds = bounds[:, 0].copy()
+        self.upper_bounds = bounds[:, 1].copy()
+        coefficients = linear_reaction_coefficients(model)
+        self.objective_coefficients = np.array(
+            [coefficients.get(rxn, 0.0) for rxn in reactions])
+        self.objective_direction = model.solver.objective.direction
+        # read-only views share the arrays with the model's matrix
+        stoichiometry = model.S
+        self.data = stoichiometry.data.view()
+        self.indices = stoichiometry.indices.view()
+        self.indptr = stoichiometry.indptr.view()
+        for array in (self.data, self.indices, self.indptr):
+            array.flags.writeable = False
+        # only non-empty notes, annotations and the compartment names
+        extra = {}
+        for kind, objects in (("reaction", reactions),
+                              ("metabolite", model.metabolites),
+                              ("gene", model.genes)):
+            for i, obj in enumerate(objects):
+                for attr in ("notes", "annotation"):
+                    value = getattr(obj, attr)
+                    if value:
+                        extra[kind, i, attr] = dict(value)
+        extra["compartments"] = dict(model.compartments)
+        self._extra = extra
+        self._index = None
+
+    def __repr__(self):
+        return "<%s %s at 0x%x>" % (self.__class__.__name__, self.id,
+                                    id(self))
+
+    @property
+    def reactions(self):
+        """A list with a view on every reaction."""
+        return [CompactReaction(self, j)
+                for j in range(len(self.lower_bounds))]
+
+    @property
+    def metabolites(self):
+        """A list with a view on every metabolite."""
+        return [CompactMetabolite(self, i)
+                for i in range(len(self._metabolites["id"]))]
+
+    def _position(self, kind, id):
+        """get the position of a reaction or metabolite id"""
+        if self._index is None:
+            self._index = {
+                kind: {the_id: i for i, the_id in enumerate(fields["id"])}
+                for kind, fields in (("reaction", self._reactions),
+                                     ("metabolite", self._metabolites))}
+        return self._index[kind][id]
+
+    def get_reaction(self, id):
+        """Get the view on the reaction with an id."""
+        return CompactReaction(self, self._position("reaction", id))
+
+    def get_metabolite(self, id):
+        """Get the view on the metabolite with an id."""
+        return CompactMetabolite(self, self._position("metabolite", id))
+
+    def copy(self):
+        """Get a copy with its own bounds and objective coefficients.
+
+        All other fields and arrays are shared with this model.
+        """
+        new = self.__class__.__new__(self.__class__)
+        for attr in self.__slots__:
+            setattr(new, attr, getattr(self, attr))
+        new.lower_bounds = self.lower_bounds.copy()
+        new.upper_bounds = self.upper_bounds.copy()
+        new.objective_coefficients = self.objective_coefficients.copy()
+        return new
+
+    def to_model(self):
+        """Build a `cobra.Model` from the compact representation.
+
+        Returns
+        -------
+        cobra.Model
+            A new model with its own reactions, metabolites, genes and
+            solver.
+        """
+        model = Model(self.id, name=self.name)
+        model.compartments = dict(self._extra["compartments"])
+        fields = self._metabolites
+        metabolites = [
+            Metabolite(the_id, formula=formula, name=name, charge=charge,
+                       compartment=compartment)
+            for the_id, name, formula, charge, compartment in zip(
+                *(fields[field] for field in METABOLITE_FIELDS))]
+        self._set_extra("metabolite", metabolites)
+        model.add_metabolites(metabolites)
+
+        fields = self._reactions
+        reactions = []
+        for j, (the_id, name, subsystem, rule) in enumerate(zip(
+                *(fields[field] for field in REACTION_FIELDS))):
+            reaction = Reaction(the_id, name=name, subsystem=subsystem,
+                                lower_bound=self.lower_bounds[j],
+                                upper_bound=self.upper_bounds[j])
+            start, stop = self.indptr[j], self.indptr[j + 1]
+            reaction.add_metabolites(
+                {metabolites[i]: coefficient for i, coefficient in zip(
+                    self.indices[start:stop].tolist(),
+                    self.data[start:stop].tolist())})
+            reaction.gene_reaction_rule = rule
+            reactions.append(reaction)
+        self._set_extra("reaction", reactions)
+        model.add_reactions(reactions)
+
+        fields = self._genes
+        genes = []
+        for the_id, name, functional in zip(
+                *(fields[field] for field in GENE_FIELDS)):
+            if the_id in model.genes:
+                gene = model.genes.get_by_id(the_id)
+                gene.name = name
+                gene.functional = functional
+            else:
+                gene = Gene(the_id, name=name, functional=functional)
+                model.genes.append(gene)
+                gene._model = model
+            genes.append(gene)
+        self._set_extra("gene", genes)
+
+        model.objective = {
+            reactions[j]: self.objective_coefficients[j]
+            for j in np.flatnonzero(self.objective_coefficients)}
+        model.objective.direction = self.objective_direction
+        return model
+
+    def _set_extra(self, kind, objects):
+        """copy the stored notes and annotations to new objects"""
+        extra = self._extra
+        for i, obj in enumerate(objects):
+            for attr in ("notes", "annotation"):
+                if (kind, i, attr) in extra:
+                    setattr(obj, attr, dict(extra[kind, i, attr]))
+
+
+class _CompactView(object):
+    """A view on a reaction or metabolite of a `CompactModel`."""
+
+    __slots__ = ("model", "index")
+    _kind = None
+
+    def __init__(self, model, index):
+        self.model = model
+        self.index = index
+
+    def _field(self, field):
+        fields = getattr(self.model, "_%ss" % self._kind)
+        return fields[field][self.index]
+
+    @property
+    def id(self):
+        return self._field("id")
+
+    @property
+    def name(self):
+        return self._field("name")
+
+    @property
+    def notes(self):
+        return self.model._extra.get((self._kind, self.index, "notes"), {})
+
+    @property
+    def annotation(self):
+        return self.model._extra.get(
+            (self._kind, self.index, "annotation"), {})
+
+    def __eq__(self, other):
+        return self.__class__ is other.__class__ and \
+            self.model is other.model and self.index == other.index
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.model), self.index))
+
+    def __repr__(self):
+        return "<%s %s at 0x%x>" % (self.__class__.__name__, self.id,
+                                    id(self))
+
+    def __str__(self):
+        return str(self.id)
+
+
+class CompactReaction(_CompactView):
+    """A view on a reaction of a `CompactModel`.
+
+    Bounds and the objective coefficient can be changed and are written to
+    the arrays of the compact model. All other fields are read-only.
+    """
+
+    __slots__ = ()
+    _kind = "reaction"
+
+    @property
+    def subsystem(self):
+        return self._field("subsystem")
+
+    @property
+    def gene_reaction_rule(self):
+        return self._field("gene_reaction_rule")
+
+    @property
+    def lower_bound(self):
+        return float(self.model.lower_bounds[self.index])
+
+    @lower_bound.setter
+    def lower_bound(self, value):
+        self.model.lower_bounds[self.index] = value
+
+    @property
+    def upper_bound(self):
+        return float(self.model.upper_bounds[self.index])
+
+    @upper_bound.setter
+    def upper_bound(self, value):
+        self.model.upper_bounds[self.index] = value
+
+    @property
+    def bounds(self):
+        return self.lower_bound, self.upper_bound
+
+    @bounds.setter
+    def bounds(self, value):
+        self.lower_bound, self.upper_bound = value
+
+    @property
+    def objective_coefficient(self):
+        return float(self.model.objective_coefficients[self.index])
+
+    @objective_coefficient.setter
+    def objective_coefficient(self, value):
+        self.model.objective_coefficients[self.index] = value
+
+    @property
+    def metabolites(self):
+        """A new dictionary of metabolite views and their coefficients."""
+        model = self.model
+        start, stop = model.indptr[self.index], model.indptr[self.index + 1]
+        return {CompactMetabolite(model, i): coefficient
+                for i, coefficient in zip(model.indices[start:stop].tolist(),
+                                          model.data[start:stop].tolist())}
+
+    @property
+    def boundary(self):
+        model = self.model
+        return model.indptr[self.index + 1] - model.indptr[self.index] == 1
+
+
+class CompactMetabolite(_CompactView):
+    """A read-only view on a metabolite of a `CompactModel`."""
+
+    __slots__ = ()
+    _kind = "metabolite"
+
+    @property
+    def formula(self):
+        return self._field("formula")
+
+    @property
+    def charge(self):
+        return self._field("charge")
+
+    @property
+    def compartment(self):
+        return self._field("compartment")
+
+    @property
+    def reactions(self):
+        """A frozenset with the views of the reactions of the metabolite."""
+        model = self.model
+        entries = np.flatnonzero(model.indices == self.index)
+        columns = np.searchsorted(model.indptr, entries, side="right") - 1
+        return frozenset(CompactReaction(model, j) for j in columns.tolist())
@@ -3,10 +3,111 @@
 from __future__ import absolute_import
 
 import re
+from bisect import bisect_left, insort
 from itertools import islice
+from weakref import WeakValueDictionary
 
 from numpy import bool_
-from six import PY3, iteritems, string_types
+from six import PY3, iteritems, itervalues, string_types
+
+# DictLists with secondary indexes by the names of the indexed attributes and
+# the element classes watching each name for new values
+_INDEXED_LISTS = {}
+_WATCHED_CLASSES = {}
+INDEXED_ATTRIBUTES = set()
+_MISSING = object()
+
+
+def _attribute_name(attribute):
+    """get the name of the object attribute used by an index"""
+    return attribute.split(".", 1)[0]
+
+
+def _index_keys(obj, attribute):
+    """get the values under which obj is indexed for attribute"""
+    name, _, key = attribute.partition(".")
+    value = getattr(obj, name, None)
+    if key:
+        value = None if value is None else value.get(key)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return frozenset(value)
+    return frozenset((value,))
+
+
+def update_indexes(obj, name):
+    """update all secondary indexes on `name` after it was set on obj"""
+    lists = _INDEXED_LISTS.get(name)
+    if not lists:
+        # the last DictList indexing name was garbage collected
+        _unwatch(name)
+        return
+    for dict_list in list(lists.values()):
+        dict_list._update_indexes(obj, name)
+
+
+class _IndexedAttribute(object):
+    """An attribute updating the secondary indexes on it when it is set
+
+    Placed on the classes of indexed elements while an index on the
+    attribute exists. Properties of the class are wrapped, other values are
+    stored in the instance dictionary as usual.
+    """
+
+    def __init__(self, name, original):
+        self.name = name
+        self.original = original
+
+    def __get__(self, obj, cls=None):
+        original = self.original
+        if hasattr(original, "__set__"):
+            return original.__get__(obj, cls)
+        if obj is not None and self.name in obj.__dict__:
+            return obj.__dict__[self.name]
+        if hasattr(original, "__get__"):
+            return original.__get__(obj, cls)
+        if original is not _MISSING:
+            return original
+        if obj is None:
+            return self
+        raise AttributeError("'%s' object has no attribute '%s'" %
+                             (type(obj).__name__, self.name))
+
+    def __set__(self, obj, value):
+        if hasattr(self.original, "__set__"):
+            self.original.__set__(obj, value)
+        else:
+            obj.__dict__[self.name] = value
+        update_indexes(obj, self.name)
+
+
+def _watch(cls, name):
+    """make instances of cls update the indexes on name when it is set"""
+    for klass in cls.__mro__:
+        if name in vars(klass):
+            original = vars(klass)[name]
+            if isinstance(original, _IndexedAttribute):
+                return
+            break
+    else:
+        original = _MISSING
+    own = vars(cls).get(name, _MISSING)
+    try:
+        setattr(cls, name, _IndexedAttribute(name, original))
+    except TypeError:
+        # built-in types whose instances can not be changed anyway
+        return
+    _WATCHED_CLASSES.setdefault(name, []).append((cls, own))
+
+
+def _unwatch(name):
+    """restore the original attribute name on all watching classes"""
+    _INDEXED_LISTS.pop(name, None)
+    INDEXED_ATTRIBUTES.discard(name)
+    for cls, own in _WATCHED_CLASSES.pop(name, ()):
+        if own is _MISSING:
+            delattr(cls, name)
+        else:
+            setattr(cls, name, own)
 
 
 class DictList(list):
@@ -15,6 +116,15 @@ class DictList(list):
     This object behaves like a list, but has the O(1) speed
     benefits of a dict when looking up elements by their id.
 
+    Removing elements does not rebuild the index. Instead, the positions
+    of removed elements are remembered and subtracted when looking up an
+    element, and the index is only rebuilt once more elements have been
+    removed than remain in the list. Use `remove_many` to remove many
+    elements at once.
+
+    Secondary indexes on attributes of the elements can be declared with
+    `add_index` to speed up repeated queries on these attributes.
+
     Parameters
     ----------
     *args : iterable
@@ -26,11 +136,14 @@ class DictList(list):
             raise TypeError("takes at most 1 argument (%d given)" % len(args))
         super(DictList, self).__init__(self)
         self._dict = {}
+        self._removed = []
+        self._indexes = {}
         if len(args) == 1:
             other = args[0]
             if isinstance(other, DictList):
                 list.extend(self, other)
                 self._dict = other._dict.copy()
+                self._removed = list(other._removed)
             else:
                 self.extend(other)
 
@@ -48,10 +161,131 @@ class DictList(list):
     def _generate_index(self):
         """rebuild the _dict index"""
         self._dict = {v.id: k for k, v in enumerate(self)}
+        self._removed = []
+
+    def _position(self, id):
+        """get the current position of id from the _dict index
+
+        Positions in _dict are taken before the removals listed in
+        _removed, which are subtracted here.
+        """
+        position = self._dict[id]
+        if self._removed:
+            position -= bisect_left(self._removed, position)
+        return position
+
+    def _forget(self, id):
+        """remove id from the _dict index after its element was removed"""
+        position = self._dict.pop(id)
+        removed = self._removed
+        # the last position can be reused by the next appended element
+        if position != len(self) + len(removed):
+            insort(removed, position)
+            if len(removed) > len(self):
+                self._generate_index()
+
+    def add_index(self, attribute):
+        """Maintain a secondary index on an attribute of the elements
+
+        The index is kept up to date when elements are added or removed
+        and when the attribute of an element is set. `query` uses it to
+        match a string or regular expression against the distinct values
+        of the attribute instead of against every element.
+
+        Parameters
+        ----------
+        attribute : string
+            The name of the attribute. Use "name.key" to index the values of
+            `key` in a dictionary attribute, for instance
+            "annotation.bigg.reaction". Elements with a list of values are
+            indexed under each of them.
+
+        Notes
+        -----
+        Changes inside of a dictionary attribute such as
+        `reaction.annotation["bigg.reaction"] = "PGI"` are not noticed.
+        Call `add_index` again to rebuild the index after such changes.
+
+        Examples
+        --------
+        >>> import cobra.test
+        >>> model = cobra.test.create_test_model('textbook')
+        >>> model.metabolites.add_index('compartment')
+        >>> model.metabolites.query('^e$', 'compartment')
+        """
+        self._indexes[attribute] = ({}, {})
+        try:
+            self._index_add(self, [attribute])
+        except TypeError:
+            del self._indexes[attribute]
+            raise TypeError("values of %s can not be indexed" % attribute)
+        name = _attribute_name(attribute)
+        _INDEXED_LISTS.setdefault(name, WeakValueDictionary())[id(self)] = \
+            self
+        INDEXED_ATTRIBUTES.add(name)
+
+    def remove_index(self, attribute):
+        """Stop maintaining the secondary index on an attribute"""
+        del self._indexes[attribute]
+        name = _attribute_name(attribute)
+        if any(_attribute_name(a) == name for a in self._indexes):
+            return
+        lists = _INDEXED_LISTS.get(name, {})
+        lists.pop(id(self), None)
+        if not lists:
+            _unwatch(name)
+
+    def _index_add(self, objects, attributes=None):
+        """add objects to the secondary indexes"""
+        if attributes is None:
+            attributes = list(self._indexes)
+        objects = list(objects)
+        classes = set(type(obj) for obj in objects)
+        for attribute in attributes:
+            for cls in classes:
+                _watch(cls, _attribute_name(attribute))
+            keys_by_object, objects_by_key = self._indexes[attribute]
+            for obj in objects:
+                keys = _index_keys(obj, attribute)
+                for key in keys:
+                    objects_by_key.setdefault(key, {})[id(obj)] = obj
+                keys_by_object[id(obj)] = keys
+
+    def _index_remove(self, objects):
+        """remove objects from the secondary indexes"""
+        objects = list(objects)
+        for keys_by_object, objects_by_key in itervalues(self._indexes):
+            for obj in objects:
+                for key in keys_by_object.pop(id(obj), ()):
+                    matching = objects_by_key[key]
+                    del matching[id(obj)]
+                    if not matching:
+                        del objects_by_key[key]
+
+    def _update_indexes(self, obj, name):
+        """update the secondary indexes on name if obj is an element"""
+        for attribute, (keys_by_object, _) in iteritems(self._indexes):
+            # all indexes contain the same objects
+            if id(obj) not in keys_by_object:
+                return
+            if _attribute_name(attribute) == name:
+                self._index_remove([obj])
+                self._index_add([obj])
+                return
+
+    def _query_index(self, regex_searcher, attribute):
+        """get the elements with indexed values matching a regex"""
+        found = {}
+        for key, objects in iteritems(self._indexes[attribute][1]):
+            if isinstance(key, string_types) and \
+                    regex_searcher.findall(key) != []:
+                found.update(objects)
+        return sorted(itervalues(found),
+                      key=lambda obj: self._position(obj.id))
 
     def get_by_id(self, id):
         """return the element with a matching id"""
-        return list.__getitem__(self, self._dict[id])
+        return list.__getitem__(self, self._position(id))
 
     def list_attr(self, attribute):
         """return a list of the given attribute for every object"""
@@ -131,7 +365,10 @@ class DictList(list):
             # if the search_function is a regular expression
             regex_searcher = re.compile(search_function)
 
-            if attribute is not None:
+            if attribute in self._indexes:
+                matches = self._query_index(regex_searcher, attribute)
+
+            elif attribute is not None:
                 matches = (
                     i for i in self if
                     regex_searcher.findall(select_attribute(i)) != [])
@@ -153,7 +390,10 @@ class DictList(list):
     def _replace_on_id(self, new_object):
         """Replace an object by another with the same id."""
         the_id = new_object.id
-        the_index = self._dict[the_id]
+        the_index = self._position(the_id)
+        if self._indexes:
+            self._index_remove([self[the_index]])
+            self._index_add([new_object])
         list.__setitem__(self, the_index, new_object)
 
     # overriding default list functions with new ones
@@ -161,8 +401,10 @@ class DictList(list):
         """append object to end"""
         the_id = object.id
         self._check(the_id)
-        self._dict[the_id] = len(self)
+        self._dict[the_id] = len(self) + len(self._removed)
         list.append(self, object)
+        if self._indexes:
+            self._index_add([object])
 
     def union(self, iterable):
         """adds elements with id's not already in the model"""
@@ -181,14 +423,17 @@ class DictList(list):
         # the issue is caught and addressed here.
         if not hasattr(self, "_dict") or self._dict is None:
             self._dict = {}
+            self._removed = []
+            self._indexes = {}
         _dict = self._dict
         current_length = len(self)
+        offset = len(self._removed)
         list.extend(self, iterable)
         for i, obj in enumerate(islice(self, current_length, None),
                                 current_length):
             the_id = obj.id
             if the_id not in _dict:
-                _dict[the_id] = i
+                _dict[the_id] = i + offset
             else:
                 # undo the extend and raise an error
                 self = self[:current_length]
@@ -197,6 +442,8 @@ class DictList(list):
                 # twice in the list being added
                 raise ValueError("id '%s' at index %d is non-unique. "
                                  "Is it present twice?" % (str(the_id), i))
+        if self._indexes:
+            self._index_add(islice(self, current_length, None))
 
     def _extend_nocheck(self, iterable):
         """extends without checking for uniqueness
@@ -210,11 +457,13 @@ class DictList(list):
         current_length = len(self)
         list.extend(self, iterable)
         _dict = self._dict
+        if self._indexes:
+            self._index_add(islice(self, current_length, None))
         if current_length is 0:
             self._generate_index()
             return
         for i, obj in enumerate(islice(self, current_length, None),
-                                current_length):
+                                current_length + len(self._removed)):
             _dict[obj.id] = i
 
     def __sub__(self, other):
@@ -227,8 +476,7 @@ class DictList(list):
         """
         total = DictList()
         total.extend(self)
-        for item in other:
-            total.remove(item)
+        total.remove_many(other)
         return total
 
     def __isub__(self, other):
@@ -239,9 +487,7 @@ class DictList(list):
         other : iterable
             other must contain only unique id's present in the list
         """
-
-        for item in other:
-            self.remove(item)
+        self.remove_many(other)
         return self
 
     def __add__(self, other):
@@ -281,7 +527,7 @@ class DictList(list):
         This is only provided for backwards compatibility so older
         versions of cobrapy can load pickles generated with cobrapy. In
         reality, the "_dict" state is ignored when loading a pickle"""
-        return {"_dict": self._dict}
+        return {"_dict": self._dict, "_indexes": list(self._indexes)}
 
     def __setstate__(self, state):
         """sets internal state
@@ -290,6 +536,9 @@ class DictList(list):
         compatibility with older pickles which did not correctly specify
         the initialization class"""
         self._generate_index()
+        self._indexes = {}
+        for attribute in state.get("_indexes", ()):
+            self.add_index(attribute)
 
     def index(self, id, *args):
         """Determine the position in the list
@@ -300,11 +549,11 @@ class DictList(list):
         # because values are unique, start and stop are not relevant
         if isinstance(id, string_types):
             try:
-                return self._dict[id]
+                return self._position(id)
             except KeyError:
                 raise ValueError("%s not found" % id)
         try:
-            i = self._dict[id.id]
+            i = self._position(id.id)
             if self[i] is not id:
                 raise ValueError(
                     "Another object with the identical id (%s) found" % id.id)
@@ -329,12 +578,17 @@ class DictList(list):
         the_copy = DictList()
         list.extend(the_copy, self)
         the_copy._dict = self._dict.copy()
+        the_copy._removed = list(self._removed)
         return the_copy
 
     def insert(self, index, object):
         """insert object before index"""
         self._check(object.id)
+        if self._removed:
+            self._generate_index()
         list.insert(self, index, object)
+        if self._indexes:
+            self._index_add([object])
         # all subsequent entries now have been shifted up by 1
         _dict = self._dict
         for i, j in iteritems(_dict):
@@ -345,15 +599,9 @@ class DictList(list):
     def pop(self, *args):
         """remove and return item at index (default last)."""
         value = list.pop(self, *args)
-        index = self._dict.pop(value.id)
-        # If the pop occured from a location other than the end of the list,
-        # we will need to subtract 1 from every entry afterwards
-        if len(args) == 0 or args == [-1]:  # removing from the end of the list
-            return value
-        _dict = self._dict
-        for i, j in iteritems(_dict):
-            if j > index:
-                _dict[i] = j - 1
+        self._forget(value.id)
+        if self._indexes:
+            self._index_remove([value])
         return value
 
     def add(self, x):
@@ -366,6 +614,29 @@ class DictList(list):
         # It is much faster to do a dict lookup than n string comparisons
         self.pop(self.index(x))
 
+    def remove_many(self, iterable):
+        """remove several elements at once
+
+        Parameters
+        ----------
+        iterable : iterable
+            The elements or their ids. All of them must be in the list.
+            Nothing is removed if any of them is missing.
+        """
+        positions = sorted({self.index(x) for x in iterable}, reverse=True)
+        if self._indexes:
+            self._index_remove([self[i] for i in positions])
+        # few removals are cheaper one by one than rebuilding the index
+        if len(positions) * 64 < len(self):
+            for i in positions:
+                self._forget(list.pop(self, i).id)
+            return
+        positions = set(positions)
+        kept = [obj for i, obj in enumerate(self) if i not in positions]
+        list.__delitem__(self, slice(None))
+        list.extend(self, kept)
+        self._generate_index()
+
     # these functions are slower because they rebuild the _dict every time
     def reverse(self):
         """reverse *IN PLACE*"""
@@ -414,28 +685,35 @@ class DictList(list):
                 # Insert a temporary placeholder so we catch the presence
                 # of a duplicate in the items being added
                 self._dict[obj.id] = None
+            if self._indexes:
+                self._index_remove(list.__getitem__(self, i))
+                self._index_add(y)
             list.__setitem__(self, i, y)
             self._generate_index()
             return
+        if self._removed:
+            self._generate_index()
         # in case a rename has occured
         if self._dict.get(self[i].id) == i:
             self._dict.pop(self[i].id)
         the_id = y.id
         self._check(the_id)
+        if self._indexes:
+            self._index_remove([self[i]])
+            self._index_add([y])
         list.__setitem__(self, i, y)
         self._dict[the_id] = i
 
     def __delitem__(self, index):
         removed = self[index]
         list.__delitem__(self, index)
+        if self._indexes:
+            self._index_remove(
+                removed if isinstance(removed, list) else [removed])
         if isinstance(removed, list):
             self._generate_index()
             return
-        _dict = self._dict
-        _dict.pop(removed.id)
-        for i, j in iteritems(_dict):
-            if j > index:
-                _dict[i] = j - 1
+        self._forget(removed.id)
 
     def __getslice__(self, i, j):
         return self.__getitem__(slice(i, j))
@@ -456,6 +734,6 @@ class DictList(list):
     def __dir__(self):
         # override this to allow tab complete of items by their id
         attributes = dir(self.__class__)
-        attributes.append("_dict")
+        attributes.extend(["_dict", "_removed", "_indexes"])
         attributes.extend(self._dict.keys())
         return attributes
@@ -3,8 +3,10 @@
 from __future__ import absolute_import
 
 import types
+from collections import OrderedDict
 from copy import copy, deepcopy
 from functools import partial
+from importlib import import_module
 from warnings import warn
 
 import optlang
@@ -17,12 +19,14 @@ from cobra.core.dictlist import DictList
 from cobra.core.object import Object
 from cobra.core.reaction import separate_forward_and_reverse_bounds
 from cobra.core.solution import get_solution
+from cobra.exceptions import OptimizationError
 from cobra.solvers import optimize
+from cobra.util.array import StoichiometricMatrix
 from cobra.util.context import HistoryManager, resettable, get_context
 from cobra.util.solver import (
     SolverNotFound, get_solver_name, interface_to_str, set_objective, solvers,
     add_cons_vars_to_problem, remove_cons_vars_from_problem, choose_solver,
-    check_solver_status)
+    check_solver_status, BatchEdit)
 from cobra.util.util import AutoVivification
 
 
@@ -49,6 +53,8 @@ class Model(Object):
     genes : DictList
         A DictList where the key is the gene identifier and the value a
         Gene
+    S : cobra.util.array.StoichiometricMatrix
+        The cached stoichiometric matrix of the model.
     solution : Solution
         The last obtained solution from optimizing the model.
     """
@@ -56,6 +62,7 @@ class Model(Object):
     def __setstate__(self, state):
         """Make sure all cobra.Objects in the model point to the model"""
         self.__dict__.update(state)
+        self._stoichiometry = None
         for y in ['reactions', 'genes', 'metabolites']:
             for x in getattr(self, y):
                 x._model = self
@@ -64,6 +71,20 @@ class Model(Object):
         if not hasattr(self, "name"):
             self.name = None
 
+    def __getstate__(self):
+        """Get state for serialization.
+
+        Ensures that the context stack and any active batch edit are cleared
+        prior to serialization, since partial functions cannot be pickled
+        reliably.
+        """
+        odict = self.__dict__.copy()
+        odict['_contexts'] = []
+        odict['_batch'] = None
+        odict['_solution_cache'] = None
+        odict['_stoichiometry'] = None
+        return odict
+
     def __init__(self, id_or_model=None, name=None):
         if isinstance(id_or_model, Model):
             Object.__init__(self, name=name)
@@ -82,6 +103,9 @@ class Model(Object):
             # genes based on their ids {Gene.id: Gene}
             self.compartments = dict()
             self._contexts = []
+            self._batch = None
+            self._solution_cache = None
+            self._stoichiometry = None
 
             # from cameo ...
 
@@ -110,6 +134,10 @@ class Model(Object):
         >>> lb=0.99)
         >>> model.solver.add(new)
         """
+        if self._solver is None:
+            # a copy-on-write copy builds its solver on first use
+            self._solver = self._build_solver(self._solver_snapshot)
+            self._solver_snapshot = None
         return self._solver
 
     @solver.setter
@@ -137,7 +165,7 @@ class Model(Object):
 
         for reaction in self.reactions:
             reaction._reset_var_cache()
-        self._solver = interface.Model.clone(self._solver)
+        self._solver = interface.Model.clone(self.solver)
 
     @property
     def description(self):
@@ -243,21 +271,45 @@ class Model(Object):
         self.id = self.id + '_' + other_model.id
         return self
 
-    def copy(self):
+    def copy(self, copy_on_write=False):
         """Provides a partial 'deepcopy' of the Model.  All of the Metabolite,
         Gene, and Reaction objects are created anew but in a faster fashion
         than deepcopy
+
+        Parameters
+        ----------
+        copy_on_write : bool, optional
+            Whether to defer building the solver. The copy keeps the bounds,
+            the objective and the cached stoichiometric matrix of the model
+            and only builds its own solver from them when the solver is
+            first used, for instance when optimizing or changing bounds.
+            This makes copies much cheaper if they are only inspected or
+            edited structurally. Models whose solver holds additional
+            variables, constraints or a non-linear objective are copied
+            with their solver right away.
+
+        Notes
+        -----
+        The copy shares the arrays of the cached stoichiometric matrix and
+        all immutable attributes of the reactions with the original. The
+        arrays are replaced instead of changed once either model is
+        modified.
         """
+        snapshot = self._solver_snapshot_of() if copy_on_write else None
         new = self.__class__()
         do_not_copy_by_ref = {"metabolites", "reactions", "genes", "notes",
-                              "annotation"}
+                              "annotation", "_solution_cache", "_batch",
+                              "_stoichiometry", "_solver", "_solver_snapshot"}
         for attr in self.__dict__:
             if attr not in do_not_copy_by_ref:
                 new.__dict__[attr] = self.__dict__[attr]
         new.notes = deepcopy(self.notes)
         new.annotation = deepcopy(self.annotation)
 
+        # map the objects of this model to their copies to rebuild the
+        # associations without looking up ids, the lists keep the order
         new.metabolites = DictList()
+        new_metabolites = {}
         do_not_copy_by_ref = {"_reaction", "_model"}
         for metabolite in self.metabolites:
             new_met = metabolite.__class__()
@@ -266,9 +318,11 @@ class Model(Object):
                     new_met.__dict__[attr] = copy(
                         value) if attr == "formula" else value
             new_met._model = new
+            new_metabolites[metabolite] = new_met
             new.metabolites.append(new_met)
 
         new.genes = DictList()
+        new_genes = {}
         for gene in self.genes:
             new_gene = gene.__class__(None)
             for attr, value in iteritems(gene.__dict__):
@@ -276,29 +330,39 @@ class Model(Object):
                     new_gene.__dict__[attr] = copy(
                         value) if attr == "formula" else value
             new_gene._model = new
+            new_genes[gene] = new_gene
             new.genes.append(new_gene)
 
-        new.reactions = DictList()
+        new_reactions = []
         do_not_copy_by_ref = {"_model", "_metabolites", "_genes"}
         for reaction in self.reactions:
             new_reaction = reaction.__class__()
             for attr, value in iteritems(reaction.__dict__):
                 if attr not in do_not_copy_by_ref:
-                    new_reaction.__dict__[attr] = copy(value)
+                    # immutable values such as the gene reaction rule are
+                    # shared, containers get their own shallow copy
+                    new_reaction.__dict__[attr] = copy(value) if isinstance(
+                        value, (dict, list, set)) else value
             new_reaction._model = new
-            new.reactions.append(new_reaction)
+            new_reactions.append(new_reaction)
             # update awareness
             for metabolite, stoic in iteritems(reaction._metabolites):
-                new_met = new.metabolites.get_by_id(metabolite.id)
+                new_met = new_metabolites[metabolite]
                 new_reaction._metabolites[new_met] = stoic
                 new_met._reaction.add(new_reaction)
             for gene in reaction._genes:
-                new_gene = new.genes.get_by_id(gene.id)
+                new_gene = new_genes[gene]
                 new_reaction._genes.add(new_gene)
                 new_gene._reaction.add(new_reaction)
-
-        for reaction in new.reactions:
-            reaction._reset_var_cache()
+            new_reaction._reset_var_cache()
+        new.reactions = DictList(new_reactions)
+
+        if self._stoichiometry is not None:
+            new._stoichiometry = self._stoichiometry.copy(new)
+        if snapshot is not None:
+            new._solver_snapshot = snapshot
+            new._solver = None
+            return new
         try:
             new._solver = deepcopy(self.solver)
             # Cplex has an issue with deep copies
@@ -307,6 +371,88 @@ class Model(Object):
 
         return new
 
+    def _solver_snapshot_of(self):
+        """Describe the solver of the model for `_build_solver`.
+
+        The description consists of the stoichiometric matrix, the bounds of
+        the reactions and the objective, which is all a solver built by
+        cobrapy holds. It is None if the solver holds anything else.
+        """
+        if self._solver is None:
+            # the solver of an unchanged copy is still described
+            return self._solver_snapshot
+        solver = self.solver
+        if len(solver.variables) != 2 * len(self.reactions) or \
+                len(solver.constraints) != len(self.metabolites):
+            return None
+        objective = {}
+        for variable, coefficient in iteritems(
+                solver.objective.expression.as_coefficients_dict()):
+            if coefficient == 0:
+                continue
+            if not isinstance(variable, optlang.interface.Variable):
+                return None
+            objective[variable.name] = float(coefficient)
+        stoichiometry = self.S
+        return {
+            "interface": self.problem.__name__,
+            "configuration": solver.configuration.__getstate__(),
+            "reactions": [(rxn.id, rxn.reverse_id, rxn._lower_bound,
+                           rxn._upper_bound) for rxn in self.reactions],
+            "metabolites": [met.id for met in self.metabolites],
+            "constraint_bounds": {c.name: (c.lb, c.ub)
+                                  for c in solver.constraints
+                                  if c.lb != 0 or c.ub != 0},
+            "matrix": (stoichiometry.data, stoichiometry.indices,
+                       stoichiometry.indptr),
+            "objective": objective,
+            "direction": solver.objective.direction}
+
+    @staticmethod
+    def _build_solver(snapshot):
+        """Build a solver from the description of `_solver_snapshot_of`."""
+        interface = import_module(snapshot["interface"])
+        solver = interface.Model()
+        variables = []
+        for rxn_id, reverse_id, lower_bound, upper_bound in \
+                snapshot["reactions"]:
+            reverse_lb, reverse_ub, forward_lb, forward_ub = \
+                separate_forward_and_reverse_bounds(lower_bound, upper_bound)
+            variables.append(interface.Variable(
+                rxn_id, lb=forward_lb, ub=forward_ub))
+            variables.append(interface.Variable(
+                reverse_id, lb=reverse_lb, ub=reverse_ub))
+        bounds = snapshot["constraint_bounds"]
+        constraints = [interface.Constraint(
+            S.Zero, name=met_id, lb=bounds.get(met_id, (0, 0))[0],
+            ub=bounds.get(met_id, (0, 0))[1])
+            for met_id in snapshot["metabolites"]]
+        solver.add(variables + constraints, sloppy=True)
+        solver.update()
+        data, indices, indptr = snapshot["matrix"]
+        terms = [{} for _ in constraints]
+        for j in range(len(indptr) - 1):
+            forward, reverse = variables[2 * j], variables[2 * j + 1]
+            for k in range(indptr[j], indptr[j + 1]):
+                terms[indices[k]][forward] = data[k]
+                terms[indices[k]][reverse] = -data[k]
+        for constraint, coefficients in zip(constraints, terms):
+            if coefficients:
+                constraint.set_linear_coefficients(coefficients)
+        solver.objective = interface.Objective(
+            S.Zero, direction=snapshot["direction"])
+        solver.objective.set_linear_coefficients(
+            {solver.variables[name]: coefficient for name, coefficient in
+             iteritems(snapshot["objective"])})
+        configuration = snapshot["configuration"]
+        for key, value in iteritems(configuration):
+            if key == "tolerances":
+                for name, tolerance in iteritems(value):
+                    setattr(solver.configuration.tolerances, name, tolerance)
+            else:
+                setattr(solver.configuration, key, value)
+        return solver
+
     def add_metabolites(self, metabolite_list):
         """Will add a list of metabolites to the model object and add new
         constraints accordingly.
@@ -329,8 +475,9 @@ class Model(Object):
 
         # from cameo ...
         to_add = []
+        constraints = self.constraints
         for met in metabolite_list:
-            if met.id not in self.constraints:
+            if met.id not in constraints:
                 constraint = self.problem.Constraint(
                     S.Zero, name=met.id, lb=0, ub=0)
                 to_add += [constraint]
@@ -508,43 +655,61 @@ class Model(Object):
 
         context = get_context(self)
 
+        to_remove = []
+        seen = set()
         for reaction in reactions:
             try:
                 reaction = self.reactions[self.reactions.index(reaction)]
             except ValueError:
                 warn('%s not in %s' % (reaction, self))
             else:
-                forward = reaction.forward_variable
-                reverse = reaction.reverse_variable
-                self.remove_cons_vars([forward, reverse])
-                self.reactions.remove(reaction)
-                reaction._model = None
-
-                if context:
-                    context(partial(setattr, reaction, '_model', self))
-                    context(partial(self.reactions.add, reaction))
-
-                for x in reaction._metabolites:
-                    if reaction in x._reaction:
-                        x._reaction.remove(reaction)
-                        if context:
-                            context(partial(x._reaction.add, reaction))
-                        if remove_orphans and len(x._reaction) == 0:
-                            self.remove_metabolites(x)
-
-                for x in reaction._genes:
-                    if reaction in x._reaction:
-                        x._reaction.remove(reaction)
-                        if context:
-                            context(partial(x._reaction.add, reaction))
-
-                        if remove_orphans and len(x._reaction) == 0:
-                            self.genes.remove(x)
-                            if context:
-                                context(partial(self.genes.add, x))
-
-                reaction._metabolites = {}
-                reaction._genes = set()
+                # a second occurrence is no longer in the model either
+                if reaction.id in seen:
+                    warn('%s not in %s' % (reaction, self))
+                    continue
+                seen.add(reaction.id)
+                to_remove.append(reaction)
+        # remove all reactions in one pass instead of one at a time
+        self.remove_cons_vars(
+            [v for r in to_remove
+             for v in (r.forward_variable, r.reverse_variable)])
+        self.reactions.remove_many(to_remove)
+        if context:
+            context(partial(self.reactions.__iadd__, to_remove))
+
+        orphan_metabolites = []
+        orphan_genes = []
+        for reaction in to_remove:
+            reaction._model = None
+            if context:
+                context(partial(setattr, reaction, '_model', self))
+
+            for x in reaction._metabolites:
+                if reaction in x._reaction:
+                    x._reaction.remove(reaction)
+                    if context:
+                        context(partial(x._reaction.add, reaction))
+                    if remove_orphans and len(x._reaction) == 0:
+                        orphan_metabolites.append(x)
+
+            for x in reaction._genes:
+                if reaction in x._reaction:
+                    x._reaction.remove(reaction)
+                    if context:
+                        context(partial(x._reaction.add, reaction))
+
+                    if remove_orphans and len(x._reaction) == 0:
+                        orphan_genes.append(x)
+
+            reaction._metabolites = {}
+            reaction._genes = set()
+
+        if orphan_metabolites:
+            self.remove_metabolites(orphan_metabolites)
+        if orphan_genes:
+            self.genes.remove_many(orphan_genes)
+            if context:
+                context(partial(self.genes.__iadd__, orphan_genes))
 
     def add_cons_vars(self, what, **kwargs):
         """Add constraints and variables to the model's mathematical problem.
@@ -598,6 +763,8 @@ class Model(Object):
             The problem interface that defines methods for interacting with
             the problem and associated solver directly.
         """
+        if self._solver is None:
+            return import_module(self._solver_snapshot["interface"])
         return self.solver.interface
 
     @property
@@ -643,15 +810,20 @@ class Model(Object):
     def _populate_solver(self, reaction_list, metabolite_list=None):
         """Populate attached solver with constraints and variables that
         model the provided reactions.
+
+        All variables and constraints are created up front and added to the
+        solver in a single batch. The constraint coefficients are then set
+        one constraint at a time after a single solver update.
         """
         constraint_terms = AutoVivification()
-        to_add = []
+        constraints = self.constraints
+        new_constraints = OrderedDict()
         if metabolite_list is not None:
             for met in metabolite_list:
-                to_add += [self.problem.Constraint(
-                    S.Zero, name=met.id, lb=0, ub=0)]
-        self.add_cons_vars(to_add)
+                new_constraints[met.id] = self.problem.Constraint(
+                    S.Zero, name=met.id, lb=0, ub=0)
 
+        variables = []
         for reaction in reaction_list:
 
             reverse_lb, reverse_ub, forward_lb, forward_ub = \
@@ -661,27 +833,50 @@ class Model(Object):
                 reaction.id, lb=forward_lb, ub=forward_ub)
             reverse_variable = self.problem.Variable(
                 reaction.reverse_id, lb=reverse_lb, ub=reverse_ub)
-
-            self.add_cons_vars([forward_variable, reverse_variable])
-            self.solver.update()
+            variables.extend([forward_variable, reverse_variable])
 
             for metabolite, coeff in six.iteritems(reaction.metabolites):
-                if metabolite.id in self.constraints:
-                    constraint = self.constraints[metabolite.id]
+                met_id = metabolite.id
+                if met_id in new_constraints:
+                    constraint = new_constraints[met_id]
+                elif met_id in constraints:
+                    constraint = constraints[met_id]
                 else:
                     constraint = self.problem.Constraint(
                         S.Zero,
-                        name=metabolite.id,
+                        name=met_id,
                         lb=0, ub=0)
-                    self.add_cons_vars(constraint, sloppy=True)
+                    new_constraints[met_id] = constraint
 
                 constraint_terms[constraint][forward_variable] = coeff
                 constraint_terms[constraint][reverse_variable] = -coeff
 
+        self.add_cons_vars(variables + list(new_constraints.values()),
+                           sloppy=True)
         self.solver.update()
         for constraint, terms in six.iteritems(constraint_terms):
             constraint.set_linear_coefficients(terms)
 
+    @property
+    def S(self):
+        """The stoichiometric matrix of the model.
+
+        The matrix is built once and cached. Changing the coefficients of a
+        reaction only updates its column, while adding, removing or
+        reordering reactions or metabolites rebuilds the matrix on the next
+        access.
+
+        Returns
+        -------
+        cobra.util.array.StoichiometricMatrix
+            The matrix with `dense`, `sparse` and `data_frame` views.
+        """
+        stoichiometry = self._stoichiometry
+        if stoichiometry is None or not stoichiometry.matches(self):
+            stoichiometry = self._stoichiometry = StoichiometricMatrix(self)
+        stoichiometry.update()
+        return stoichiometry
+
     def to_array_based_model(self, deepcopy_model=False, **kwargs):
         """Makes a `cobra.core.ArrayBasedModel` from a cobra.Model
         which may be used to perform linear algebra operations with the
@@ -755,6 +950,41 @@ class Model(Object):
         self.objective.direction = original_direction
         return solution
 
+    def slim_optimize(self, error_value=float('nan'), message=None):
+        """Optimize the model without creating a solution object.
+
+        Creating a full solution object implies fetching fluxes, reduced
+        costs and shadow prices for all reactions and metabolites from the
+        solver. When only the objective value is of interest, e.g. in
+        screening loops, this function avoids that overhead. Fluxes of single
+        reactions can still be retrieved from the solver afterwards, e.g.
+        via `Reaction.flux`.
+
+        Parameters
+        ----------
+        error_value : float, None
+            The value to return if the optimization did not succeed, e.g. due
+            to infeasibility. If None, an `OptimizationError` is raised
+            instead.
+        message : string, optional
+            Error message to use if the optimization did not succeed and
+            `error_value` is None.
+
+        Returns
+        -------
+        float
+            The objective value.
+        """
+        self.solver.optimize()
+        status = self.solver.status
+        if status == "optimal":
+            return self.solver.objective.value
+        elif error_value is not None:
+            return error_value
+        if message is None:
+            message = "solver status is '{}'".format(status)
+        raise OptimizationError(message)
+
     def repair(self, rebuild_index=True, rebuild_relationships=True):
         """Update all indexes and pointers in a model
 
@@ -784,6 +1014,7 @@ class Model(Object):
         for l in (self.reactions, self.genes, self.metabolites):
             for e in l:
                 e._model = self
+        self._stoichiometry = None
 
     @property
     def objective(self):
@@ -852,3 +1083,33 @@ class Model(Object):
         """Pop the top context manager and trigger the undo functions"""
         context = self._contexts.pop()
         context.reset()
+
+    def batch_edit(self):
+        """Buffer changes to reaction bounds and objective coefficients.
+
+        Within the returned context, assignments to `Reaction.lower_bound`,
+        `Reaction.upper_bound`, `Reaction.bounds` and
+        `Reaction.objective_coefficient` are collected and only sent to the
+        solver in a single vectorized update when the context is left. When
+        the model is used as a context, all bound changes are reverted by a
+        single history entry.
+
+        The solver is not synchronized before leaving the context, so do not
+        optimize the model within it.
+
+        Returns
+        -------
+        cobra.util.solver.BatchEdit
+            A context manager.
+
+        Examples
+        --------
+        >>> import cobra.test
+        >>> model = cobra.test.create_test_model("textbook")
+        >>> with model:
+        >>>     with model.batch_edit():
+        >>>         for reaction in model.exchanges:
+        >>>             reaction.lower_bound = 0
+        >>>     model.slim_optimize()
+        """
+        return BatchEdit(self)
@@ -16,7 +16,7 @@ from cobra.exceptions import OptimizationError
 from cobra.core.gene import Gene, ast2str, parse_gpr
 from cobra.core.metabolite import Metabolite
 from cobra.core.object import Object
-from cobra.util.context import resettable, get_context
+from cobra.util.context import resettable, get_batch, get_context
 from cobra.util.solver import (
     linear_reaction_coefficients, set_objective, check_solver_status)
 from cobra.util.util import Frozendict, _is_positive
@@ -169,6 +169,13 @@ class Reaction(Object):
         self._forward_variable = None
         self._reverse_variable = None
 
+    def _update_stoichiometry(self):
+        """Mark the column of the reaction in the cached stoichiometric
+        matrix of the model as outdated."""
+        stoichiometry = getattr(self._model, "_stoichiometry", None)
+        if stoichiometry is not None:
+            stoichiometry.modify(self)
+
     @property
     def objective_coefficient(self):
         """ Get the coefficient for this reaction in a linear
@@ -179,13 +186,21 @@ class Reaction(Object):
         can be obtained individually using this property. A more general way
         is to use the `model.objective` property directly.
         """
+        batch = get_batch(self)
+        if batch is not None:
+            value = batch.get_objective_coefficient(self)
+            if value is not None:
+                return value
         return linear_reaction_coefficients(self.model, [self]).get(self, 0)
 
     @objective_coefficient.setter
     def objective_coefficient(self, value):
         if self.model is None:
             raise AttributeError('cannot assign objective to a missing model')
-        if self.flux_expression is not None:
+        batch = get_batch(self)
+        if batch is not None:
+            batch.set_objective_coefficient(self, value)
+        elif self.flux_expression is not None:
             set_objective(self.model, {self: value}, additive=True)
 
     def __copy__(self):
@@ -641,6 +656,7 @@ class Reaction(Object):
         """
         self._metabolites = {k: coefficient * v for k, v in
                              iteritems(self._metabolites)}
+        self._update_stoichiometry()
         return self
 
     def __mul__(self, coefficient):
@@ -750,7 +766,9 @@ class Reaction(Object):
         # from cameo ...
         model = self.model
         if model is not None:
-            model.add_metabolites(new_metabolites)
+            if new_metabolites:
+                model.add_metabolites(new_metabolites)
+            self._update_stoichiometry()
 
             for metabolite, coefficient in metabolites_to_add.items():
 
@@ -1031,6 +1049,10 @@ def update_forward_and_reverse_bounds(reaction, direction='both'):
        Either 'both', 'upper' or 'lower' for updating the corresponding flux
        bounds.
     """
+    batch = get_batch(reaction)
+    if batch is not None:
+        batch.add_bounds(reaction)
+        return
 
     reverse_lb, reverse_ub, forward_lb, forward_ub = \
         separate_forward_and_reverse_bounds(*reaction.bounds)
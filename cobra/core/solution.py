@@ -280,6 +280,11 @@ def get_solution(model, reactions=None, metabolites=None):
     ----
     This is only intended for the `optlang` solver interfaces and not the
     legacy solvers.
+
+    Primal and dual values are retrieved from the solver as arrays and
+    aligned with the reactions and metabolites by integer positions. For the
+    complete model those positions are cached and only recomputed when the
+    variables or constraints of the solver change.
     """
     check_solver_status(model.solver.status)
     if reactions is None:
@@ -287,28 +292,85 @@ def get_solution(model, reactions=None, metabolites=None):
     if metabolites is None:
         metabolites = model.metabolites
 
+    forward, reverse, constraints = _get_solution_indices(
+        model, reactions, metabolites)
     rxn_index = [rxn.id for rxn in reactions]
-    fluxes = zeros(len(reactions))
-    var_primals = model.solver.primal_values
-    reduced = zeros(len(reactions))
-    var_duals = model.solver.reduced_costs
-    # reduced costs are not always defined, e.g. for integer problems
-    if var_duals[rxn_index[0]] is None:
+    var_primals = _get_solver_values(
+        model.solver, "_get_primal_values", "primal_values")
+    fluxes = var_primals[forward] - var_primals[reverse]
+    # dual values are not always defined, e.g. for integer problems
+    var_duals = _get_solver_values(
+        model.solver, "_get_reduced_costs", "reduced_costs")
+    if var_duals is None:
+        reduced = zeros(len(rxn_index))
         reduced.fill(nan)
-        for (i, rxn) in enumerate(reactions):
-            fluxes[i] = var_primals[rxn.id] - var_primals[rxn.reverse_id]
     else:
-        for (i, rxn) in enumerate(reactions):
-            forward = rxn.id
-            reverse = rxn.reverse_id
-            fluxes[i] = var_primals[forward] - var_primals[reverse]
-            reduced[i] = var_duals[forward] - var_duals[reverse]
+        reduced = var_duals[forward] - var_duals[reverse]
     met_index = [met.id for met in metabolites]
-    constr_duals = model.solver.shadow_prices
-    shadow = asarray([constr_duals[met.id] for met in metabolites])
+    constr_duals = _get_solver_values(
+        model.solver, "_get_shadow_prices", "shadow_prices")
+    if constr_duals is None:
+        shadow = zeros(len(met_index))
+        shadow.fill(nan)
+    else:
+        shadow = constr_duals[constraints]
     return Solution(model.solver.objective.value, model.solver.status,
                     reactions,
                     Series(index=rxn_index, data=fluxes),
                     Series(index=rxn_index, data=reduced),
                     metabolites,
                     Series(index=met_index, data=shadow))
+
+
+def _get_solver_values(solver, method, attribute):
+    """Get primal or dual values as an array in the order of the solver.
+
+    Returns None if the values are not defined for the current problem.
+    """
+    try:
+        values = getattr(solver, method)()
+    except AttributeError:
+        values = list(getattr(solver, attribute).values())
+    except ValueError:
+        return None
+    if len(values) > 0 and values[0] is None:
+        return None
+    return asarray(values, dtype=float)
+
+
+def _get_solution_indices(model, reactions, metabolites):
+    """Get the positions of reaction variables and metabolite constraints.
+
+    Returns integer arrays with the solver positions of the forward and
+    reverse variables of `reactions` and of the constraints of
+    `metabolites`. For the complete model the result is cached on the model
+    and reused as long as the solver keeps the same variables and
+    constraints and the reactions and metabolites keep their order.
+    """
+    solver = model.solver
+    variables = solver.variables
+    constraints = solver.constraints
+    complete = (reactions is model.reactions and
+                metabolites is model.metabolites)
+    key = (len(variables), len(constraints))
+    if complete:
+        cache = getattr(model, "_solution_cache", None)
+        # comparing the lists only checks the identity of their elements
+        if cache is not None and cache[0] is solver and cache[1] == key \
+                and cache[2] == reactions and cache[3] == metabolites:
+            return cache[4]
+
+    try:
+        var_index = variables._indices
+        con_index = constraints._indices
+    except AttributeError:
+        var_index = {var.name: i for i, var in enumerate(variables)}
+        con_index = {con.name: i for i, con in enumerate(constraints)}
+    indices = (
+        asarray([var_index[rxn.id] for rxn in reactions], dtype=int),
+        asarray([var_index[rxn.reverse_id] for rxn in reactions], dtype=int),
+        asarray([con_index[met.id] for met in metabolites], dtype=int))
+    if complete:
+        model._solution_cache = (solver, key, list(reactions),
+                                 list(metabolites), indices)
+    return indices
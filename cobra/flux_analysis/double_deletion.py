@@ -2,7 +2,8 @@
 
 from __future__ import absolute_import
 
-from itertools import chain, product
+import logging
+from itertools import chain, islice, product
 from warnings import warn
 
 import numpy
@@ -12,7 +13,8 @@ from six import iteritems
 from cobra.flux_analysis.deletion_worker import (
     CobraDeletionMockPool, CobraDeletionPool)
 from cobra.manipulation.delete import (
-    find_gene_knockout_reactions, get_compiled_gene_reaction_rules)
+    CompiledGPR, find_gene_knockout_reactions,
+    get_compiled_gene_reaction_rules)
 from cobra.solvers import get_solver_name, solver_dict
 
 try:
@@ -22,6 +24,8 @@ except ImportError:
 else:
     from . import moma
 
+LOGGER = logging.getLogger(__name__)
+
 
 # Utility functions
 def generate_matrix_indexes(ids1, ids2):
@@ -53,6 +57,23 @@ def yield_upper_tria_indexes(ids1, ids2, id_to_index):
             yield((index2, index1), (id2, id1))  # note that order flipped
 
 
+def _knockout_indexes(compiled_rules, knockouts, batch_size=1024):
+    """yields the label and the disabled reaction indexes of knockouts
+
+    knockouts is an iterable of (label, gene_ids) pairs. The gene reaction
+    rules are evaluated with the compiled rules for batches of batch_size
+    knockouts at a time."""
+    knockouts = iter(knockouts)
+    while True:
+        batch = list(islice(knockouts, batch_size))
+        if len(batch) == 0:
+            return
+        disabled = compiled_rules.knockout_matrix(
+            gene_ids for _, gene_ids in batch)
+        for (label, _), row in zip(batch, disabled):
+            yield label, numpy.flatnonzero(row).tolist()
+
+
 def _format_upper_triangular_matrix(row_indexes, column_indexes, matrix):
     """reformat the square upper-triangular result matrix
 
@@ -335,7 +356,13 @@ def _double_reaction_deletion_fba(cobra_model, reaction_indexes1,
 
         # precompute all single deletions in the pool and store them along
         # the diagonal
+        n_skipped = 0
         for reaction_index, result_index in iteritems(reaction_to_result):
+            # reaction removed carries no flux
+            if reaction_index in no_flux_reaction_indexes:
+                results[result_index, result_index] = wt_growth_rate
+                n_skipped += 1
+                continue
             pool.submit((reaction_index, ), label=result_index)
         for result_index, value in pool.receive_all():
             # if singly lethal, set everything in row and column to 0
@@ -357,11 +384,14 @@ def _double_reaction_deletion_fba(cobra_model, reaction_indexes1,
             if r1_index in no_flux_reaction_indexes and \
                     r2_index in no_flux_reaction_indexes:
                 results[result_index] = wt_growth_rate
+                n_skipped += 1
                 continue
             pool.submit((r1_index, r2_index), label=result_index)
         # get results
         for result in pool.receive_all():
             results[result[0]] = result[1]
+    LOGGER.info("skipped %d knockouts of reactions without flux in the "
+                "wild-type solution", n_skipped)
 
     return results
 
@@ -389,7 +419,7 @@ def _double_gene_deletion_fba(cobra_model, gene_ids1, gene_ids2,
     # Because each gene reaction rule will be evaluated multiple times
     # the reaction has multiple associated genes being deleted, compiling
     # the gene reaction rules ahead of time increases efficiency greatly.
-    compiled_rules = get_compiled_gene_reaction_rules(cobra_model)
+    compiled_rules = CompiledGPR(cobra_model)
 
     n_results = len(gene_id_to_result)
     results = numpy.empty((n_results, n_results))
@@ -402,44 +432,80 @@ def _double_gene_deletion_fba(cobra_model, gene_ids1, gene_ids2,
     with PoolClass(cobra_model, n_processes=number_of_processes,
                    solver=solver, **kwargs) as pool:
         # precompute all single deletions in the pool and store them along
-        # the diagonal
-        for gene_id, gene_result_index in iteritems(gene_id_to_result):
-            ko_reactions = find_gene_knockout_reactions(
-                cobra_model, (cobra_model.genes.get_by_id(gene_id),))
-            ko_indexes = [cobra_model.reactions.index(i) for i in ko_reactions]
+        # the diagonal. Genes disabling the same set of reactions share
+        # the result of a single LP.
+        n_skipped = 0
+        n_duplicates = 0
+        single_knockouts = {}
+        duplicates = {}
+        single_selector = _knockout_indexes(
+            compiled_rules, ((gene_result_index, (gene_id,)) for
+                             gene_id, gene_result_index in
+                             iteritems(gene_id_to_result)))
+        for gene_result_index, ko_indexes in single_selector:
+            # if all removed gene indexes carry no flux
+            if wt_growth_rate is not None and \
+                    no_flux_reaction_indexes.issuperset(ko_indexes):
+                results[gene_result_index, gene_result_index] = \
+                    wt_growth_rate
+                n_skipped += 1
+                continue
+            key = frozenset(ko_indexes)
+            if key in single_knockouts:
+                duplicates[single_knockouts[key]].append(gene_result_index)
+                n_duplicates += 1
+                continue
+            single_knockouts[key] = gene_result_index
+            duplicates[gene_result_index] = []
             pool.submit(ko_indexes, label=gene_result_index)
-        for result_index, value in pool.receive_all():
+        for label, value in pool.receive_all():
             # if singly lethal, set everything in row and column to 0
             value = value if abs(value) > zero_cutoff else 0.
-            if value == 0.:
-                results[result_index, :] = 0.
-                results[:, result_index] = 0.
-            else:  # only the diagonal needs to be set
-                results[result_index, result_index] = value
+            for result_index in [label] + duplicates.pop(label):
+                if value == 0.:
+                    results[result_index, :] = 0.
+                    results[:, result_index] = 0.
+                else:  # only the diagonal needs to be set
+                    results[result_index, result_index] = value
+        known = {key: results[index, index]
+                 for key, index in iteritems(single_knockouts)}
 
         # Run double knockouts in the upper triangle
         index_selector = yield_upper_tria_indexes(gene_ids1, gene_ids2,
                                                   gene_id_to_result)
-        for result_index, (gene1, gene2) in index_selector:
-
-            # if singly lethal the results have already been set
-            if results[result_index] == 0:
-                continue
-            ko_reactions = find_gene_knockout_reactions(
-                cobra_model, (gene1, gene2), compiled_rules)
-            ko_indexes = [cobra_model.reactions.index(i)
-                          for i in ko_reactions]
+        # if singly lethal the results have already been set
+        index_selector = _knockout_indexes(
+            compiled_rules, ((result_index, genes) for result_index, genes
+                             in index_selector if results[result_index] != 0))
+        double_knockouts = {}
+        for result_index, ko_indexes in index_selector:
             # if all removed gene indexes carry no flux
             if len(set(ko_indexes) - no_flux_reaction_indexes) == 0:
                 results[result_index] = wt_growth_rate
+                n_skipped += 1
+                continue
+            # the same reactions were already knocked out
+            key = frozenset(ko_indexes)
+            if key in known:
+                results[result_index] = known[key]
+                n_duplicates += 1
                 continue
+            if key in double_knockouts:
+                duplicates[double_knockouts[key]].append(result_index)
+                n_duplicates += 1
+                continue
+            double_knockouts[key] = result_index
+            duplicates[result_index] = []
             pool.submit(ko_indexes, label=result_index)
 
-        for result in pool.receive_all():
-            value = result[1]
+        for label, value in pool.receive_all():
             if value < zero_cutoff:
                 value = 0
-            results[result[0]] = value
+            for result_index in [label] + duplicates.pop(label):
+                results[result_index] = value
+    LOGGER.info("skipped %d knockouts of reactions without flux in the "
+                "wild-type solution and %d knockouts of already solved "
+                "reaction sets", n_skipped, n_duplicates)
 
     return results
 
@@ -4,18 +4,29 @@
 
 from __future__ import absolute_import
 
+import logging
+from multiprocessing import Pool
+from time import time
+from warnings import warn
+
 import numpy
+import pandas
 from six import iteritems
+from sympy import Add, Mul
 from sympy.core.singleton import S
 
 from cobra.core import Metabolite, Reaction, get_solution
-from cobra.util import (linear_reaction_coefficients,
-                        create_stoichiometric_array)
+from cobra.core.solution import _get_solution_indices, _get_solver_values
+from cobra.util import linear_reaction_coefficients
+from cobra.util.solver import interface_to_str
 from cobra.manipulation.modify import convert_to_irreversible
-from cobra.util import nullspace
+
+LOGGER = logging.getLogger(__name__)
+add = Add._from_args
+mul = Mul._from_args
 
 
-def add_loopless(model, zero_cutoff=1e-12):
+def add_loopless(model, zero_cutoff=1e-12, indicators=False):
     """Modify a model so all feasible flux distributions are loopless.
 
     In most cases you probably want to use the much faster `loopless_solution`.
@@ -33,11 +44,22 @@ def add_loopless(model, zero_cutoff=1e-12):
     zero_cutoff : positive float, optional
         Cutoff used for null space. Coefficients with an absolute value smaller
         than `zero_cutoff` are considered to be zero.
+    indicators : boolean, optional
+        Whether to link fluxes and Gibbs free energies with the solver's
+        native indicator constraints instead of big-M constraints. Falls back
+        to big-M constraints with a warning if the solver does not support
+        indicator constraints.
 
     Returns
     -------
     Nothing
 
+    Notes
+    -----
+    All variables and constraints are added to the solver at once and the
+    nullspace constraints are read from a sparse nullspace basis. The time
+    needed to build the problem is logged at the INFO level.
+
     References
     ----------
     .. [1] Elimination of thermodynamically infeasible loops in steady-state
@@ -45,41 +67,77 @@ def add_loopless(model, zero_cutoff=1e-12):
        2011 Feb 2;100(3):544-53. doi: 10.1016/j.bpj.2010.12.3707. Erratum
        in: Biophys J. 2011 Mar 2;100(5):1381.
     """
+    start = time()
     internal = [i for i, r in enumerate(model.reactions) if not r.boundary]
-    s_int = create_stoichiometric_array(model)[:, numpy.array(internal)]
-    n_int = nullspace(s_int).T
+    try:
+        # a sparse basis gives constraints with few coefficients
+        n_int = model.S.nullspace(internal, sparse=True).tocsc()
+        columns = [(n_int.indices[a:b], n_int.data[a:b]) for a, b in
+                   zip(n_int.indptr[:-1], n_int.indptr[1:])]
+    except ValueError:  # sparse matrices require scipy
+        n_int = model.S.nullspace(internal)
+        columns = [(numpy.flatnonzero(col), col[col != 0]) for col in n_int.T]
     max_bound = max(max(abs(b) for b in r.bounds) for r in model.reactions)
     prob = model.problem
-
-    # Add indicator variables and new constraints
-    to_add = []
-    for i in internal:
-        rxn = model.reactions[i]
-        # indicator variable a_i
-        indicator = prob.Variable("indicator_" + rxn.id, type="binary")
+    if indicators and not prob.Constraint._INDICATOR_CONSTRAINT_SUPPORT:
+        warn("%s does not support indicator constraints, using big-M "
+             "constraints instead" % interface_to_str(prob), UserWarning)
+        indicators = False
+
+    reactions = [model.reactions[i] for i in internal]
+    # indicator variables a_i and Gibbs free energies G_i
+    indicator_vars = [prob.Variable("indicator_" + rxn.id, type="binary")
+                      for rxn in reactions]
+    if indicators:
+        delta_gs = [prob.Variable("delta_g_" + rxn.id, lb=-max_bound,
+                                  ub=max_bound) for rxn in reactions]
+    else:
+        delta_gs = [prob.Variable("delta_g_" + rxn.id) for rxn in reactions]
+    constraints = []
+    coefficients = []
+    for rxn, indicator, delta_g in zip(reactions, indicator_vars, delta_gs):
+        if indicators:
+            # a_i = 1 -> v_i >= 0 and G_i <= -1
+            # a_i = 0 -> v_i <= 0 and G_i >= 1
+            flux = add([rxn.forward_variable,
+                        mul([S.NegativeOne, rxn.reverse_variable])])
+            constraints.extend([
+                prob.Constraint(flux, lb=0, indicator_variable=indicator,
+                                active_when=1, name="on_" + rxn.id),
+                prob.Constraint(flux, ub=0, indicator_variable=indicator,
+                                active_when=0, name="off_" + rxn.id),
+                prob.Constraint(delta_g, ub=-1, indicator_variable=indicator,
+                                active_when=1, name="delta_g_on_" + rxn.id),
+                prob.Constraint(delta_g, lb=1, indicator_variable=indicator,
+                                active_when=0, name="delta_g_off_" + rxn.id)])
+            continue
         # -M*(1 - a_i) <= v_i <= M*a_i
-        on_off_constraint = prob.Constraint(
-            rxn.flux_expression - max_bound * indicator,
-            lb=-max_bound, ub=0, name="on_off_" + rxn.id)
+        constraints.append(prob.Constraint(
+            S.Zero, lb=-max_bound, ub=0, name="on_off_" + rxn.id))
+        coefficients.append({rxn.forward_variable: 1,
+                             rxn.reverse_variable: -1,
+                             indicator: -max_bound})
         # -(max_bound + 1) * a_i + 1 <= G_i <= -(max_bound + 1) * a_i + 1000
-        delta_g = prob.Variable("delta_g_" + rxn.id)
-        delta_g_range = prob.Constraint(
-            delta_g + (max_bound + 1) * indicator,
-            lb=1, ub=max_bound, name="delta_g_range_" + rxn.id)
-        to_add.extend([indicator, on_off_constraint, delta_g, delta_g_range])
-
-    model.add_cons_vars(to_add)
-
-    # Add nullspace constraints for G_i
-    for i, row in enumerate(n_int):
-        name = "nullspace_constraint_" + str(i)
-        nullspace_constraint = prob.Constraint(S.Zero, lb=0, ub=0, name=name)
-        model.add_cons_vars([nullspace_constraint])
-        coefs = {model.variables[
-                 "delta_g_" + model.reactions[ridx].id]: row[i]
-                 for i, ridx in enumerate(internal) if
-                 abs(row[i]) > zero_cutoff}
-        model.constraints[name].set_linear_coefficients(coefs)
+        constraints.append(prob.Constraint(
+            S.Zero, lb=1, ub=max_bound, name="delta_g_range_" + rxn.id))
+        coefficients.append({delta_g: 1, indicator: max_bound + 1})
+
+    # nullspace constraints for G_i
+    for i, (rows, values) in enumerate(columns):
+        keep = numpy.abs(values) > zero_cutoff
+        constraints.append(prob.Constraint(
+            S.Zero, lb=0, ub=0, name="nullspace_constraint_" + str(i)))
+        coefficients.append({delta_gs[j]: v for j, v in
+                             zip(rows[keep].tolist(), values[keep].tolist())})
+
+    model.add_cons_vars(indicator_vars + delta_gs + constraints)
+    model.solver.update()
+    # the constraints without an expression are at the end of the list
+    for constraint, coefs in zip(constraints[-len(coefficients):],
+                                 coefficients):
+        constraint.set_linear_coefficients(coefs)
+    LOGGER.info("added loopless constraints for %d internal reactions in "
+                "%.2f s", len(internal), time() - start)
 
 
 def loopless_solution(model, fluxes=None):
@@ -170,6 +228,184 @@ def loopless_solution(model, fluxes=None):
     return solution
 
 
+class _CycleFreeProblem(object):
+    """The CycleFreeFlux problem of a model updated in place for many fluxes.
+
+    Adds the constraint on the previous objective to the model and sets a
+    zero objective. For each flux vector only the bounds and objective
+    coefficients that differ from the previous vector are changed.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        reactions = model.reactions
+        prob = model.problem
+        self.old_objective = prob.Variable("loopless_old_objective")
+        constraint = prob.Constraint(
+            model.solver.objective.expression - self.old_objective,
+            lb=0, ub=0, name="loopless_obj_constraint")
+        model.add_cons_vars([self.old_objective, constraint])
+        coefs = linear_reaction_coefficients(model)
+        self.coefficients = numpy.array(
+            [coefs.get(rxn, 0.0) for rxn in reactions])
+        model.objective = S.Zero
+        model.solver.objective.direction = "min"
+        self.boundary = numpy.array([rxn.boundary for rxn in reactions])
+        bounds = numpy.array([rxn.bounds for rxn in reactions], dtype=float)
+        self.lower, self.upper = bounds[:, 0], bounds[:, 1]
+        self.current = (self.lower.copy(), self.upper.copy())
+        self.sign = numpy.zeros(len(reactions))
+        self.forward = [rxn.forward_variable for rxn in reactions]
+        self.reverse = [rxn.reverse_variable for rxn in reactions]
+        self.indices = _get_solution_indices(
+            model, reactions, model.metabolites)[:2]
+
+    def solve(self, fluxes, fixed=None):
+        """Get the loopless flux vector closest to `fluxes` or None.
+
+        Reactions with the indices in `fixed` keep their flux just like the
+        boundary reactions.
+        """
+        positive = fluxes >= 0
+        keep = self.boundary
+        if fixed is not None:
+            keep = keep.copy()
+            keep[fixed] = True
+        internal = ~keep
+        lower = numpy.where(keep, fluxes, numpy.where(
+            positive, numpy.maximum(self.lower, 0), self.lower))
+        upper = numpy.where(keep, fluxes, numpy.where(
+            positive, self.upper, numpy.minimum(self.upper, 0)))
+        if (lower > upper).any():
+            return None
+        self._set_bounds(lower, upper)
+        self._set_signs(
+            numpy.where(internal, numpy.where(positive, 1.0, -1.0), 0.0))
+
+        objective = float(self.coefficients.dot(fluxes))
+        self.old_objective.set_bounds(objective, objective)
+        self.model.solver.optimize()
+        if self.model.solver.status != "optimal":
+            return None
+        primals = _get_solver_values(
+            self.model.solver, "_get_primal_values", "primal_values")
+        return primals[self.indices[0]] - primals[self.indices[1]]
+
+    def restore(self):
+        """Reset the variable bounds and objective coefficients changed by
+        `solve` which are not recorded by the model context."""
+        self._set_bounds(self.lower, self.upper)
+        self._set_signs(numpy.zeros(len(self.sign)))
+
+    def _set_bounds(self, lower, upper):
+        """set the variable bounds that differ from the current ones"""
+        changed = numpy.flatnonzero((lower != self.current[0]) |
+                                    (upper != self.current[1]))
+        zero = numpy.zeros(len(changed))
+        forward_lb = numpy.maximum(lower[changed], zero).tolist()
+        forward_ub = numpy.maximum(upper[changed], zero).tolist()
+        reverse_lb = numpy.maximum(-upper[changed], zero).tolist()
+        reverse_ub = numpy.maximum(-lower[changed], zero).tolist()
+        for k, i in enumerate(changed):
+            self.forward[i].set_bounds(forward_lb[k], forward_ub[k])
+            self.reverse[i].set_bounds(reverse_lb[k], reverse_ub[k])
+        self.current = (lower, upper)
+
+    def _set_signs(self, sign):
+        """set the objective coefficients that differ from the current
+        ones"""
+        coefs = {}
+        for i in numpy.flatnonzero(sign != self.sign):
+            coefs[self.forward[i]] = sign[i]
+            coefs[self.reverse[i]] = -sign[i]
+        if coefs:
+            self.model.solver.objective.set_linear_coefficients(coefs)
+        self.sign = sign
+
+
+def _init_worker(model):
+    """Initialize a global CycleFreeFlux problem for multiprocessing."""
+    global _problem
+    _problem = _CycleFreeProblem(model)
+
+
+def _loopless_chunk(args):
+    """Convert a chunk of flux vectors in a worker process."""
+    start, fluxes = args
+    return start, _solve_rows(_problem, fluxes)
+
+
+def _solve_rows(problem, fluxes):
+    """Convert the rows of a flux matrix, using NaN for failed rows."""
+    result = numpy.full(fluxes.shape, numpy.nan)
+    for i, row in enumerate(fluxes):
+        loopless = problem.solve(row)
+        if loopless is not None:
+            result[i] = loopless
+    return result
+
+
+def loopless_solutions(model, fluxes, processes=1, chunk_size=100):
+    """Convert many flux distributions to loopless ones.
+
+    Equivalent to calling `loopless_solution` for every flux distribution
+    but builds the CycleFreeFlux problem only once (per process).
+
+    Parameters
+    ----------
+    model : cobra.Model
+        The model the fluxes belong to. It will not be modified.
+    fluxes : pandas.DataFrame or numpy.array
+        The flux distributions as rows, e.g. the result of
+        `cobra.flux_analysis.sample`. DataFrame columns are matched to the
+        reaction identifiers, array columns must be in the order of
+        `model.reactions`.
+    processes : int, optional
+        The number of worker processes. Each process builds its own problem
+        and converts chunks of rows.
+    chunk_size : int, optional
+        The number of rows sent to a worker process at once.
+
+    Returns
+    -------
+    pandas.DataFrame or numpy.array
+        The loopless flux distributions in the same shape and type as
+        `fluxes`. Rows for which the optimization failed, usually because
+        the input was infeasible, are NaN.
+
+    See Also
+    --------
+    loopless_solution
+    """
+    reaction_ids = [rxn.id for rxn in model.reactions]
+    if isinstance(fluxes, pandas.DataFrame):
+        values = fluxes[reaction_ids].values.astype(float)
+    else:
+        values = numpy.atleast_2d(numpy.asarray(fluxes, dtype=float))
+    if processes > 1 and len(values) > chunk_size:
+        result = numpy.empty(values.shape)
+        tasks = [(start, values[start:start + chunk_size])
+                 for start in range(0, len(values), chunk_size)]
+        pool = Pool(processes, initializer=_init_worker, initargs=(model,))
+        try:
+            for start, chunk in pool.imap_unordered(_loopless_chunk, tasks):
+                result[start:start + len(chunk)] = chunk
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        with model:
+            problem = _CycleFreeProblem(model)
+            try:
+                result = _solve_rows(problem, values)
+            finally:
+                problem.restore()
+    if isinstance(fluxes, pandas.DataFrame):
+        return pandas.DataFrame(result, index=fluxes.index,
+                                columns=reaction_ids)
+    return result
+
+
 def loopless_fva_iter(model, reaction, all_fluxes=False, zero_cutoff=1e-9):
     """Plugin to get a loopless FVA solution from single FVA iteration.
 
@@ -254,6 +490,79 @@ def loopless_fva_iter(model, reaction, all_fluxes=False, zero_cutoff=1e-9):
     return best
 
 
+class _LooplessFVA(object):
+    """Loop removal for the extrema of a flux variability analysis.
+
+    Replaces `loopless_fva_iter` in `flux_variability_analysis`. Optima
+    without flux through reactions that can be part of an internal cycle
+    are returned directly. All other optima are converted with a single
+    persistent CycleFreeFlux problem and only corrected further if the
+    conversion changes the optimized flux.
+
+    Parameters
+    ----------
+    model : cobra.Model
+        A copy of the model with its original objective. It is modified to
+        hold the CycleFreeFlux problem.
+    zero_cutoff : positive float, optional
+        Fluxes with an absolute value smaller than `zero_cutoff` are
+        considered to be zero.
+    """
+
+    def __init__(self, model, zero_cutoff=1e-9):
+        self.zero_cutoff = zero_cutoff
+        internal = [i for i, rxn in enumerate(model.reactions)
+                    if not rxn.boundary]
+        try:
+            basis = model.S.nullspace(internal, sparse=True).tocsr()
+            support = numpy.diff(basis.indptr) > 0
+        except ValueError:  # sparse matrices require scipy
+            basis = model.S.nullspace(internal)
+            support = (numpy.abs(basis) > zero_cutoff).any(axis=1)
+        # reactions with a non-zero entry in the nullspace of the internal
+        # reactions, ignoring bounds, are all reactions that may be in a loop
+        self.cycles = numpy.zeros(len(model.reactions), dtype=bool)
+        self.cycles[internal] = support
+        self.problem = _CycleFreeProblem(model)
+
+    def optimize(self, model, reaction, current):
+        """Get the loopless extremum of a reaction.
+
+        Assumes that `model` is the FVA model which was just optimized with
+        the flux of `reaction` as objective and `current` as optimum.
+        """
+        forward, reverse = _get_solution_indices(
+            model, model.reactions, model.metabolites)[:2]
+        primals = _get_solver_values(
+            model.solver, "_get_primal_values", "primal_values")
+        fluxes = primals[forward] - primals[reverse]
+        active = numpy.abs(fluxes) >= self.zero_cutoff
+        if reaction.boundary or not (active & self.cycles).any():
+            return current
+        index = model.reactions.index(reaction)
+        loopless = self.problem.solve(fluxes)
+        if loopless is None:
+            return loopless_fva_iter(
+                model, reaction, zero_cutoff=self.zero_cutoff)
+        if abs(loopless[index] - current) < self.zero_cutoff:
+            return current
+        # keep the optimum and block all reactions of the remaining loops,
+        # which all include the optimized reaction
+        almost_loopless = self.problem.solve(fluxes, fixed=[index])
+        if almost_loopless is None:
+            return loopless_fva_iter(
+                model, reaction, zero_cutoff=self.zero_cutoff)
+        loops = numpy.flatnonzero(
+            (numpy.abs(loopless) < self.zero_cutoff) &
+            (numpy.abs(almost_loopless) >= self.zero_cutoff))
+        with model:
+            for i in loops:
+                model.reactions[i].bounds = (0, 0)
+            model.slim_optimize()
+            value = reaction.flux
+        return value
+
+
 def construct_loopless_model(cobra_model):
     """Construct a loopless model.
 
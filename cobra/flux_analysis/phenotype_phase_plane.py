@@ -409,12 +409,12 @@ def _envelope_for_points(model, reactions, grid, carbon_io):
                 model.solver.objective.direction = sense
                 for reaction, coordinate in zip(reactions, point):
                     reaction.bounds = (coordinate, coordinate)
-                model.solver.optimize()
+                flux = model.slim_optimize()
                 if model.solver.status == 'optimal':
                     for reaction, coordinate in zip(reactions, point):
                         results[reaction.id].append(coordinate)
                     results['direction'].append(direction)
-                    results['flux'].append(model.solver.objective.value)
+                    results['flux'].append(flux)
                     if carbon_io[0] is not None:
                         results['carbon_yield'].append(
                             _carbon_yield(carbon_io))
@@ -9,13 +9,21 @@ where possible to provide a uniform interface.
 from __future__ import absolute_import, division
 
 import ctypes
+import os
+from glob import glob
 from multiprocessing import Array, Pool
 from time import time
+from warnings import warn
 
 import numpy as np
 import pandas
-from cobra.solvers import get_solver_name, solver_dict
-from cobra.util import create_stoichiometric_array, nullspace
+from six import string_types
+from six.moves import cPickle as pickle
+from sympy.core.singleton import S as sympy_singletons
+
+from cobra.core.solution import _get_solution_indices, _get_solver_values
+from cobra.util import solver as sutil
+from cobra.util.shared import attach_arrays, detach_arrays, share_arrays
 
 BTOL = np.finfo(np.float32).eps
 """The tolerance used for checking bounds feasibility."""
@@ -28,29 +36,166 @@ bad_delta = None
 bad_alpha = None
 
 
+def _optimize_fluxes(model, indices, direction):
+    """Minimize or maximize the flux of each reaction in turn.
+
+    Assumes that the objective of `model` has been set to zero. Only the
+    objective coefficients change between the LPs so the solver starts each
+    one from the optimal basis of the previous one. Returns one flux
+    distribution per optimal LP, obtained from a single bulk query of the
+    primal values.
+    """
+    forward, reverse, _ = _get_solution_indices(
+        model, model.reactions, model.metabolites)
+    model.solver.objective.direction = direction
+    points = []
+    for i in indices:
+        rxn = model.reactions[i]
+        # set the coefficients directly to avoid a reset of the objective
+        model.solver.objective.set_linear_coefficients(
+            {rxn.forward_variable: 1, rxn.reverse_variable: -1})
+        model.slim_optimize()
+        if model.solver.status == "optimal":
+            primals = _get_solver_values(
+                model.solver, "_get_primal_values", "primal_values")
+            points.append(primals[forward] - primals[reverse])
+        model.solver.objective.set_linear_coefficients(
+            {rxn.forward_variable: 0, rxn.reverse_variable: 0})
+    return np.array(points).reshape(-1, len(model.reactions))
+
+
+def _init_warmup_worker(model):
+    """Initialize a global model object for multiprocessing."""
+    global _warmup_model
+    _warmup_model = model
+
+
+def _warmup_chunk(args):
+    """Optimize a chunk of reactions in a worker process."""
+    direction, indices = args
+    return _optimize_fluxes(_warmup_model, indices, direction)
+
+
+def _optlang_warmup(model, indices, processes=1):
+    """Generate warmup points with the optlang interface of a model.
+
+    Parameters
+    ----------
+    model : cobra.Model
+        The model to optimize. It will not be modified.
+    indices : numpy.array
+        The indices of the reactions to minimize and maximize.
+    processes : int, optional
+        The number of worker processes. The reactions are split into one
+        chunk per process and direction.
+
+    Returns
+    -------
+    numpy.array
+        The flux distributions of all optimal LPs, the minimizations first.
+    """
+    with model:
+        model.objective = sympy_singletons.Zero
+        if processes > 1 and len(indices) > 1:
+            tasks = [(direction, chunk) for direction in ("min", "max")
+                     for chunk in np.array_split(indices, processes)]
+            pool = Pool(processes, initializer=_init_warmup_worker,
+                        initargs=(model,))
+            try:
+                points = pool.map(_warmup_chunk, tasks, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            points = [_optimize_fluxes(model, indices, direction)
+                      for direction in ("min", "max")]
+    return np.vstack(points)
+
+
 # Has to be declared outside of class to be used for multiprocessing :(
 def _step(sampler, x, delta, fraction=None):
     """Samples a new feasible point from the point `x` in direction `delta`."""
-    # delta = delta / np.sqrt((delta * delta).sum())
-    nonzero = np.abs(delta) > 0.0
-    alphas = ((1.0 - BTOL) * sampler.bounds - x)[:, nonzero]
-    alphas = (alphas / delta[nonzero]).flatten()
-    alpha_range = (alphas[alphas > 0.0].min(), alphas[alphas <= 0.0].max())
+    return _step_chains(sampler, x[np.newaxis], delta[np.newaxis],
+                        fraction)[0]
+
+
+def _step_chains(sampler, x, delta, fraction=None):
+    """Samples new feasible points for a batch of chains.
+
+    Each row of `x` is moved along the same row of `delta`. The step sizes
+    of all chains are obtained at once from the distances to the bounds.
+    """
+    # zero directions give NaN which is neither positive nor negative
+    delta_nan = np.where(delta != 0.0, delta, np.nan)
+    alphas = ((1.0 - BTOL) * sampler.bounds[:, np.newaxis, :] -
+              x[np.newaxis]) / delta_nan[np.newaxis]
+    # the smallest positive and the largest non-positive step of each chain
+    alpha_pos = np.where(alphas > 0.0, alphas, np.inf).min(axis=(0, 2))
+    alpha_neg = np.where(alphas <= 0.0, alphas, -np.inf).max(axis=(0, 2))
     if fraction:
-        alpha = alpha_range[0] + fraction * (alpha_range[1] - alpha_range[0])
+        alpha = alpha_pos + fraction * (alpha_neg - alpha_pos)
     else:
-        alpha = np.random.uniform(alpha_range[0], alpha_range[1])
-    p = x + alpha * delta
+        alpha = np.random.uniform(alpha_pos, alpha_neg)
+    p = x + alpha[:, np.newaxis] * delta
 
     # Numerical instabilities may cause bounds invalidation
     # reset sampler and sample from one of the original warmup directions
     # if that occurs
-    if np.any(sampler._bounds_dist(p) < -BTOL):
-        newdir = sampler.warmup[np.random.randint(sampler.n_warmup)]
-        return _step(sampler, sampler.center, newdir - sampler.center)
+    bad = np.minimum(p - sampler.bounds[0, ], sampler.bounds[1, ] - p).min(
+        axis=1) < -BTOL
+    if bad.any():
+        newdir = sampler.warmup[np.random.randint(sampler.n_warmup,
+                                                  size=bad.sum())]
+        center = np.tile(sampler.center, (newdir.shape[0], 1))
+        p[bad] = _step_chains(sampler, center, newdir - center)
     return p
 
 
+def _sample_chains(sampler, prev, center, n_samples, n, update_center=1):
+    """Advances a batch of hit-and-run chains.
+
+    Parameters
+    ----------
+    sampler : HRSampler
+        The sampler providing bounds, warmup points and the nullspace.
+    prev : numpy.array
+        The current point of each chain, one chain per row.
+    center : numpy.array
+        The current estimate of the center of the sampling space.
+    n_samples : int
+        The number of points the center estimate is based on.
+    n : int
+        The number of samples to obtain from each chain.
+    update_center : int
+        The number of steps between updates of the center.
+
+    Returns
+    -------
+    tuple
+        The samples as an array of dimensions (n x chains x n_reactions)
+        and the new values of `prev`, `center` and `n_samples`.
+    """
+    k = prev.shape[0]
+    samples = np.zeros((n,) + prev.shape)
+    n_start = n_samples
+    for i in range(1, sampler.thinning * n + 1):
+        pi = np.random.randint(sampler.n_warmup, size=k)
+        # mix in the original warmup points to not get stuck
+        delta = sampler.warmup[pi, ] - center
+        prev = _step_chains(sampler, prev, delta)
+        # the center updates of a single chain decide about reprojection
+        n_chain = n_start + (n_samples - n_start) // k
+        if (n_chain * sampler.thinning % 1000 == 0):
+            prev = sampler._reproject(prev)
+        if i % update_center == 0:
+            center = (n_samples * center + prev.sum(axis=0)) / (
+                      n_samples + k)
+            n_samples += k
+        if i % sampler.thinning == 0:
+            samples[i//sampler.thinning - 1, ] = prev
+    return samples, prev, center, n_samples
+
+
 class HRSampler(object):
     """The abstract base class for hit-and-run samplers.
 
@@ -81,14 +226,30 @@ class HRSampler(object):
     seed : positive integer, optional
         Sets the random number seed. Initialized to the current time stamp if
         None.
+    chains : int, optional
+        The number of chains advanced together in each process. All chains
+        are updated with a single set of matrix operations per step, which
+        is much faster than advancing one chain at a time.
+    reduced : bool, optional
+        Whether to sample only the reactions which are neither fixed nor
+        blocked, within the nullspace of their stoichiometry (see
+        `ReducedSpace`).
+    statistics : RunningStatistics
+        Running moments, quantiles and convergence diagnostics of all samples
+        generated so far. None before the first call to `sample`.
     """
 
-    def __init__(self, model, thinning, seed=None):
+    def __init__(self, model, thinning, seed=None, chains=1, reduced=False):
         self.model = model
         self.thinning = thinning
+        self.chains = chains
+        self.reduced = reduced
         self.n_samples = 0
-        self.S = create_stoichiometric_array(model, array_type='dense')
-        self.NS = nullspace(self.S)
+        self.statistics = None
+        self.S = model.S.dense
+        # the reduced sampler only needs the nullspace of the free reactions
+        self.NS = None if reduced else model.S.nullspace()
+        self._space = None
         self.bounds = np.array([[r.lower_bound, r.upper_bound]
                                for r in model.reactions]).T
         self.fixed = np.diff(self.bounds, axis=0).flatten() < 2 * BTOL
@@ -100,52 +261,151 @@ class HRSampler(object):
         # Avoid overflow
         self._seed = self._seed % np.iinfo(np.int32).max
 
-    def generate_fva_warmup(self, solver=None, **solver_args):
+    def generate_fva_warmup(self, solver=None, processes=1, **solver_args):
         """Generates the warmup points for the sampler.
 
         Generates warmup points by setting each flux as the sole objective
-        and minimizing/maximizing it.
+        and minimizing/maximizing it. Fixed reactions are skipped.
 
         Parameters
         ----------
-        solver : str or cobra solver interface, optional
-            The solver used for the arising LP problems.
+        solver : str, optional
+            The solver used for the arising LP problems. If None the optlang
+            solver of the model is used, otherwise the name of a legacy
+            solver.
+        processes : int, optional
+            The number of worker processes solving the LPs. Each process
+            receives its own copy of the problem. Ignored for legacy solvers.
         **solver_args
-            Additional arguments passed to the solver.
+            Additional arguments passed to the legacy solver.
         """
-
-        solver = solver_dict[get_solver_name() if solver is None else solver]
+        legacy, solver = sutil.choose_solver(self.model, solver)
+        indices = np.flatnonzero(~self.fixed)
+        if legacy:
+            warmup = self._legacy_warmup(solver, indices, **solver_args)
+        else:
+            warmup = _optlang_warmup(self.model, indices, processes)
+        # some solvers do not enforce bounds too much -> we reconstrain
+        self.warmup = np.minimum(np.maximum(warmup, self.bounds[0, ]),
+                                 self.bounds[1, ])
+        self.n_warmup = self.warmup.shape[0]
+
+    def _legacy_warmup(self, solver, indices, **solver_args):
+        """Generate the warmup points with a legacy solver interface."""
         lp = solver.create_problem(self.model)
         for i, r in enumerate(self.model.reactions):
             solver.change_variable_objective(lp, i, 0.0)
 
-        self.n_warmup = 0
-        self.warmup = np.zeros((2 * len(self.model.reactions),
-                                len(self.model.reactions)))
-
+        warmup = []
         for sense in ("minimize", "maximize"):
-            for i, r in enumerate(self.model.reactions):
-                # Omit fixed reactions
-                if self.fixed[i]:
-                    pass
+            for i in indices:
                 solver.change_variable_objective(lp, i, 1.0)
                 solver.solve_problem(lp, objective_sense=sense, **solver_args)
                 sol = solver.format_solution(lp, self.model).x
-                if not sol:
-                    pass
-                # some solvers do not enforce bounds too much -> we reconstrain
-                sol = np.maximum(sol, self.bounds[0, ])
-                sol = np.minimum(sol, self.bounds[1, ])
-                self.warmup[self.n_warmup, ] = sol
-                self.n_warmup += 1
                 # revert objective
                 solver.change_variable_objective(lp, i, 0.)
-        # Shrink warmup points to measure
-        self.warmup = self.warmup[0:self.n_warmup, ]
+                if sol:
+                    warmup.append(sol)
+        return np.array(warmup).reshape(-1, len(self.model.reactions))
 
     def _reproject(self, p):
-        """Reprojects a point into the feasibility region"""
-        return self.NS.dot(self.NS.T.dot(p))
+        """Reprojects a point or rows of points into the feasibility region"""
+        return p.dot(self.NS).dot(self.NS.T)
+
+    def _walk_space(self):
+        """Get the space in which the chains move.
+
+        This is the sampler itself or the reduced space of its free
+        reactions, which is set up again whenever the warmup points change.
+        """
+        if not self.reduced:
+            return self
+        if self._space is None or \
+                self._space.sampler_warmup is not self.warmup:
+            self._space = ReducedSpace(self)
+        return self._space
+
+    @property
+    def n_chains(self):
+        """The total number of chains of the sampler."""
+        return self.chains
+
+    def _record(self, samples, chains):
+        """Add new samples of the given chains to the running statistics."""
+        if self.statistics is None or \
+                self.statistics.n_chains != self.n_chains:
+            self.statistics = RunningStatistics(
+                self.n_chains, [r.id for r in self.model.reactions],
+                seed=self._seed)
+        self.statistics.update(samples, chains)
+
+    def converged(self, rhat=1.1, ess=None):
+        """Check the running statistics against convergence targets.
+
+        Parameters
+        ----------
+        rhat : float, optional
+            The largest acceptable R-hat of any reaction. Not checked if
+            None.
+        ess : float, optional
+            The smallest acceptable effective sample size of any reaction.
+            Not checked if None.
+
+        Returns
+        -------
+        bool
+            Whether all targets are met.
+        """
+        if self.statistics is None:
+            return False
+        if rhat is not None and (self.statistics.rhat() > rhat).any():
+            return False
+        if ess is not None and self.statistics.ess().min() < ess:
+            return False
+        return True
+
+    def sample_until(self, rhat=1.1, ess=None, batch_size=1000,
+                     max_samples=None):
+        """Generate samples until the chains have converged.
+
+        Sampling proceeds in batches and stops as soon as the targets for
+        R-hat and the effective sample size are met for all reactions. The
+        diagnostics include all samples generated by this sampler so far
+        and are available in `statistics` afterwards.
+
+        Parameters
+        ----------
+        rhat : float, optional
+            The largest acceptable R-hat of any reaction. Requires at least
+            two chains. Not checked if None.
+        ess : float, optional
+            The smallest acceptable effective sample size of any reaction.
+            Not checked if None.
+        batch_size : int, optional
+            The number of samples generated between checks.
+        max_samples : int, optional
+            Stop after this many samples even without convergence.
+
+        Returns
+        -------
+        numpy.matrix
+            The samples generated by this call with one sample per row.
+        """
+        if rhat is not None and self.n_chains < 2:
+            raise ValueError("R-hat requires a sampler with at least two "
+                             "chains")
+        batches = []
+        n = 0
+        while True:
+            batches.append(self.sample(batch_size))
+            n += batches[-1].shape[0]
+            if self.converged(rhat, ess):
+                break
+            if max_samples is not None and n >= max_samples:
+                warn("sampling stopped after %d samples without reaching "
+                     "the convergence targets" % n)
+                break
+        return np.vstack(batches)
 
     def _bounds_dist(self, p):
         """Get the lower and upper bound distances. Negative is bad."""
@@ -160,7 +420,7 @@ class HRSampler(object):
         """
         pass
 
-    def batch(self, batch_size, batch_num):
+    def batch(self, batch_size, batch_num=None):
         """Generates a batch generator.
 
         This is useful to generate n batches of m samples each.
@@ -169,8 +429,9 @@ class HRSampler(object):
         ----------
         batch_size : int
             The number of samples contained in each batch (m).
-        batch_num : int
-            The number of batches in the generator (n).
+        batch_num : int, optional
+            The number of batches in the generator (n). Batches are generated
+            indefinitely if None.
 
         Yields
         ------
@@ -178,8 +439,80 @@ class HRSampler(object):
             A matrix containing with dimensions (batch_size x n_r) containing
             a valid flux sample for a total of n_r reactions in each row.
         """
-        for i in range(batch_num):
-            yield self.sample(batch_size)
+        i = 0
+        while batch_num is None or i < batch_num:
+            yield self.sample(batch_size)[:batch_size]
+            i += 1
+
+    def get_state(self):
+        """Get the state of the chains.
+
+        Returns
+        -------
+        dict
+            The center, the number of generated samples, the running
+            statistics, the current points of the chains if the sampler
+            keeps them and the state of the random number generator.
+        """
+        state = {"center": np.array(self.center),
+                 "n_samples": self.n_samples,
+                 "random_state": np.random.get_state(),
+                 "statistics": self.statistics}
+        if hasattr(self, "prev"):
+            state["prev"] = np.array(self.prev)
+        return state
+
+    def set_state(self, state):
+        """Continue the chains from a state obtained by `get_state`."""
+        self.center = state["center"]
+        self.n_samples = state["n_samples"]
+        self.statistics = state.get("statistics")
+        np.random.set_state(state["random_state"])
+        if "prev" in state:
+            self.prev = state["prev"]
+
+    def sample_to(self, out, n, batch_size=1000):
+        """Generate samples in batches and write them to an array or store.
+
+        Only one batch is kept in memory at a time, so this can generate
+        more samples than fit into memory.
+
+        Parameters
+        ----------
+        out : numpy.array, numpy.memmap, SampleStore or str
+            Where to write the samples. Arrays, including memory-mapped
+            ones, are filled row by row and need at least `n` rows. A string
+            is taken as the directory of a `SampleStore`. A store resumes
+            from the state of the chains saved with its last batch and only
+            the missing samples are generated.
+        n : int
+            The total number of samples.
+        batch_size : int, optional
+            The number of samples generated at once.
+
+        Returns
+        -------
+        numpy.array, numpy.memmap or SampleStore
+            The object the samples were written to.
+        """
+        if isinstance(out, string_types):
+            out = SampleStore(out)
+        if isinstance(out, SampleStore):
+            if out.n_samples > 0:
+                self.set_state(out.load_state())
+            done = out.n_samples
+        else:
+            done = 0
+        while done < n:
+            samples = self.sample(min(batch_size, n - done))[:n - done]
+            if isinstance(out, SampleStore):
+                out.append(samples, self)
+            else:
+                out[done:done + samples.shape[0]] = samples
+            done += samples.shape[0]
+        if isinstance(out, np.memmap):
+            out.flush()
+        return out
 
     def validate(self, samples):
         """Validates a set of samples for equality and inequality feasibility.
@@ -218,6 +551,340 @@ class HRSampler(object):
         return codes
 
 
+class RunningStatistics(object):
+    """One-pass statistics and convergence diagnostics of sampling chains.
+
+    Samples are added in batches together with the chain they belong to.
+    Means and variances are updated per chain with the parallel variant of
+    Welford's algorithm. Quantiles are approximated from a uniform
+    reservoir sample of fixed size.
+
+    Parameters
+    ----------
+    n_chains : int
+        The number of chains.
+    reactions : list of str, optional
+        The reaction identifiers used to label the summary.
+    reservoir_size : int, optional
+        The number of samples kept to approximate quantiles.
+    seed : int, optional
+        The seed for choosing the reservoir samples. The random number
+        generator is separate from the one of the samplers.
+
+    Attributes
+    ----------
+    n : int
+        The number of samples seen.
+    """
+
+    def __init__(self, n_chains, reactions=None, reservoir_size=1000,
+                 seed=None):
+        self.n_chains = n_chains
+        self.reactions = reactions
+        self.reservoir_size = reservoir_size
+        self.n = 0
+        self._random = np.random.RandomState(seed)
+        self._counts = np.zeros(n_chains)
+        self._means = None
+        self._m2 = None
+        self._lagged = None
+        self._pairs = np.zeros(n_chains)
+        self._last = None
+        self._reservoir = None
+
+    def update(self, samples, chains):
+        """Add samples.
+
+        Parameters
+        ----------
+        samples : numpy.array
+            The samples, one per row, in the order they were generated.
+        chains : numpy.array
+            The chain of each sample.
+        """
+        samples = np.atleast_2d(samples)
+        chains = np.asarray(chains)
+        if self._means is None:
+            shape = (self.n_chains, samples.shape[1])
+            self._means, self._m2, self._lagged, self._last = (
+                np.zeros(shape), np.zeros(shape), np.zeros(shape),
+                np.full(shape, np.nan))
+            self._reservoir = np.zeros((self.reservoir_size,
+                                        samples.shape[1]))
+        counts = np.bincount(chains, minlength=self.n_chains).astype(float)
+        used = counts > 0
+        sums = np.zeros_like(self._means)
+        np.add.at(sums, chains, samples)
+        means = sums[used] / counts[used, np.newaxis]
+        m2 = np.zeros_like(self._means)
+        np.add.at(m2, chains, (samples - sums[chains] /
+                               counts[chains, np.newaxis]) ** 2)
+        # merge batch and running moments (Chan et al.)
+        n_a, n_b = self._counts[used, np.newaxis], counts[used, np.newaxis]
+        delta = means - self._means[used]
+        self._means[used] += delta * n_b / (n_a + n_b)
+        self._m2[used] += m2[used] + delta ** 2 * n_a * n_b / (n_a + n_b)
+        self._counts += counts
+        # products of consecutive samples of each chain
+        order = np.argsort(chains, kind="mergesort")
+        ordered, ordered_chains = samples[order], chains[order]
+        previous = np.vstack([ordered[:1], ordered[:-1]])
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = ordered_chains[1:] != ordered_chains[:-1]
+        previous[first] = self._last[ordered_chains[first]]
+        valid = ~np.isnan(previous[:, 0])
+        np.add.at(self._lagged, ordered_chains[valid],
+                  ordered[valid] * previous[valid])
+        self._pairs += np.bincount(ordered_chains[valid],
+                                   minlength=self.n_chains)
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = ordered_chains[1:] != ordered_chains[:-1]
+        self._last[ordered_chains[last]] = ordered[last]
+        # reservoir sampling (algorithm R)
+        seen = self.n + np.arange(samples.shape[0])
+        fill = seen < self.reservoir_size
+        self._reservoir[seen[fill]] = samples[fill]
+        j = (self._random.random_sample(len(seen)) * (seen + 1)).astype(int)
+        replace = ~fill & (j < self.reservoir_size)
+        self._reservoir[j[replace]] = samples[replace]
+        self.n += samples.shape[0]
+
+    @property
+    def mean(self):
+        """The mean of each reaction over all chains."""
+        return (self._counts[:, np.newaxis] * self._means).sum(
+            axis=0) / self._counts.sum()
+
+    @property
+    def variance(self):
+        """The sample variance of each reaction over all chains."""
+        mean = self.mean
+        m2 = (self._m2 + self._counts[:, np.newaxis] *
+              (self._means - mean) ** 2).sum(axis=0)
+        return m2 / (self._counts.sum() - 1)
+
+    def quantile(self, q):
+        """Approximate quantiles of each reaction.
+
+        Parameters
+        ----------
+        q : float or list of floats
+            The quantiles between 0 and 1.
+        """
+        return np.percentile(self._reservoir[:self.n], np.asarray(q) * 100,
+                             axis=0)
+
+    def rhat(self):
+        """The Gelman-Rubin potential scale reduction of each reaction.
+
+        Values close to 1 mean that the chains sample the same
+        distribution. Needs at least two chains with two samples each.
+        """
+        n = self._counts.min()
+        if self.n_chains < 2 or n < 2:
+            return np.full(self._means.shape[1], np.inf)
+        within = (self._m2 / (self._counts[:, np.newaxis] - 1)).mean(axis=0)
+        between = self._means.var(axis=0, ddof=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rhat = np.sqrt(((n - 1) / n * within + between) / within)
+        # reactions without any variation have converged
+        rhat[(within == 0) & (between == 0)] = 1.0
+        return rhat
+
+    def ess(self):
+        """The effective sample size of each reaction.
+
+        Every chain is approximated as a first order autoregressive process
+        whose lag-1 autocorrelation is estimated from consecutive samples.
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            variance = self._m2 / self._counts[:, np.newaxis]
+            rho = (self._lagged / self._pairs[:, np.newaxis] -
+                   self._means ** 2) / variance
+        rho = np.clip(np.nan_to_num(rho), -0.999, 0.999)
+        return (self._counts[:, np.newaxis] * (1 - rho) / (1 + rho)).sum(
+            axis=0)
+
+    def summary(self, quantiles=(0.05, 0.5, 0.95)):
+        """Summarize the statistics of all reactions.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The mean, standard deviation, quantiles, effective sample size
+            and R-hat with one row per reaction.
+        """
+        data = {"mean": self.mean, "std": np.sqrt(self.variance),
+                "ess": self.ess(), "rhat": self.rhat()}
+        columns = ["mean", "std"]
+        for q, values in zip(quantiles, self.quantile(quantiles)):
+            data["q%g" % q] = values
+            columns.append("q%g" % q)
+        return pandas.DataFrame(data, index=self.reactions,
+                                columns=columns + ["ess", "rhat"])
+
+
+class SampleStore(object):
+    """Samples stored on disk as a directory of numbered .npy chunks.
+
+    Every chunk is written together with the state of the sampler chains so
+    an interrupted run can be resumed with `HRSampler.sample_to`.
+
+    Parameters
+    ----------
+    path : str
+        The directory of the store. It is created if it does not exist.
+    dtype : numpy.dtype, optional
+        The data type used to store the samples, e.g. `numpy.float32` to
+        halve the required disk space. Defaults to the type of the existing
+        chunks or `numpy.float64` for a new store.
+
+    Attributes
+    ----------
+    n_samples : int
+        The number of stored samples.
+    reactions : list of str
+        The reaction identifiers of the columns or None for an empty store.
+    """
+
+    def __init__(self, path, dtype=None):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        if dtype is None:
+            chunks = self.chunks
+            dtype = np.load(chunks[0], mmap_mode="r").dtype if chunks \
+                else np.float64
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def chunks(self):
+        """The file names of all chunks in order."""
+        return sorted(glob(os.path.join(self.path, "chunk_*.npy")))
+
+    @property
+    def n_samples(self):
+        return sum(np.load(chunk, mmap_mode="r").shape[0]
+                   for chunk in self.chunks)
+
+    @property
+    def reactions(self):
+        state = os.path.join(self.path, "state.pickle")
+        if not os.path.exists(state):
+            return None
+        return self.load_state()["reactions"]
+
+    def append(self, samples, sampler):
+        """Store a batch of samples and the state of the sampler."""
+        chunk = os.path.join(self.path, "chunk_%08d.npy" % len(self.chunks))
+        np.save(chunk, np.asarray(samples, dtype=self.dtype))
+        state = sampler.get_state()
+        state["reactions"] = [r.id for r in sampler.model.reactions]
+        with open(os.path.join(self.path, "state.pickle"), "wb") as handle:
+            pickle.dump(state, handle, pickle.HIGHEST_PROTOCOL)
+
+    def load_state(self):
+        """Get the sampler state saved with the last chunk."""
+        with open(os.path.join(self.path, "state.pickle"), "rb") as handle:
+            return pickle.load(handle)
+
+    def __iter__(self):
+        """Iterate over the chunks as memory-mapped arrays."""
+        for chunk in self.chunks:
+            yield np.load(chunk, mmap_mode="r")
+
+    def to_frame(self):
+        """Load all samples into a DataFrame with reactions as columns."""
+        chunks = list(self)
+        data = np.vstack(chunks) if chunks else None
+        return pandas.DataFrame(columns=self.reactions, data=data)
+
+
+class ReducedSpace(object):
+    """The free reactions of a sampler as a space for the random walk.
+
+    Reactions which are fixed by their bounds or blocked, i.e. take the same
+    value in all warmup points, are removed. The flux space of the free
+    reactions that is compatible with the steady state of the removed ones
+    is described by an origin and the cached nullspace basis of their
+    stoichiometry. The warmup points and the center are projected onto it,
+    so all directions of the walk lie in the nullspace. Like in the full
+    space, the chains are reprojected periodically to remove the drift from
+    rounding errors.
+
+    Parameters
+    ----------
+    sampler : HRSampler
+        The sampler with generated warmup points.
+
+    Attributes
+    ----------
+    free : numpy.array
+        The indices of the free reactions.
+    values : numpy.array
+        The flux values of all reactions used for the removed ones.
+    bounds, warmup, center : numpy.array
+        The sampler attributes restricted to the free reactions.
+    n_warmup, thinning : int
+        Same as for the sampler.
+    sampler_warmup : numpy.array
+        The warmup points of the sampler the space was built from. Not
+        included when pickling.
+    """
+
+    _shared_arrays = ("bounds", "warmup", "_basis")
+
+    def __init__(self, sampler):
+        self.sampler_warmup = sampler.warmup
+        self.thinning = sampler.thinning
+        warmup = sampler.warmup
+        blocked = (warmup.max(axis=0) - warmup.min(axis=0)) < BTOL
+        fixed = sampler.fixed | blocked
+        self.free = np.flatnonzero(~fixed)
+        self.values = warmup.mean(axis=0)
+        self.values[sampler.fixed] = sampler.bounds[0, sampler.fixed]
+        S_free = np.atleast_2d(sampler.S[:, self.free])
+        rhs = -sampler.S[:, fixed].dot(self.values[fixed])
+        self._basis = sampler.model.S.nullspace(self.free)
+        # the smallest correction of the warmup center that is a steady
+        # state for the values of the removed reactions
+        center = self.values[self.free]
+        self._origin = center - np.linalg.lstsq(
+            S_free, S_free.dot(center) - rhs, rcond=None)[0]
+        self.bounds = sampler.bounds[:, self.free]
+        self.warmup = self.project(warmup[:, self.free])
+        self.n_warmup = self.warmup.shape[0]
+        self.center = self.warmup.mean(axis=0)
+
+    def project(self, points):
+        """Project free fluxes onto the steady-state flux space."""
+        return self._origin + (points - self._origin).dot(
+            self._basis).dot(self._basis.T)
+
+    def reduce(self, points):
+        """Map full flux vectors to the free reactions."""
+        return self.project(np.asarray(points)[..., self.free])
+
+    def expand(self, points):
+        """Map points of the free reactions to full flux vectors."""
+        points = np.atleast_2d(points)
+        full = np.tile(self.values, (points.shape[0], 1))
+        full[:, self.free] = points
+        return full
+
+    def _reproject(self, p):
+        """Reprojects rows of points onto the steady-state flux space."""
+        return self.project(p)
+
+    def __getstate__(self):
+        d = detach_arrays(self)
+        d['sampler_warmup'] = None
+        return d
+
+    def __setstate__(self, state):
+        attach_arrays(self, state)
+
+
 class ARCHSampler(HRSampler):
     """Artificial Centering Hit-and-Run sampler.
 
@@ -230,12 +897,20 @@ class ARCHSampler(HRSampler):
     thinning : int, optional
         The thinning factor of the generated sampling chain. A thinning of 10
         means samples are returned every 10 steps.
-    solver : str or cobra solver interface, optional
+    solver : str, optional
         The solver used for the arising LP problems during warmup point
-        generation.
+        generation. If None the optlang solver of the model is used,
+        otherwise the name of a legacy solver.
     seed : positive integer, optional
         Sets the random number seed. Initialized to the current time stamp if
         None.
+    chains : int, optional
+        The number of chains advanced together as a matrix in each process.
+        Many chains give many more samples per second.
+    reduced : bool, optional
+        Whether to sample only the free reactions in the nullspace of their
+        stoichiometry. Fixed and blocked reactions are removed, which
+        makes every step and reprojection cheaper.
     **solver_args
         Additional arguments passed to the solver.
 
@@ -255,7 +930,8 @@ class ARCHSampler(HRSampler):
         A matrix of with as many columns as reactions in the model and more
         than 3 rows containing a warmup sample in each row.
     prev : numpy array
-        The current/last flux sample generated.
+        The current/last flux sample generated. With several chains this is
+        a matrix holding the current point of each chain in its rows.
     center : numpy array
         The center of the sampling space as estimated by the mean of all
         previously generated samples.
@@ -280,24 +956,13 @@ class ARCHSampler(HRSampler):
     """
 
     def __init__(self, model, thinning=100, solver=None,
-                 seed=None, **solver_kwargs):
-        super(ARCHSampler, self).__init__(model, thinning, seed=seed)
+                 seed=None, chains=1, reduced=False, **solver_kwargs):
+        super(ARCHSampler, self).__init__(model, thinning, seed=seed,
+                                          chains=chains, reduced=reduced)
         self.generate_fva_warmup(solver, **solver_kwargs)
         self.prev = self.center = self.warmup.mean(axis=0)
         np.random.seed(self._seed)
 
-    def __single_iteration(self):
-        pi = np.random.randint(self.n_warmup)
-        # mix in the original warmup points to not get stuck
-        p = self.warmup[pi, ]
-        delta = p - self.center
-        self.prev = _step(self, self.prev, delta)
-        if (self.n_samples * self.thinning % 1000 == 0):
-            self.prev = self._reproject(self.prev)
-        self.center = (self.n_samples * self.center + self.prev) / (
-                       self.n_samples + 1)
-        self.n_samples += 1
-
     def sample(self, n):
         """Generate a set of samples.
 
@@ -317,46 +982,66 @@ class ARCHSampler(HRSampler):
         -----
         Performance of this function linearly depends on the number
         of reactions in your model and the thinning factor.
+
+        With several chains each chain contributes every `chains`-th sample.
         """
-        samples = np.zeros((n, len(self.model.reactions)))
-        for i in range(1, self.thinning * n + 1):
-            self.__single_iteration()
-            if (self.n_samples * self.thinning % 1000 == 0):
-                self.prev = self.NS.dot(self.NS.T.dot(self.prev))
-            if i % self.thinning == 0:
-                samples[i//self.thinning - 1, ] = self.prev
+        n_chain = int(np.ceil(n / self.chains))
+        prev = self.prev if self.prev.ndim == 2 else \
+            np.tile(self.prev, (self.chains, 1))
+        space = self._walk_space()
+        center = self.center
+        if space is not self:
+            prev = space.reduce(prev)
+            center = space.center = space.reduce(center)
+        samples, prev, center, self.n_samples = _sample_chains(
+            space, prev, center, self.n_samples, n_chain)
+        samples = samples.reshape(-1, samples.shape[2])[:n]
+        if space is not self:
+            samples, prev = space.expand(samples), space.expand(prev)
+            center = space.expand(center)[0]
+        self.center = center
+        self.prev = prev[0] if self.chains == 1 else prev
+        self._record(samples, np.arange(samples.shape[0]) % self.chains)
         return samples
 
 
 # Unfortunately this has to be outside the class to be usable with
 # multiprocessing :()
+def _init_worker(sampler):
+    """Store the sampler of a worker process in a global."""
+    global _sampler
+    _sampler = sampler
+
+
+def _sample_worker_chain(args):
+    """samples a single chain with the sampler of a worker process."""
+    n, idx = args
+    return _sample_chain((_sampler, n, idx))
+
+
 def _sample_chain(args):
     """samples a single chain for OptGPSampler.
 
     center and n_samples are updated locally and forgotten afterwards.
     """
     sampler, n, idx = args       # has to be this way to work in Python 2.7
+    # the reduced space is set up by the sampler before starting the chains
+    space = sampler._space if sampler.reduced else sampler
     center = sampler.center
-    np.random.seed((sampler._seed + idx) % np.iinfo(np.int32).max)
-    prev = sampler.warmup[np.random.randint(sampler.n_warmup), ]
-    prev = _step(sampler, center, prev - center, 0.95)
+    if space is not sampler:
+        center = space.center = space.reduce(center)
+    k = sampler.chains
+    # continue with new random numbers on subsequent calls
+    np.random.seed((sampler._seed + idx + sampler.n_samples) %
+                   np.iinfo(np.int32).max)
+    prev = space.warmup[np.random.randint(space.n_warmup, size=k), ]
+    prev = _step_chains(space, np.tile(center, (k, 1)), prev - center,
+                        0.95)
     n_samples = max(sampler.n_samples, 1)
-    samples = np.zeros((n, center.shape[0]))
-
-    for i in range(1, sampler.thinning * n + 1):
-        pi = np.random.randint(sampler.n_warmup)
-        p = sampler.warmup[pi, ]
-
-        delta = p - center
-        prev = _step(sampler, prev, delta)
-        if (n_samples * sampler.thinning % 1000 == 0):
-            prev = sampler._reproject(prev)
-        if i % sampler.thinning == 0:
-            samples[i//sampler.thinning - 1, ] = prev
-            center = (n_samples * center + prev) / (n_samples + 1)
-            n_samples += 1
-
-    return samples
+    samples = _sample_chains(space, prev, center, n_samples,
+                             int(np.ceil(n / k)), sampler.thinning)[0]
+    samples = samples.reshape(-1, center.shape[0])[:n]
+    return samples if space is sampler else space.expand(samples)
 
 
 class OptGPSampler(HRSampler):
@@ -370,16 +1055,25 @@ class OptGPSampler(HRSampler):
     model : cobra.Model
         The cobra model from which to generate samples.
     processes: int
-        The number of processes used during sampling.
+        The number of processes used during warmup point generation and
+        sampling.
     thinning : int, optional
         The thinning factor of the generated sampling chain. A thinning of 10
         means samples are returned every 10 steps.
-    solver : str or cobra solver interface, optional
+    solver : str, optional
         The solver used for the arising LP problems during warmup point
-        generation.
+        generation. If None the optlang solver of the model is used,
+        otherwise the name of a legacy solver.
     seed : positive integer, optional
         Sets the random number seed. Initialized to the current time stamp if
         None.
+    chains : int, optional
+        The number of chains advanced together as a matrix in each process.
+        Many chains give many more samples per second.
+    reduced : bool, optional
+        Whether to sample only the free reactions in the nullspace of their
+        stoichiometry. Fixed and blocked reactions are removed, which
+        makes every step and reprojection cheaper.
     **solver_args
         Additional arguments passed to the solver.
 
@@ -428,10 +1122,12 @@ class OptGPSampler(HRSampler):
     """
 
     def __init__(self, model, processes, thinning=100, solver=None,
-                 seed=None, **solver_kwargs):
-        super(OptGPSampler, self).__init__(model, thinning, seed=seed)
-        self.generate_fva_warmup(solver, **solver_kwargs)
+                 seed=None, chains=1, reduced=False, **solver_kwargs):
+        super(OptGPSampler, self).__init__(model, thinning, seed=seed,
+                                           chains=chains, reduced=reduced)
         self.np = processes
+        self.generate_fva_warmup(solver, processes=processes,
+                                 **solver_kwargs)
 
         # This maps our saved center into shared memory,
         # meaning they are synchronized across processes
@@ -467,18 +1163,30 @@ class OptGPSampler(HRSampler):
         we recommend to calculate large numbers of samples at once
         (`n` > 1000).
         """
+        space = self._walk_space()
         if self.np > 1:
             n_process = np.ceil(n / self.np).astype(int)
             n = n_process * self.np
+            # The large arrays are placed in shared memory and the workers
+            # attach to them instead of receiving copies. They stay there
+            # for later calls. Sharing keeps the values of the warmup
+            # points, so the existing reduced space stays valid and is
+            # shared as well.
+            share_arrays(self, self._shared_arrays)
+            if space is not self:
+                space.sampler_warmup = self.warmup
+                share_arrays(space, space._shared_arrays)
             # No with statement or starmap here since Python 2.x
             # does not support it :(
-            mp = Pool(self.np)
-            chains = mp.map(
-                _sample_chain,
-                zip([self] * self.np, [n_process] * self.np, range(self.np))
-                )
+            mp = Pool(self.np, initializer=_init_worker, initargs=(self,))
+            try:
+                chains = mp.map(
+                    _sample_worker_chain,
+                    zip([n_process] * self.np, range(self.np))
+                    )
+            finally:
+                mp.terminate()
             chains = np.vstack(chains)
-            mp.terminate()
         else:
             chains = _sample_chain((self, n, 0))
 
@@ -487,17 +1195,34 @@ class OptGPSampler(HRSampler):
                        n * np.atleast_2d(chains).mean(axis=0)) / (
                        self.n_samples + n)
         self.n_samples += n
+        # every process returns an equal share of samples from its chains
+        n_process = n // self.np
+        self._record(chains, np.repeat(np.arange(self.np) * self.chains,
+                                       n_process) +
+                     np.tile(np.arange(n_process) % self.chains, self.np))
         return chains
 
+    @property
+    def n_chains(self):
+        return self.np * self.chains
+
     # Models can be large so don't pass them around during multiprocessing
+    # and only pass handles to the arrays in shared memory
+    _shared_arrays = ("S", "NS", "bounds", "warmup")
+
     def __getstate__(self):
-        d = dict(self.__dict__)
+        d = detach_arrays(self)
         del d['model']
+        d['statistics'] = None
         return d
 
+    def __setstate__(self, state):
+        attach_arrays(self, state)
+
 
 def sample(model, n, method="optgp", processes=1, seed=None,
-           solver=None, **solver_kwargs):
+           solver=None, chains=1, reduced=False, batch_size=None,
+           **solver_kwargs):
     """Samples valid flux distribution from a cobra model.
 
     The function samples valid flux distributions from a cobra model.
@@ -525,18 +1250,27 @@ def sample(model, n, method="optgp", processes=1, seed=None,
     processes : int, optional
         Only used for 'optgp'. The number of processes used to generate
         samples.
-    solver : str or cobra solver interface, optional
+    solver : str, optional
         The solver used for the arising LP problems during warmup point
-        generation.
+        generation. If None the optlang solver of the model is used,
+        otherwise the name of a legacy solver.
     seed : positive integer, optional
         The random number seed to be used. Initialized to current time stamp
         if None.
+    chains : int, optional
+        The number of chains advanced together in each process.
+    reduced : bool, optional
+        Whether to sample in the nullspace of the reactions which are
+        neither fixed nor blocked.
+    batch_size : int, optional
+        If given, the samples are streamed as a generator of DataFrames with
+        at most `batch_size` samples each instead of being returned at once.
     **solver_args
         Additional arguments passed to the solver.
 
     Returns
     -------
-    pandas.DataFrame
+    pandas.DataFrame or generator of pandas.DataFrame
         The generated flux samples. Each row corresponds to a sample of the
         fluxes and the columns are the reactions.
 
@@ -558,11 +1292,24 @@ def sample(model, n, method="optgp", processes=1, seed=None,
     """
     if method == "optgp":
         sampler = OptGPSampler(model, processes, solver=solver, seed=seed,
+                               chains=chains, reduced=reduced,
                                **solver_kwargs)
     elif method == "arch":
-        sampler = ARCHSampler(model, solver=solver, seed=seed, **solver_kwargs)
+        sampler = ARCHSampler(model, solver=solver, seed=seed, chains=chains,
+                              reduced=reduced, **solver_kwargs)
     else:
         raise ValueError("method must be 'optgp' or 'arch'!")
 
-    return pandas.DataFrame(columns=[rxn.id for rxn in model.reactions],
-                            data=sampler.sample(n))
+    columns = [rxn.id for rxn in model.reactions]
+    if batch_size is not None:
+        return _stream_batches(sampler, n, batch_size, columns)
+    return pandas.DataFrame(columns=columns, data=sampler.sample(n))
+
+
+def _stream_batches(sampler, n, batch_size, columns):
+    """Yield DataFrames of `batch_size` samples until `n` are generated."""
+    for i, samples in enumerate(sampler.batch(batch_size)):
+        samples = samples[:n - i * batch_size]
+        yield pandas.DataFrame(columns=columns, data=samples)
+        if (i + 1) * batch_size >= n:
+            break
@@ -2,13 +2,19 @@
 
 from __future__ import absolute_import
 
+import logging
+from collections import OrderedDict
+from multiprocessing import Pool
+
+import numpy
 import pandas
 from six import iteritems, string_types
 
 import cobra.solvers as legacy_solvers
 import cobra.util.solver as solvers
 from cobra.manipulation import delete_model_genes, undelete_model_genes
-from cobra.manipulation.delete import find_gene_knockout_reactions
+from cobra.manipulation.delete import (
+    CompiledGPR, find_gene_knockout_reactions)
 
 # this can be removed after deprecation of the old solver interface
 # since the optlang vrsion requires neither numpy nor scipy
@@ -19,9 +25,11 @@ except ImportError:
 else:
     from cobra.flux_analysis import moma
 
+LOGGER = logging.getLogger(__name__)
+
 
 def single_reaction_deletion(cobra_model, reaction_list=None, solver=None,
-                             method="fba", **solver_args):
+                             method="fba", processes=1, **solver_args):
     """Sequentially knocks out each reaction from a given reaction list.
 
     Parameters
@@ -38,6 +46,10 @@ def single_reaction_deletion(cobra_model, reaction_list=None, solver=None,
         Name of the solver to be used.
     method : str, optional
         The method used to obtain fluxes. Must be one of "fba" or "moma".
+    processes : int, optional
+        The number of parallel processes to run. Each process receives one
+        copy of the model and solves batches of knockouts. Ignored for legacy
+        solvers.
     solver_args : optional
         Additional arguments for the solver. Ignored for optlang solver, please
         use `model.solver.configuration` instead.
@@ -58,17 +70,21 @@ def single_reaction_deletion(cobra_model, reaction_list=None, solver=None,
                          for i in reaction_list]
     if method == "fba":
         result = single_reaction_deletion_fba(cobra_model, reaction_list,
-                                              solver=solver, **solver_args)
+                                              solver=solver,
+                                              processes=processes,
+                                              **solver_args)
     elif method == "moma":
         result = single_reaction_deletion_moma(cobra_model, reaction_list,
-                                               solver=solver, **solver_args)
+                                               solver=solver,
+                                               processes=processes,
+                                               **solver_args)
     else:
         raise ValueError("Unknown deletion method '%s'" % method)
     return pandas.DataFrame({'flux': result[0], 'status': result[1]})
 
 
 def single_reaction_deletion_fba(cobra_model, reaction_list, solver=None,
-                                 **solver_args):
+                                 processes=1, **solver_args):
     """Sequentially knocks out each reaction in a model using FBA.
 
     Not supposed to be called directly use
@@ -80,6 +96,8 @@ def single_reaction_deletion_fba(cobra_model, reaction_list, solver=None,
         List of reaction Ids or cobra.Reaction.
     solver: str, optional
         The name of the solver to be used.
+    processes : int, optional
+        The number of parallel processes to run.
 
     Returns
     -------
@@ -101,16 +119,10 @@ def single_reaction_deletion_fba(cobra_model, reaction_list, solver=None,
     status_dict = {}
 
     if not legacy:
-        with cobra_model as m:
-            m.solver = solver
-            for reaction in reaction_list:
-                with m:
-                    reaction.bounds = (0.0, 0.0)
-                    m.solver.optimize()
-                    status = m.solver.status
-                    status_dict[reaction.id] = status
-                    growth_rate_dict[reaction.id] = m.solver.objective.value \
-                        if status == "optimal" else 0.
+        knockouts = [(reaction.id, (reaction.id,))
+                     for reaction in reaction_list]
+        growth_rate_dict, status_dict = _optlang_deletion(
+            cobra_model, solver, knockouts, "fba", processes)
     else:
         # This entire block can be removed once the legacy solvers are
         # deprecated
@@ -131,7 +143,7 @@ def single_reaction_deletion_fba(cobra_model, reaction_list, solver=None,
 
 
 def single_reaction_deletion_moma(cobra_model, reaction_list, solver=None,
-                                  **solver_args):
+                                  processes=1, **solver_args):
     """Sequentially knocks out each reaction in a model using MOMA.
 
     Not supposed to be called directly use
@@ -143,6 +155,8 @@ def single_reaction_deletion_moma(cobra_model, reaction_list, solver=None,
         List of reaction IDs or cobra.Reaction.
     solver: str, optional
         The name of the solver to be used.
+    processes : int, optional
+        The number of parallel processes to run.
 
     Returns
     -------
@@ -171,20 +185,10 @@ def single_reaction_deletion_moma(cobra_model, reaction_list, solver=None,
     status_dict = {}
 
     if not legacy:
-        with cobra_model as m:
-            m.solver = solver
-            moma.add_moma(m)
-            for reaction in reaction_list:
-                with m:
-                    reaction.bounds = (0.0, 0.0)
-                    m.solver.optimize()
-                    status = m.solver.status
-                    status_dict[reaction.id] = status
-                    if status == "optimal":
-                        growth = m.variables.moma_old_objective.primal
-                    else:
-                        growth = 0.0
-                    growth_rate_dict[reaction.id] = growth
+        knockouts = [(reaction.id, (reaction.id,))
+                     for reaction in reaction_list]
+        growth_rate_dict, status_dict = _optlang_deletion(
+            cobra_model, solver, knockouts, "moma", processes)
     else:
         for reaction in reaction_list:
             index = cobra_model.reactions.index(reaction)
@@ -196,7 +200,7 @@ def single_reaction_deletion_moma(cobra_model, reaction_list, solver=None,
 
 
 def single_gene_deletion(cobra_model, gene_list=None, solver=None,
-                         method="fba", **solver_args):
+                         method="fba", processes=1, **solver_args):
     """Sequentially knocks out each gene from a given gene list.
 
     Parameters
@@ -211,6 +215,10 @@ def single_gene_deletion(cobra_model, gene_list=None, solver=None,
         The method used to obtain fluxes. Must be one of "fba" or "moma".
     solver : str, optional
         Name of the solver to be used.
+    processes : int, optional
+        The number of parallel processes to run. Each process receives one
+        copy of the model and solves batches of knockouts. Ignored for legacy
+        solvers.
     solver_args : optional
         Additional arguments for the solver. Ignored for optlang solver, please
         use `model.solver.configuration` instead.
@@ -231,17 +239,19 @@ def single_gene_deletion(cobra_model, gene_list=None, solver=None,
 
     if method == "fba":
         result = single_gene_deletion_fba(cobra_model, gene_list,
-                                          solver=solver, **solver_args)
+                                          solver=solver, processes=processes,
+                                          **solver_args)
     elif method == "moma":
         result = single_gene_deletion_moma(cobra_model, gene_list,
-                                           solver=solver, **solver_args)
+                                           solver=solver, processes=processes,
+                                           **solver_args)
     else:
         raise ValueError("Unknown deletion method '%s'" % method)
     return pandas.DataFrame({'flux': result[0], 'status': result[1]})
 
 
 def single_gene_deletion_fba(cobra_model, gene_list, solver=None,
-                             **solver_args):
+                             processes=1, **solver_args):
     """Sequentially knocks out each gene in a model using FBA.
 
     Not supposed to be called directly use
@@ -253,6 +263,8 @@ def single_gene_deletion_fba(cobra_model, gene_list, solver=None,
         List of gene IDs or cobra.Reaction.
     solver: str, optional
         The name of the solver to be used.
+    processes : int, optional
+        The number of parallel processes to run.
 
     Returns
     -------
@@ -274,18 +286,9 @@ def single_gene_deletion_fba(cobra_model, gene_list, solver=None,
     status_dict = {}
 
     if not legacy:
-        with cobra_model as m:
-            m.solver = solver
-            for gene in gene_list:
-                ko = find_gene_knockout_reactions(cobra_model, [gene])
-                with m:
-                    for reaction in ko:
-                        reaction.bounds = (0.0, 0.0)
-                    m.solver.optimize()
-                    status = m.solver.status
-                    status_dict[gene.id] = status
-                    growth_rate_dict[gene.id] = m.solver.objective.value if \
-                        status == "optimal" else 0.
+        growth_rate_dict, status_dict = _optlang_deletion(
+            cobra_model, solver, _gene_knockouts(cobra_model, gene_list),
+            "fba", processes)
     else:
         for gene in gene_list:
             old_bounds = {}
@@ -307,7 +310,7 @@ def single_gene_deletion_fba(cobra_model, gene_list, solver=None,
 
 
 def single_gene_deletion_moma(cobra_model, gene_list, solver=None,
-                              **solver_args):
+                              processes=1, **solver_args):
     """Sequentially knocks out each gene in a model using MOMA.
 
     Not supposed to be called directly use
@@ -319,6 +322,8 @@ def single_gene_deletion_moma(cobra_model, gene_list, solver=None,
         List of gene IDs or cobra.Reaction.
     solver: str, optional
         The name of the solver to be used.
+    processes : int, optional
+        The number of parallel processes to run.
 
     Returns
     -------
@@ -344,22 +349,9 @@ def single_gene_deletion_moma(cobra_model, gene_list, solver=None,
     status_dict = {}
 
     if not legacy:
-        with cobra_model as m:
-            m.solver = solver
-            moma.add_moma(m)
-            for gene in gene_list:
-                ko = find_gene_knockout_reactions(cobra_model, [gene])
-                with m:
-                    for reaction in ko:
-                        reaction.bounds = (0.0, 0.0)
-                    m.solver.optimize()
-                    status = m.solver.status
-                    status_dict[gene.id] = status
-                    if status == "optimal":
-                        growth = m.variables.moma_old_objective.primal
-                    else:
-                        growth = 0.0
-                    growth_rate_dict[gene.id] = growth
+        growth_rate_dict, status_dict = _optlang_deletion(
+            cobra_model, solver, _gene_knockouts(cobra_model, gene_list),
+            "moma", processes)
     else:
         for gene in gene_list:
             delete_model_genes(moma_model, [gene.id])
@@ -369,3 +361,170 @@ def single_gene_deletion_moma(cobra_model, gene_list, solver=None,
             growth_rate_dict[gene.id] = solution.f
             undelete_model_genes(moma_model)
     return growth_rate_dict, status_dict
+
+
+def _gene_knockouts(cobra_model, gene_list):
+    """Get the reactions disabled by the knockout of each gene."""
+    disabled = CompiledGPR(cobra_model).knockout_matrix(
+        [gene] for gene in gene_list)
+    reaction_ids = [reaction.id for reaction in cobra_model.reactions]
+    return [(gene.id, tuple(reaction_ids[i] for i in numpy.flatnonzero(row)))
+            for gene, row in zip(gene_list, disabled)]
+
+
+def _init_worker(model, method):
+    """Initialize a global model object for multiprocessing."""
+    global _model
+    global _method
+    _model = model
+    _method = method
+
+
+def _knockout_step(knockout):
+    """Solve a single knockout in a worker process."""
+    key, reaction_ids = knockout
+    return (key,) + _knockout(_model, reaction_ids, _method)
+
+
+def _knockout(model, reaction_ids, method):
+    """Knock out a set of reactions and optimize the model.
+
+    Parameters
+    ----------
+    model : cobra.Model
+        The model to use. Needs to contain the MOMA problem if `method` is
+        "moma".
+    reaction_ids : iterable of str
+        The identifiers of the reactions to knock out.
+    method : {"fba", "moma"}
+        The method used to obtain the objective value.
+
+    Returns
+    -------
+    tuple
+        The objective value (0 if not optimal) and the solver status.
+    """
+    with model:
+        for reaction_id in reaction_ids:
+            model.reactions.get_by_id(reaction_id).bounds = (0.0, 0.0)
+        if method == "moma":
+            model.solver.optimize()
+            growth = model.variables.moma_old_objective.primal \
+                if model.solver.status == "optimal" else 0.0
+        else:
+            growth = model.slim_optimize(error_value=0.)
+        status = model.solver.status
+    return growth, status
+
+
+def _screen_knockouts(model, knockouts, growth_rate_dict, status_dict,
+                      zero_cutoff=1e-12):
+    """Assign the wild-type objective to knockouts of zero-flux reactions.
+
+    The model is optimized once. Knocking out reactions which carry no flux
+    in this optimum leaves the optimal solution feasible, so the objective
+    value can not change. Only valid for FBA.
+
+    Parameters
+    ----------
+    model : cobra.Model
+        The model to screen.
+    knockouts : list of tuples
+        Pairs of a result key and the identifiers of the reactions to knock
+        out for that key.
+    growth_rate_dict, status_dict : dict
+        Receive the results for the screened knockouts.
+    zero_cutoff : float, optional
+        Fluxes below this absolute value are considered zero.
+
+    Returns
+    -------
+    list of tuples
+        The knockouts which still need to be solved.
+    """
+    wt_growth = model.slim_optimize()
+    if model.solver.status != "optimal":
+        return knockouts
+    primals = model.solver.primal_values
+    no_flux = {rxn.id for rxn in model.reactions
+               if abs(primals[rxn.id]) < zero_cutoff and
+               abs(primals[rxn.reverse_id]) < zero_cutoff}
+    remaining = []
+    for key, reaction_ids in knockouts:
+        if no_flux.issuperset(reaction_ids):
+            growth_rate_dict[key] = wt_growth
+            status_dict[key] = "optimal"
+        else:
+            remaining.append((key, reaction_ids))
+    LOGGER.info("skipped %d of %d knockouts of reactions without flux in "
+                "the wild-type solution", len(knockouts) - len(remaining),
+                len(knockouts))
+    return remaining
+
+
+def _optlang_deletion(cobra_model, solver, knockouts, method, processes):
+    """Run a knockout scan with an optlang solver.
+
+    Parameters
+    ----------
+    cobra_model : cobra.Model
+        The model from which to delete the reactions. Not modified.
+    solver : optlang interface or solver model
+        The solver to use.
+    knockouts : list of tuples
+        Pairs of a result key and the identifiers of the reactions to knock
+        out for that key. Keys with the same set of reactions are only solved
+        once.
+    method : {"fba", "moma"}
+        The method used to obtain the objective value. For "fba", knockouts
+        of reactions without flux in the wild-type optimum are assigned the
+        wild-type objective value without solving them.
+    processes : int
+        The number of worker processes. Every worker receives one copy of the
+        prepared model and solves chunks of knockouts.
+
+    Returns
+    -------
+    tuple of dicts
+        A tuple ({key: growth_rate}, {key: status})
+    """
+    # knockouts disabling the same reactions only need to be solved once
+    groups = OrderedDict()
+    for key, reaction_ids in knockouts:
+        groups.setdefault(frozenset(reaction_ids), []).append(key)
+    LOGGER.info("%d knockouts map to %d distinct sets of reactions",
+                len(knockouts), len(groups))
+    knockouts = [(reaction_ids, tuple(reaction_ids))
+                 for reaction_ids in groups]
+
+    growth_rate_dict = {}
+    status_dict = {}
+    with cobra_model as m:
+        m.solver = solver
+        if method == "moma":
+            moma.add_moma(m)
+        else:
+            knockouts = _screen_knockouts(m, knockouts, growth_rate_dict,
+                                          status_dict)
+        if processes > 1 and len(knockouts) > 1:
+            # Several chunks per worker let the pool balance knockouts that
+            # take much longer to solve than others.
+            chunk_size = max(1, len(knockouts) // (processes * 4))
+            pool = Pool(processes, initializer=_init_worker,
+                        initargs=(m, method))
+            try:
+                for key, growth, status in pool.imap_unordered(
+                        _knockout_step, knockouts, chunksize=chunk_size):
+                    growth_rate_dict[key] = growth
+                    status_dict[key] = status
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for key, reaction_ids in knockouts:
+                growth_rate_dict[key], status_dict[key] = _knockout(
+                    m, reaction_ids, method)
+    return ({key: growth_rate_dict[reaction_ids]
+             for reaction_ids, keys in iteritems(groups) for key in keys},
+            {key: status_dict[reaction_ids]
+             for reaction_ids, keys in iteritems(groups) for key in keys})
@@ -2,18 +2,20 @@
 
 from __future__ import absolute_import
 
+from multiprocessing import Pool
+
 import pandas
 from six import iteritems
 from sympy.core.singleton import S
 
-from cobra.flux_analysis.loopless import loopless_fva_iter
+from cobra.flux_analysis.loopless import _LooplessFVA
 from cobra.solvers import get_solver_name, solver_dict
 from cobra.util import solver as sutil
 
 
 def flux_variability_analysis(model, reaction_list=None, loopless=False,
                               fraction_of_optimum=1.0,
-                              solver=None, **solver_args):
+                              solver=None, processes=1, **solver_args):
     """Runs flux variability analysis to find the min/max flux values for each
     each reaction in `reaction_list`.
 
@@ -34,6 +36,10 @@ def flux_variability_analysis(model, reaction_list=None, loopless=False,
     solver : str, optional
         Name of the solver to be used. If None it will respect the solver set
         in the model (model.solver).
+    processes : int, optional
+        The number of parallel processes to run. Each process receives its own
+        copy of the FVA problem and solves a chunk of `reaction_list`. Ignored
+        for legacy solvers.
     **solver_args : additional arguments for legacy solver, optional
         Additional arguments passed to the legacy solver. Ignored for
         optlang solver (those can be configured using
@@ -55,10 +61,13 @@ def flux_variability_analysis(model, reaction_list=None, loopless=False,
     individually and a single minimal flux might require all others to be
     suboptimal.
 
-    Using the loopless option will lead to a significant increase in
-    computation time (about a factor of 100 for large models). However, the
-    algorithm used here (see [2]_) is still more than 1000x faster than the
-    "naive" version using `add_loopless(model)`. Also note that if you have
+    Using the loopless option will increase the computation time. Optima
+    that only use reactions outside of internal cycles are loopless already
+    and are returned as is. All other optima are cleaned with the algorithm
+    from [2]_ which reuses a single loop-free problem and is still more than
+    1000x faster than the "naive" version using `add_loopless(model)`. Only
+    if the cleaned flux changes the optimized reaction the optimum is
+    recomputed with the loops blocked. Also note that if you have
     included constraints that force a loop (for instance by setting all fluxes
     in a loop to be non-zero) this loop will be included in the solution.
 
@@ -82,7 +91,7 @@ def flux_variability_analysis(model, reaction_list=None, loopless=False,
 
     if not legacy:
         fva_result = _fva_optlang(model, reaction_list, fraction_of_optimum,
-                                  loopless)
+                                  loopless, processes)
     else:
         fva_result = _fva_legacy(model, reaction_list, fraction_of_optimum,
                                  "maximize", solver, **solver_args)
@@ -142,23 +151,91 @@ def calculate_lp_variability(lp, solver, cobra_model, reaction_list,
     return fva_results
 
 
-def _fva_optlang(model, reaction_list, fraction, loopless):
+def _init_worker(model, loopless_model):
+    """Initialize a global model object for multiprocessing.
+
+    Each worker builds its own loop removal problem from `loopless_model`
+    if that is not None.
+    """
+    global _model
+    global _loopless
+    _model = model
+    _loopless = None if loopless_model is None else \
+        _LooplessFVA(loopless_model)
+
+
+def _fva_step(args):
+    """Run a single FVA iteration in a worker process."""
+    what, reaction_id = args
+    return what, reaction_id, _optimize_reaction(_model, reaction_id, what,
+                                                 _loopless)
+
+
+def _optimize_reaction(model, reaction_id, what, loopless):
+    """Minimize or maximize the flux of a single reaction.
+
+    Assumes that the objective of `model` has been set to zero and that the
+    FVA constraint for the previous objective is already in place.
+
+    Parameters
+    ----------
+    model : a cobra model
+    reaction_id : str
+        The identifier of the reaction to optimize.
+    what : {"minimum", "maximum"}
+        Whether to minimize or maximize the flux.
+    loopless : cobra.flux_analysis.loopless._LooplessFVA or None
+        Used to obtain a loopless flux value if not None.
+
+    Returns
+    -------
+    float
+        The minimal or maximal flux through the reaction.
+    """
+    rxn = model.reactions.get_by_id(reaction_id)
+    # The previous objective assignment already triggers a reset
+    # so directly update coefs here to not trigger redundant resets
+    # in the history manager which can take longer than the actual
+    # FVA for small models
+    model.solver.objective.set_linear_coefficients(
+        {rxn.forward_variable: 1, rxn.reverse_variable: -1})
+    model.solver.objective.direction = "min" if what == "minimum" else "max"
+    value = model.slim_optimize()
+    sutil.check_solver_status(model.solver.status)
+    if loopless is not None:
+        value = loopless.optimize(model, rxn, value)
+    model.solver.objective.set_linear_coefficients(
+        {rxn.forward_variable: 0, rxn.reverse_variable: 0})
+    return value
+
+
+def _fva_optlang(model, reaction_list, fraction, loopless, processes=1):
     """Helper function to perform FVA with the optlang interface.
 
     Parameters
     ----------
     model : a cobra model
     reaction_list : list of reactions
+    fraction : float
+        The fraction of the optimum the old objective has to attain.
+    loopless : boolean
+        Whether to return only loopless solutions.
+    processes : int, optional
+        The number of worker processes. Reactions are split into chunks and
+        each worker optimizes its chunks on its own copy of the problem.
 
     Returns
     -------
     dict
         A dictionary containing the results.
     """
-    fva_results = {str(rxn): {} for rxn in reaction_list}
+    reaction_ids = [str(rxn) for rxn in reaction_list]
+    fva_results = {r_id: {} for r_id in reaction_ids}
     prob = model.problem
+    # loops are removed on a copy with the original objective
+    loopless_model = model.copy(copy_on_write=True) if loopless else None
     with model as m:
-        m.solver.optimize()
+        objective_value = m.slim_optimize()
         if m.solver.status != "optimal":
             raise ValueError("There is no optimal solution "
                              "for the chosen objective!")
@@ -166,33 +243,36 @@ def _fva_optlang(model, reaction_list, fraction, loopless):
         # This also uses the fraction to create the lower bound for the
         # old objective
         fva_old_objective = prob.Variable(
-            "fva_old_objective", lb=fraction * m.solver.objective.value)
+            "fva_old_objective", lb=fraction * objective_value)
         fva_old_obj_constraint = prob.Constraint(
             m.solver.objective.expression - fva_old_objective, lb=0, ub=0,
             name="fva_old_objective_constraint")
         m.add_cons_vars([fva_old_objective, fva_old_obj_constraint])
         model.objective = S.Zero  # This will trigger the reset as well
-        for what in ("minimum", "maximum"):
-            sense = "min" if what == "minimum" else "max"
-            for rxn in reaction_list:
-                r_id = str(rxn)
-                rxn = m.reactions.get_by_id(r_id)
-                # The previous objective assignment already triggers a reset
-                # so directly update coefs here to not trigger redundant resets
-                # in the history manager which can take longer than the actual
-                # FVA for small models
-                m.solver.objective.set_linear_coefficients(
-                    {rxn.forward_variable: 1, rxn.reverse_variable: -1})
-                m.solver.objective.direction = sense
-                m.solver.optimize()
-                sutil.check_solver_status(m.solver.status)
-                if loopless:
-                    value = loopless_fva_iter(m, rxn)
-                else:
-                    value = m.solver.objective.value
-                fva_results[r_id][what] = value
-                m.solver.objective.set_linear_coefficients(
-                    {rxn.forward_variable: 0, rxn.reverse_variable: 0})
+        tasks = [(what, r_id) for what in ("minimum", "maximum")
+                 for r_id in reaction_ids]
+        if processes > 1 and len(reaction_ids) > 1:
+            # Every worker gets its own copy of the prepared problem and
+            # receives chunks of reactions to optimize. Chunks keep the
+            # optimization direction mostly constant within a worker, while
+            # several chunks per worker balance the load if some LPs take
+            # much longer than others.
+            chunk_size = max(1, len(tasks) // (processes * 4))
+            pool = Pool(processes, initializer=_init_worker,
+                        initargs=(m, loopless_model))
+            try:
+                for what, r_id, value in pool.imap_unordered(
+                        _fva_step, tasks, chunksize=chunk_size):
+                    fva_results[r_id][what] = value
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            loopless = None if loopless_model is None else \
+                _LooplessFVA(loopless_model)
+            for what, r_id in tasks:
+                fva_results[r_id][what] = _optimize_reaction(
+                    m, r_id, what, loopless)
 
     return fva_results
 
@@ -194,6 +194,7 @@ def from_mat_struct(mat_struct, model_id=None, inf=inf):
             model.id = description
     else:
         model.id = "imported_model"
+    new_metabolites = []
     for i, name in enumerate(m["mets"][0, 0]):
         new_metabolite = Metabolite()
         new_metabolite.id = str(name[0][0])
@@ -224,7 +225,8 @@ def from_mat_struct(mat_struct, model_id=None, inf=inf):
                 new_metabolite.charge = int_charge
         except (IndexError, ValueError):
             pass
-        model.add_metabolites([new_metabolite])
+        new_metabolites.append(new_metabolite)
+    model.add_metabolites(new_metabolites)
     new_reactions = []
     coefficients = {}
     for i, name in enumerate(m["rxns"][0, 0]):
@@ -251,11 +253,16 @@ def from_mat_struct(mat_struct, model_id=None, inf=inf):
         except (IndexError, ValueError):
             pass
         new_reactions.append(new_reaction)
+    # set the stoichiometry before adding the reactions so that the solver
+    # is populated in a single pass
+    csc = scipy_sparse.csc_matrix(m["S"][0, 0])
+    for j, reaction in enumerate(new_reactions):
+        start, stop = csc.indptr[j], csc.indptr[j + 1]
+        reaction.add_metabolites({
+            new_metabolites[i]: v for i, v in
+            zip(csc.indices[start:stop], csc.data[start:stop])})
     model.add_reactions(new_reactions)
     set_objective(model, coefficients)
-    coo = scipy_sparse.coo_matrix(m["S"][0, 0])
-    for i, j, v in zip(coo.row, coo.col, coo.data):
-        model.reactions[j].add_metabolites({model.metabolites[i]: v})
     return model
 
 
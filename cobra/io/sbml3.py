@@ -261,6 +261,7 @@ def parse_xml_into_model(xml, number=float):
     model.compartments = {c.get("id"): c.get("name") for c in
                           xml_model.findall(COMPARTMENT_XPATH)}
     # add metabolites
+    metabolites = []
     for species in xml_model.findall(SPECIES_XPATH % 'false'):
         met = get_attrib(species, "id", require=True)
         met = Metabolite(clip(met, "M_"))
@@ -269,7 +270,8 @@ def parse_xml_into_model(xml, number=float):
         met.compartment = species.get("compartment")
         met.charge = get_attrib(species, "fbc:charge", int)
         met.formula = get_attrib(species, "fbc:chemicalFormula")
-        model.add_metabolites([met])
+        metabolites.append(met)
+    model.add_metabolites(metabolites)
     # Detect boundary metabolites - In case they have been mistakenly
     # added. They should not actually appear in a model
     boundary_metabolites = {clip(i.get("id"), "M_")
@@ -4,8 +4,8 @@ from __future__ import absolute_import
 
 from cobra.manipulation.annotate import add_SBO
 from cobra.manipulation.delete import (
-    delete_model_genes, find_gene_knockout_reactions, remove_genes,
-    undelete_model_genes)
+    CompiledGPR, delete_model_genes, find_gene_knockout_reactions,
+    remove_genes, undelete_model_genes)
 from cobra.manipulation.modify import (
     canonical_form, convert_to_irreversible, escape_ID,
     get_compiled_gene_reaction_rules, revert_to_reversible)
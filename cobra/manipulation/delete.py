@@ -2,8 +2,11 @@
 
 from __future__ import absolute_import
 
-from ast import And, NodeTransformer
+from ast import And, BoolOp, Expression, Name, NodeTransformer, Or
+from collections import defaultdict
+from copy import copy
 
+import numpy
 from six import iteritems, string_types
 
 from cobra.core.gene import ast2str, eval_gpr, parse_gpr
@@ -22,14 +25,9 @@ def prune_unused_metabolites(cobra_model):
     list
         list of metabolites that were removed
     """
-    inactive_metabolites = []
-    active_metabolites = []
-    for the_metabolite in cobra_model.metabolites:
-        if len(the_metabolite._reaction) == 0:
-            the_metabolite.remove_from_model()
-            inactive_metabolites.append(the_metabolite)
-        else:
-            active_metabolites.append(the_metabolite)
+    inactive_metabolites = [m for m in cobra_model.metabolites
+                            if len(m._reaction) == 0]
+    cobra_model.remove_metabolites(inactive_metabolites)
     return inactive_metabolites
 
 
@@ -46,13 +44,15 @@ def prune_unused_reactions(cobra_model):
     list
         list of reactions that were removed
     """
-    pruned_reactions = []
     reactions_to_prune = [x for x in cobra_model.reactions
                           if len(x._metabolites) == 0]
-    for the_reaction in reactions_to_prune:
-        the_reaction.remove_from_model()
-        pruned_reactions.append(the_reaction)
-    return pruned_reactions
+    # keep the genes of the pruned reactions like remove_from_model
+    genes = [[copy(g) for g in x._genes] for x in reactions_to_prune]
+    cobra_model.remove_reactions(reactions_to_prune)
+    for the_reaction, the_genes in zip(reactions_to_prune, genes):
+        for gene in the_genes:
+            the_reaction._associate_gene(gene)
+    return reactions_to_prune
 
 
 def undelete_model_genes(cobra_model):
@@ -90,6 +90,110 @@ def get_compiled_gene_reaction_rules(cobra_model):
             for r in cobra_model.reactions}
 
 
+class CompiledGPR(object):
+    """Gene reaction rules of a model compiled into a flat boolean program
+
+    Every rule is translated into instructions over integer registers. The
+    first registers hold the genes of the model, the following ones the
+    intermediate results of the rules. Instructions are grouped by their
+    depth in the rule trees so that each group is evaluated with a single
+    numpy call for a whole batch of knockouts.
+
+    Parameters
+    ----------
+    cobra_model : cobra.Model
+        The model whose gene reaction rules are compiled.
+
+    Attributes
+    ----------
+    genes : list of str
+        The gene identifiers in the order of their registers.
+    reactions : list of str
+        The reaction identifiers in the order of the model reactions, i.e.
+        the columns of the matrix returned by `knockout_matrix`.
+    """
+
+    def __init__(self, cobra_model):
+        self.genes = [gene.id for gene in cobra_model.genes]
+        self.reactions = [reaction.id for reaction in cobra_model.reactions]
+        self._gene_index = {gene: i for i, gene in enumerate(self.genes)}
+        self._n_registers = len(self.genes)
+        self._true = None
+        self._levels = defaultdict(lambda: {And: [], Or: []})
+        self._outputs = numpy.array(
+            [self._compile(parse_gpr(reaction.gene_reaction_rule)[0])[0]
+             for reaction in cobra_model.reactions], dtype=int)
+        self._program = []
+        for depth in sorted(self._levels):
+            for op, ufunc in ((And, numpy.logical_and),
+                              (Or, numpy.logical_or)):
+                instructions = self._levels[depth][op]
+                if len(instructions) == 0:
+                    continue
+                lengths = [len(args) for _, args in instructions]
+                self._program.append((
+                    numpy.array([out for out, _ in instructions], dtype=int),
+                    numpy.array([a for _, args in instructions for a in args],
+                                dtype=int),
+                    numpy.cumsum([0] + lengths[:-1]), ufunc))
+        del self._levels
+
+    def _allocate(self):
+        self._n_registers += 1
+        return self._n_registers - 1
+
+    def _compile(self, expr):
+        """Compile an ast node and return its register and depth."""
+        if isinstance(expr, Expression):
+            return self._compile(expr.body)
+        elif isinstance(expr, Name):
+            if expr.id not in self._gene_index:
+                self._gene_index[expr.id] = self._allocate()
+            return self._gene_index[expr.id], 0
+        elif isinstance(expr, BoolOp):
+            compiled = [self._compile(i) for i in expr.values]
+            depth = max(d for _, d in compiled) + 1
+            out = self._allocate()
+            self._levels[depth][type(expr.op)].append(
+                (out, [register for register, _ in compiled]))
+            return out, depth
+        elif expr is None:
+            if self._true is None:
+                self._true = self._allocate()
+            return self._true, 0
+        else:
+            raise TypeError("unsupported operation  " + repr(expr))
+
+    def knockout_matrix(self, knockouts):
+        """Evaluate the rules for a batch of knockouts
+
+        Parameters
+        ----------
+        knockouts : iterable of iterables
+            Each element is one knockout given as the genes or gene
+            identifiers which are removed together.
+
+        Returns
+        -------
+        numpy.ndarray
+            A boolean matrix with one row per knockout and one column per
+            reaction which is True where the reaction is disabled.
+        """
+        knockouts = list(knockouts)
+        rows, columns = [], []
+        for row, genes in enumerate(knockouts):
+            for gene in genes:
+                rows.append(row)
+                columns.append(self._gene_index[str(gene)])
+        # registers are rows so that gathering the arguments of an
+        # instruction copies contiguous memory
+        values = numpy.ones((self._n_registers, len(knockouts)), dtype=bool)
+        values[columns, rows] = False
+        for out, args, offsets, ufunc in self._program:
+            values[out] = ufunc.reduceat(values[args], offsets, axis=0)
+        return ~values[self._outputs].T
+
+
 def find_gene_knockout_reactions(cobra_model, gene_list,
                                  compiled_gene_reaction_rules=None):
     """identify reactions which will be disabled when the genes are knocked out
@@ -1,22 +1,27 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+import logging
 import re
 import sys
 import warnings
 from contextlib import contextmanager
 from os import name
+from pickle import dumps, loads
 
 import pytest
 import numpy
+import pandas
 from six import StringIO, iteritems
 
 import cobra.util.solver as sutil
 from cobra.core import Metabolite, Model, Reaction
 from cobra.flux_analysis import *
 from cobra.flux_analysis.parsimonious import add_pfba
-from cobra.flux_analysis.sampling import ARCHSampler, OptGPSampler
-from cobra.manipulation import convert_to_irreversible
+from cobra.flux_analysis.sampling import (
+    ARCHSampler, OptGPSampler, RunningStatistics, SampleStore)
+from cobra.manipulation import (
+    convert_to_irreversible, find_gene_knockout_reactions)
 from cobra.solvers import SolverNotFound, get_solver_name, solver_dict
 
 try:
@@ -182,6 +187,39 @@ class TestCobraFluxAnalysis:
         assert all(abs(df.flux[gene] - expected) < 0.00001 for
                    gene, expected in iteritems(expected_results))
 
+    @pytest.mark.parametrize("solver", optlang_solvers)
+    def test_parallel_single_deletion(self, model, solver):
+        reaction_df = single_reaction_deletion(model, solver=solver)
+        parallel_df = single_reaction_deletion(model, solver=solver,
+                                               processes=2)
+        assert numpy.allclose(reaction_df.flux, parallel_df.flux[
+            reaction_df.index])
+        gene_df = single_gene_deletion(model, solver=solver)
+        parallel_df = single_gene_deletion(model, solver=solver, processes=2)
+        assert numpy.allclose(gene_df.flux, parallel_df.flux[gene_df.index])
+        assert all(gene_df.status == parallel_df.status[gene_df.index])
+
+    def test_single_deletion_skips_zero_flux(self, model, caplog):
+        with caplog.at_level(logging.INFO):
+            df = single_reaction_deletion(model)
+        assert "skipped 47 of 95 knockouts" in caplog.text
+        for reaction in model.reactions:
+            with model:
+                reaction.bounds = (0, 0)
+                growth = model.slim_optimize(error_value=0.)
+            assert abs(df.flux[reaction.id] - growth) < 1e-6
+
+    def test_single_deletion_solves_duplicate_sets_once(self, model, caplog):
+        with caplog.at_level(logging.INFO):
+            df = single_gene_deletion(model)
+        assert "137 knockouts map to 37 distinct sets" in caplog.text
+        for gene in model.genes:
+            with model:
+                for reaction in find_gene_knockout_reactions(model, [gene]):
+                    reaction.bounds = (0, 0)
+                growth = model.slim_optimize(error_value=0.)
+            assert abs(df.flux[gene.id] - growth) < 1e-6
+
     @classmethod
     def compare_matrices(cls, matrix1, matrix2, places=3):
         nrows = len(matrix1)
@@ -257,6 +295,14 @@ class TestCobraFluxAnalysis:
             for k, v in iteritems(result):
                 assert abs(fva_results[k][name] - v) < 0.00001
 
+    @pytest.mark.parametrize("solver", optlang_solvers)
+    def test_parallel_flux_variability(self, model, fva_results, solver):
+        fva_out = flux_variability_analysis(
+            model, solver=solver, processes=2)
+        for name, result in iteritems(fva_out.T):
+            for k, v in iteritems(result):
+                assert abs(fva_results[k][name] - v) < 0.00001
+
     @pytest.mark.parametrize("solver", optlang_solvers)
     def test_flux_variability_loopless(self, model, fva_results, solver):
         fva_out = flux_variability_analysis(
@@ -268,6 +314,18 @@ class TestCobraFluxAnalysis:
             for k, v in iteritems(result):
                 assert abs(fva_results[k][name] - v) < 0.00001
 
+    def test_flux_variability_loopless_loops(self, model):
+        # FRD7 and SUCDi form a loop that may carry any flux at the optimum
+        fva_out = flux_variability_analysis(
+            model, reaction_list=["FRD7", "SUCDi"], loopless=True)
+        assert abs(fva_out.loc["FRD7", "maximum"]) < 1e-6
+        assert abs(fva_out.loc["SUCDi", "maximum"] -
+                   fva_out.loc["SUCDi", "minimum"]) < 1e-6
+        parallel = flux_variability_analysis(
+            model, reaction_list=["FRD7", "SUCDi"], loopless=True,
+            processes=2)
+        assert numpy.allclose(fva_out.values, parallel.values, atol=1e-6)
+
     def test_fva_data_frame(self, model):
         df = flux_variability_analysis(model, return_frame=True)
         assert numpy.all([df.columns.values == ['maximum', 'minimum']])
@@ -368,6 +426,31 @@ class TestCobraFluxAnalysis:
             with pytest.raises(UserWarning):
                 loopless_solution(model, fluxes=fluxes)
 
+    def test_loopless_solutions(self, model):
+        fluxes = model.optimize().fluxes
+        bounds = {v.name: (v.lb, v.ub) for v in model.variables}
+        objective_value = model.slim_optimize()
+        infeasible = fluxes.copy()
+        infeasible["Biomass_Ecoli_core"] = 1
+        vectors = pandas.DataFrame([fluxes, infeasible, fluxes])
+        solutions = loopless_solutions(model, vectors)
+        assert list(solutions.columns) == [r.id for r in model.reactions]
+        expected = loopless_solution(model, fluxes=fluxes).fluxes
+        assert numpy.allclose(solutions.iloc[0], expected)
+        assert solutions.iloc[1].isnull().all()
+        assert numpy.allclose(solutions.iloc[2], expected)
+        array = loopless_solutions(model, vectors.values, processes=2,
+                                   chunk_size=1)
+        assert numpy.allclose(array, solutions.values, equal_nan=True)
+        assert len(model.variables) == 2 * len(model.reactions)
+        loopless_solutions(model, pandas.DataFrame([fluxes * 0.5]))
+        assert {v.name: (v.lb, v.ub) for v in model.variables} == bounds
+        assert abs(model.slim_optimize() - objective_value) < 1e-9
+
+    def test_loopless_solutions_benchmark(self, model, benchmark):
+        fluxes = pandas.DataFrame([model.optimize().fluxes] * 20)
+        benchmark(loopless_solutions, model, fluxes)
+
     def test_add_loopless(self):
         test_model = self.construct_ll_test_model()
         add_loopless(test_model)
@@ -378,6 +461,27 @@ class TestCobraFluxAnalysis:
         assert feasible_status == "optimal"
         assert infeasible_status == "infeasible"
 
+    def test_add_loopless_indicators(self):
+        test_model = self.construct_ll_test_model()
+        if test_model.problem.Constraint._INDICATOR_CONSTRAINT_SUPPORT:
+            add_loopless(test_model, indicators=True)
+            assert "on_v3" in test_model.constraints
+        else:
+            with pytest.warns(UserWarning):
+                add_loopless(test_model, indicators=True)
+            assert "on_off_v3" in test_model.constraints
+        assert test_model.slim_optimize() > 0
+        test_model.reactions.v3.lower_bound = 1
+        test_model.solver.optimize()
+        assert test_model.solver.status == "infeasible"
+
+    def test_add_loopless_build_benchmark(self, large_model, benchmark):
+        def _():
+            with large_model:
+                add_loopless(large_model)
+
+        benchmark(_)
+
     def test_phenotype_phase_plane_benchmark(self, model, benchmark):
         benchmark(calculate_phenotype_phase_plane,
                   model, "EX_glc__D_e", "EX_o2_e",
@@ -525,14 +629,126 @@ class TestCobraFluxSampling:
     def test_multi_optgp(self, model):
         s = sample(model, 10, processes=2)
         assert s.shape == (10, len(model.reactions))
+        optgp = OptGPSampler(model, processes=2, thinning=1, reduced=True)
+        optgp.sample(4)
+        shared = dict(optgp._shared)
+        optgp.sample(4)
+        # the arrays stay in shared memory between calls
+        assert all(optgp._shared[name] is shared[name] for name in shared)
+        restored = loads(dumps(optgp))
+        assert numpy.array_equal(restored.warmup, optgp.warmup)
 
     def test_wrong_method(self, model):
         with pytest.raises(ValueError):
             sample(model, 1, method="schwupdiwupp")
 
+    def test_multiple_chains(self, model):
+        for method in ("arch", "optgp"):
+            s = sample(model, 10, method=method, chains=4)
+            assert s.shape == (10, len(model.reactions))
+        arch = ARCHSampler(model, thinning=1, chains=4)
+        s = arch.sample(10)
+        assert arch.prev.shape == (4, len(model.reactions))
+        assert all(arch.validate(s) == "v")
+
+    def test_streaming(self, model):
+        batches = list(sample(model, 25, method="arch", batch_size=10))
+        assert [len(b) for b in batches] == [10, 10, 5]
+        assert all(list(b.columns) == [r.id for r in model.reactions]
+                   for b in batches)
+
+    def test_sample_store(self, model, tmpdir):
+        arch = ARCHSampler(model, thinning=1, seed=42)
+        store = SampleStore(str(tmpdir.join("store")), dtype=numpy.float32)
+        arch.sample_to(store, 15, batch_size=10)
+        assert len(store.chunks) == 2
+        assert store.n_samples == 15
+        # reopening keeps the type of the stored chunks
+        assert SampleStore(str(tmpdir.join("store"))).dtype == numpy.float32
+        # resuming only generates the missing samples
+        arch = ARCHSampler(model, thinning=1, seed=42)
+        arch.sample_to(str(tmpdir.join("store")), 25, batch_size=10)
+        samples = store.to_frame()
+        assert samples.shape == (25, len(model.reactions))
+        assert (samples.dtypes == numpy.float32).all()
+        out = numpy.zeros((12, len(model.reactions)))
+        arch.sample_to(out, 12, batch_size=5)
+        assert all(arch.validate(out) == "v")
+
+    def test_reduced_sampling(self, model):
+        model.reactions.ATPM.bounds = (8.39, 8.39)
+        for sampler in (ARCHSampler(model, thinning=1, reduced=True),
+                        OptGPSampler(model, processes=1, thinning=1,
+                                     chains=4, reduced=True)):
+            s = sampler.sample(10)
+            assert s.shape == (10, len(model.reactions))
+            assert all(sampler.validate(s) == "v")
+            free = sampler._space.free
+            assert model.reactions.index("ATPM") not in free
+            assert len(free) < len(model.reactions)
+            assert numpy.allclose(s[:, model.reactions.index("ATPM")], 8.39)
+            # reprojection removes any drift from the steady state
+            space = sampler._space
+            drifted = space.warmup[:3] + 1e-3
+            steady = space.expand(space._reproject(drifted))
+            assert numpy.abs(sampler.S.dot(steady.T)).max() < 1e-9
+        optgp = OptGPSampler(model, processes=2, thinning=1, reduced=True)
+        optgp.sample(4)
+        space = optgp._space
+        optgp.sample(4)
+        # sharing the arrays with the workers does not rebuild the space
+        assert optgp._space is space
+
+    def test_parallel_warmup(self, model):
+        model.reactions.ATPM.bounds = (8.39, 8.39)
+        optgp = OptGPSampler(model, processes=2, thinning=1)
+        # the fixed reaction is not optimized
+        assert optgp.n_warmup <= 2 * (len(model.reactions) - 1)
+        assert all(optgp.validate(optgp.warmup) == "v")
+        assert str(model.objective.expression).startswith(
+            "1.0*Biomass_Ecoli_core")
+
+    def test_running_statistics(self):
+        rs = numpy.random.RandomState(0)
+        samples = rs.normal(size=(400, 3))
+        chains = numpy.arange(400) % 4
+        stats = RunningStatistics(4, ["a", "b", "c"], reservoir_size=100,
+                                  seed=0)
+        for i in range(0, 400, 150):
+            stats.update(samples[i:i + 150], chains[i:i + 150])
+        assert stats.n == 400
+        assert numpy.allclose(stats.mean, samples.mean(axis=0))
+        assert numpy.allclose(stats.variance, samples.var(axis=0, ddof=1))
+        assert numpy.all(stats.rhat() < 1.1)
+        summary = stats.summary()
+        assert list(summary.index) == ["a", "b", "c"]
+        assert summary.loc["a", "ess"] > 100
+
+    def test_sample_until(self, model):
+        # a loose target stops before max_samples
+        optgp = OptGPSampler(model, processes=1, thinning=10, chains=4,
+                             seed=42)
+        s = optgp.sample_until(rhat=1.5, batch_size=100, max_samples=2000)
+        assert len(s) < 2000
+        assert optgp.converged(rhat=1.5)
+        assert optgp.statistics.n == len(s)
+        assert numpy.allclose(optgp.statistics.mean, s.mean(axis=0))
+        # an unreachable target stops at max_samples
+        optgp = OptGPSampler(model, processes=1, thinning=10, chains=4,
+                             seed=42)
+        with pytest.warns(UserWarning):
+            s = optgp.sample_until(rhat=0.5, batch_size=100,
+                                   max_samples=300)
+        assert len(s) == 300
+        assert not optgp.converged(rhat=0.5)
+        assert optgp.statistics.n == 300
+        with pytest.raises(ValueError):
+            ARCHSampler(model).sample_until(rhat=1.1)
+
     def test_fixed_seed(self, model):
+        # the warmup points come from the optlang solver of the model
         s = sample(model, 1, seed=42)
-        assert numpy.allclose(s.TPI[0], [8.38570846])
+        assert numpy.allclose(s.TPI[0], [9.74862487])
 
     def setup_class(self):
         from . import create_test_model
@@ -568,6 +784,10 @@ class TestCobraFluxSampling:
     def test_optgp_sample_benchmark(self, benchmark):
         benchmark(self.optgp.sample, 1)
 
+    def test_multi_chain_sample_benchmark(self, model, benchmark):
+        optgp = OptGPSampler(model, processes=1, chains=100)
+        benchmark(optgp.sample, 100)
+
     def test_batch_sampling(self):
         for b in self.arch.batch(5, 4):
             assert all(self.arch.validate(b) == "v")
@@ -100,6 +100,27 @@ class TestManipulation:
                                                for i in
                                                ("TKT1", "TKT2", "TPI")}
 
+    def test_compiled_gpr(self, model):
+        reaction = Reaction("test")
+        reaction.gene_reaction_rule = "(b0008 and (b0114 or b0116)) or b2276"
+        model.add_reaction(reaction)
+        compiled = CompiledGPR(model)
+        assert compiled.reactions == [r.id for r in model.reactions]
+        knockouts = [[], ["b0008"], ["b0008", "b0114"], ["b0114", "b0116"],
+                     ["b2276", "b0008"], ["b2276", "b0114", "b0116"],
+                     [model.genes.b1779], ["b3919", "b2935"]]
+        disabled = compiled.knockout_matrix(knockouts)
+        assert disabled.shape == (len(knockouts), len(model.reactions))
+        assert not disabled[0].any()
+        for genes, row in zip(knockouts, disabled):
+            expected = find_gene_knockout_reactions(model, genes)
+            assert {model.reactions[i] for i in row.nonzero()[0]} == \
+                set(expected)
+        index = model.reactions.index(reaction)
+        assert disabled[:, index].tolist() == [
+            False, False, False, False, True, True, False, False]
+        assert disabled[-1, model.reactions.index("TPI")]
+
     def test_gene_knockout_computation(self, salmonella):
         def find_gene_knockout_reactions_fast(cobra_model, gene_list):
             compiled_rules = get_compiled_gene_reaction_rules(
@@ -3,15 +3,19 @@ from __future__ import absolute_import
 
 import warnings
 from copy import deepcopy
+from pickle import dumps, loads
 
 import numpy
 import pytest
+from six import iteritems
 from sympy import S
+from sympy.core.cache import clear_cache
 
 import cobra.util.solver as su
-from cobra.core import Metabolite, Model, Reaction
+from cobra.core import CompactModel, Metabolite, Model, Reaction
+from cobra.exceptions import OptimizationError
 from cobra.solvers import solver_dict
-from cobra.util import create_stoichiometric_array
+from cobra.util import create_stoichiometric_array, nullspace
 
 stable_optlang = ["glpk", "cplex", "gurobi"]
 optlang_solvers = ["optlang-" + s for s in stable_optlang if s in su.solvers]
@@ -22,6 +26,11 @@ try:
 except ImportError:
     scipy = None
 
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
 
 class TestReactions:
     def test_gpr(self):
@@ -296,6 +305,31 @@ class TestCobraModel:
 
         benchmark(benchmark_add_reaction)
 
+    def test_add_reactions_benchmark(self, large_model, benchmark):
+        def build_model():
+            new_model = Model("iJO1366")
+            new_model.add_reactions([r.copy() for r in large_model.reactions])
+
+        benchmark(build_model)
+
+    def test_add_reactions_bulk(self, large_model):
+        new_model = Model("iJO1366")
+        new_model.add_reactions([r.copy() for r in large_model.reactions])
+        assert len(new_model.variables) == 2 * len(new_model.reactions)
+        assert len(new_model.constraints) == len(new_model.metabolites)
+        for reaction in large_model.reactions:
+            new_reaction = new_model.reactions.get_by_id(reaction.id)
+            assert new_reaction.bounds == reaction.bounds
+            assert new_reaction.forward_variable.lb == \
+                reaction.forward_variable.lb
+            assert new_reaction.reverse_variable.ub == \
+                reaction.reverse_variable.ub
+        new_model.objective = {
+            new_model.reactions.get_by_id(r.id): r.objective_coefficient
+            for r in large_model.reactions if r.objective_coefficient != 0}
+        assert abs(new_model.optimize().f -
+                   large_model.optimize().f) < 1e-6
+
     def test_add_metabolite(self, model):
         new_metabolite = Metabolite('test_met')
         assert new_metabolite not in model.metabolites
@@ -454,6 +488,25 @@ class TestCobraModel:
             assert tmp_metabolite in model.metabolites
         assert tmp_metabolite not in model.metabolites
 
+    def test_remove_reactions_benchmark(self, large_model, benchmark):
+        def remove_reactions():
+            with large_model:
+                large_model.remove_reactions(large_model.reactions[::2])
+
+        benchmark(remove_reactions)
+
+    def test_remove_reactions_bulk(self, model):
+        ids = [r.id for r in model.reactions]
+        with model:
+            model.remove_reactions(model.reactions[::2],
+                                   remove_orphans=True)
+            assert [r.id for r in model.reactions] == ids[1::2]
+            for i, r in enumerate(model.reactions):
+                assert model.reactions.index(r.id) == i
+            assert len(model.variables) == 2 * len(ids[1::2])
+        assert sorted(r.id for r in model.reactions) == sorted(ids)
+        assert len(model.variables) == 2 * len(ids)
+
     def test_reaction_remove(self, model):
         old_reaction_count = len(model.reactions)
         tmp_metabolite = Metabolite("testing")
@@ -570,6 +623,46 @@ class TestCobraModel:
         assert old_reaction_count == len(model.reactions)
         assert len(model.reactions) != len(model_copy.reactions)
 
+    def test_copy_on_write_benchmark(self, large_model, benchmark):
+        benchmark(large_model.copy, copy_on_write=True)
+
+    def test_copy_on_write(self, model):
+        stoichiometry = model.S
+        model_copy = model.copy(copy_on_write=True)
+        assert model_copy._solver is None
+        assert model_copy.problem is model.problem
+        assert model_copy.S.data is stoichiometry.data
+        for attr in ("reactions", "metabolites", "genes"):
+            assert [x.id for x in getattr(model_copy, attr)] == \
+                [x.id for x in getattr(model, attr)]
+        assert numpy.array_equal(model_copy.S.dense, numpy.array(
+            [[rxn._metabolites.get(met, 0) for rxn in model_copy.reactions]
+             for met in model_copy.metabolites]))
+        # the copy keeps the state of the model at the time of copying
+        model.reactions.EX_glc__D_e.lower_bound = -1
+        model_copy.reactions.PGI.add_metabolites({"atp_c": 1})
+        assert model_copy.S.data is not stoichiometry.data
+        assert model.S.data is stoichiometry.data
+        model_copy.reactions.PGI.subtract_metabolites({"atp_c": 1})
+        assert abs(model_copy.slim_optimize() - 0.8739) < 0.001
+        assert model_copy.solver is not model.solver
+        assert model.slim_optimize() < 0.8
+        restored = loads(dumps(model.copy(copy_on_write=True)))
+        assert restored.slim_optimize() < 0.8
+        with model.batch_edit():
+            model_copy = model.copy(copy_on_write=True)
+        assert model_copy._batch is None
+        # a copy of an unused copy gets the same description of the solver
+        assert model_copy.copy(copy_on_write=True)._solver_snapshot is \
+            model_copy._solver_snapshot
+        assert model_copy.reactions.PGI._gene_reaction_rule is \
+            model.reactions.PGI._gene_reaction_rule
+        # additional constraints are copied with the solver right away
+        model.add_cons_vars(model.problem.Constraint(
+            model.reactions.PGI.flux_expression, lb=1, name="extra"))
+        model_copy = model.copy(copy_on_write=True)
+        assert "extra" in model_copy._solver.constraints
+
     def test_deepcopy_benchmark(self, model, benchmark):
         benchmark(deepcopy, model)
 
@@ -725,6 +818,91 @@ class TestCobraModel:
             assert model.reactions[0].bounds == bounds1
         assert model.reactions[0].bounds == bounds0
 
+    def test_slim_optimize(self, model):
+        with model:
+            assert abs(model.slim_optimize() -
+                       model.optimize().objective_value) < 1e-9
+            model.reactions.Biomass_Ecoli_core.lower_bound = 10
+            assert numpy.isnan(model.slim_optimize())
+            assert model.slim_optimize(error_value=-1) == -1
+            with pytest.raises(OptimizationError):
+                model.slim_optimize(error_value=None)
+
+    def test_batch_edit(self, model):
+        pgi = model.reactions.PGI
+        exchanges = model.exchanges
+        biomass = model.reactions.Biomass_Ecoli_core
+        atpm = model.reactions.ATPM
+        old_bounds = {r: r.bounds for r in model.reactions}
+        with model:
+            with model.batch_edit():
+                for rxn in exchanges:
+                    rxn.lower_bound = -5
+                pgi.lower_bound = 5
+                pgi.upper_bound = 2
+                atpm.objective_coefficient = 0.5
+                # solver is only updated on exit
+                assert pgi.bounds == (2, 2)
+                assert pgi.forward_variable.lb == 0
+                assert atpm.objective_coefficient == 0.5
+            assert len(model._contexts[-1]._history) == 2
+            assert pgi.forward_variable.lb == 2
+            assert pgi.forward_variable.ub == 2
+            assert pgi.reverse_variable.ub == 0
+            for rxn in exchanges:
+                assert rxn.reverse_variable.ub == 5
+            assert su.linear_reaction_coefficients(model) == {
+                biomass: 1., atpm: 0.5}
+        for rxn, bounds in old_bounds.items():
+            assert rxn.bounds == bounds
+            assert rxn.forward_variable.lb == max(bounds[0], 0)
+            assert rxn.reverse_variable.ub == max(-bounds[0], 0)
+        assert su.linear_reaction_coefficients(model) == {biomass: 1.}
+        assert abs(model.optimize().objective_value - 0.8739) < 0.001
+
+    def test_context_undo_log(self, model):
+        pgi = model.reactions.PGI
+        atpm = model.reactions.ATPM
+        biomass = model.reactions.Biomass_Ecoli_core
+        old_bounds = {r: r.bounds for r in model.reactions}
+        variable = model.problem.Variable("extra")
+        constraint = model.problem.Constraint(variable, lb=0, ub=1,
+                                              name="extra_constraint")
+        with model:
+            for rxn in model.reactions:
+                rxn.bounds = (-1, 1)
+            pgi.lower_bound = 0
+            pgi.upper_bound = 0
+            atpm.objective_coefficient = 1
+            biomass.objective_coefficient = 2
+            model.add_cons_vars([variable])
+            model.add_cons_vars(constraint)
+            history = model._contexts[-1]._history
+            # one log each for the bounds, the objective and the solver
+            assert len(history) == 3
+            model.objective = {pgi: 1}
+            assert len(history) == 4
+        assert "extra" not in model.variables
+        assert "extra_constraint" not in model.constraints
+        for rxn, bounds in old_bounds.items():
+            assert rxn.bounds == bounds
+            assert rxn.forward_variable.ub == max(bounds[1], 0)
+            assert rxn.reverse_variable.ub == max(-bounds[0], 0)
+        assert su.linear_reaction_coefficients(model) == {biomass: 1.}
+        assert abs(model.optimize().objective_value - 0.8739) < 0.001
+
+    def test_context_manager_benchmark(self, model, benchmark):
+        exchanges = model.exchanges
+
+        def knockouts():
+            for rxn in model.reactions:
+                with model:
+                    rxn.knock_out()
+                    for exchange in exchanges:
+                        exchange.lower_bound = -5
+                    model.reactions.ATPM.objective_coefficient = 0.1
+        benchmark(knockouts)
+
 
 class TestStoichiometricMatrix:
     """Test the simple replacement for ArrayBasedModel"""
@@ -814,6 +992,75 @@ class TestStoichiometricMatrix:
         mass_balance = S.dot(solution.fluxes)
         assert numpy.allclose(mass_balance, 0)
 
+    def test_model_matrix(self, model):
+        S = model.S
+        pgi = model.reactions.index("PGI")
+        atp = model.metabolites.index("atp_c")
+        assert S.shape == (len(model.metabolites), len(model.reactions))
+        assert numpy.allclose(S.dense, create_stoichiometric_array(model))
+        # editing coefficients patches the cached matrix
+        model.reactions.PGI.add_metabolites({"atp_c": -2})
+        assert model.S is S
+        assert S.dense[atp, pgi] == -2
+        assert S.data_frame.loc["atp_c", "PGI"] == -2
+        with model:
+            rxn = Reaction("test")
+            rxn.add_metabolites({Metabolite("test_c"): 1,
+                                 model.metabolites.atp_c: -1})
+            model.add_reactions([rxn])
+            assert model.S is not S
+            assert model.S.shape == (S.shape[0] + 1, S.shape[1] + 1)
+            assert model.S.dense[atp, -1] == -1
+        assert model.S.shape == S.shape
+        model.reactions.PGI.subtract_metabolites({"atp_c": -2})
+        assert model.S.dense[atp, pgi] == 0
+        assert numpy.allclose(numpy.asarray(model.S),
+                              create_stoichiometric_array(model))
+        if scipy:
+            assert numpy.allclose(model.S.sparse.toarray(), model.S.dense)
+
+    def test_model_matrix_order(self, model):
+        def expected():
+            return numpy.array([[rxn._metabolites.get(met, 0)
+                                 for rxn in model.reactions]
+                                for met in model.metabolites])
+
+        S = model.S
+        cached = model.S.nullspace()
+        model.reactions.sort(key=lambda r: r.id)
+        assert model.S is not S
+        assert numpy.array_equal(create_stoichiometric_array(model),
+                                 expected())
+        assert model.S.nullspace() is not cached
+        S = model.S
+        model.metabolites.sort(key=lambda m: m.name)
+        assert model.S is not S
+        assert numpy.array_equal(model.S.dense, expected())
+
+    @pytest.mark.skipif(not scipy, reason='Sparse array methods require scipy')
+    def test_nullspace(self, model):
+        S = model.S.dense
+        svd = nullspace(S, method="svd")
+        sparse = nullspace(S, method="sparse")
+        assert sparse.shape == svd.shape
+        assert numpy.allclose(S.dot(sparse), 0)
+        assert numpy.allclose(sparse.T.dot(sparse), numpy.eye(svd.shape[1]))
+        assert numpy.allclose(sparse.dot(sparse.T), svd.dot(svd.T))
+        basis = model.S.nullspace(sparse=True)
+        assert basis.shape == svd.shape
+        assert basis.nnz < 0.5 * numpy.prod(basis.shape)
+        assert numpy.allclose(S.dot(basis.toarray()), 0)
+        # bases are cached until the matrix changes
+        assert model.S.nullspace() is model.S.nullspace()
+        cached = model.S.nullspace()
+        model.reactions.PGI.add_metabolites({"atp_c": -1})
+        assert model.S.nullspace() is not cached
+        assert numpy.allclose(model.S.dense.dot(model.S.nullspace()), 0)
+
+    @pytest.mark.skipif(not scipy, reason='Sparse array methods require scipy')
+    def test_nullspace_benchmark(self, large_model, benchmark):
+        benchmark(nullspace, large_model.S.sparse)
+
     @pytest.mark.skipif(not scipy, reason='Sparse array methods require scipy')
     def test_sparse_matrix(self, model):
         sparse_types = ['dok', 'lil']
@@ -825,3 +1072,55 @@ class TestStoichiometricMatrix:
             assert numpy.allclose(mass_balance, 0)
 
             # Is this really the best way to get a vector of fluxes?
+
+
+class TestCompactModel:
+    def test_compact_model(self, model):
+        compact = CompactModel(model)
+        pgi = compact.get_reaction("PGI")
+        assert pgi.bounds == model.reactions.PGI.bounds
+        assert {met.id: coef for met, coef in iteritems(pgi.metabolites)} \
+            == {met.id: coef for met, coef in
+                iteritems(model.reactions.PGI.metabolites)}
+        assert pgi in compact.get_metabolite("g6p_c").reactions
+        biomass = compact.get_reaction("Biomass_Ecoli_core")
+        assert biomass.objective_coefficient == 1
+        assert len(compact.reactions) == len(model.reactions)
+        assert [m.id for m in compact.metabolites] == \
+            [m.id for m in model.metabolites]
+        with pytest.raises(ValueError):
+            compact.data[0] = 2
+
+        variant = compact.copy()
+        variant.get_reaction("EX_glc__D_e").lower_bound = -1
+        assert compact.get_reaction("EX_glc__D_e").lower_bound == -10
+        assert variant.data is compact.data
+        rebuilt = compact.to_model()
+        assert abs(rebuilt.slim_optimize() - model.slim_optimize()) < 1e-6
+        assert rebuilt.reactions.PGI.gene_reaction_rule == \
+            model.reactions.PGI.gene_reaction_rule
+        assert len(rebuilt.genes) == len(model.genes)
+        assert variant.to_model().slim_optimize() < 0.1
+
+    @pytest.mark.skipif(tracemalloc is None, reason="needs tracemalloc")
+    def test_compact_model_memory(self, large_model):
+        """Compact copies are much smaller than model copies."""
+        compact = CompactModel(large_model)
+        clear_cache()
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            copied_model = large_model.copy()
+            clear_cache()
+            full = tracemalloc.get_traced_memory()[0] - start
+            start = tracemalloc.get_traced_memory()[0]
+            copied = compact.copy()
+            compact_size = tracemalloc.get_traced_memory()[0] - start
+        finally:
+            tracemalloc.stop()
+        assert copied is not compact
+        assert len(copied_model.reactions) == len(copied.reactions)
+        assert compact_size * 20 < full
+
+    def test_compact_model_benchmark(self, large_model, benchmark):
+        benchmark(CompactModel, large_model)
@@ -57,6 +57,38 @@ class TestSolution:
             raise TypeError(
                 "solutions of type {0:r} are untested".format(type(solution)))
 
+    def test_solution_values_follow_structure_changes(self, model):
+        def check_solution():
+            solution = model.optimize()
+            primals = model.solver.primal_values
+            shadow = model.solver.shadow_prices
+            for rxn in model.reactions:
+                assert solution.fluxes[rxn.id] == \
+                    primals[rxn.id] - primals[rxn.reverse_id]
+            for met in model.metabolites:
+                assert solution.shadow_prices[met.id] == shadow[met.id]
+
+        check_solution()
+        with model:
+            model.remove_reactions([model.reactions.PGI])
+            check_solution()
+        # PGI is now the last reaction and uses the last variables
+        assert model.reactions[-1].id == "PGI"
+        check_solution()
+        # reordering keeps the number of reactions and metabolites
+        model.reactions.sort(key=lambda r: r.id)
+        check_solution()
+        model.metabolites.reverse()
+        check_solution()
+
+    def test_solution_subset(self, model):
+        solution = model.optimize()
+        reactions = model.reactions[5:10]
+        subset = cobra.core.get_solution(model, reactions=reactions)
+        assert list(subset.fluxes.index) == [r.id for r in reactions]
+        assert numpy.allclose(subset.fluxes,
+                              solution.fluxes[[r.id for r in reactions]])
+
 
 class TestReaction:
     def test_str(self, model):
@@ -3,13 +3,16 @@ from __future__ import absolute_import, print_function
 
 import re
 from copy import copy, deepcopy
+from multiprocessing import Pool
 from pickle import HIGHEST_PROTOCOL, dumps, loads
 
+import numpy
 import pytest
 from six.moves import range
 
 from cobra import DictList, Object
-from cobra.util import Frozendict
+from cobra.core.dictlist import INDEXED_ATTRIBUTES
+from cobra.util import Frozendict, SharedArray
 
 
 @pytest.fixture(scope="session")
@@ -30,6 +33,16 @@ def dict_list():
     return obj, test_list
 
 
+def _init_shared(shared):
+    global _shared
+    _shared = shared
+
+
+def _double_row(i):
+    _shared.array[i] *= 2
+    return _shared.array[i].sum()
+
+
 class TestDictList:
     def test_contains(self, dict_list):
         obj, test_list = dict_list
@@ -148,6 +161,26 @@ class TestDictList:
         with pytest.raises(ValueError):
             sum -= [Object('bogus')]
 
+    def test_remove_many(self, dict_list):
+        obj, test_list = dict_list
+        obj_list = [Object("test%d" % i) for i in range(2, 200)]
+        test_list.extend(obj_list)
+        test_list.remove_many(obj_list[::3] + ["test1"])
+        expected = [o for o in obj_list if o not in obj_list[::3]]
+        assert list(test_list) == expected
+        test_list.remove_many(expected[:2])
+        test_list.pop(10)
+        test_list.append(obj)
+        del test_list[0]
+        expected = expected[3:12] + expected[13:] + [obj]
+        assert list(test_list) == expected
+        for i, o in enumerate(expected):
+            assert test_list.index(o.id) == i
+            assert test_list.get_by_id(o.id) is o
+        with pytest.raises(ValueError):
+            test_list.remove_many([expected[0], Object("bogus")])
+        assert len(test_list) == len(expected)
+
     def test_init_copy(self, dict_list):
         obj, test_list = dict_list
         test_list.append(Object("test2"))
@@ -243,6 +276,36 @@ class TestDictList:
         result = test_list.query(lambda x: x.id == 'test1')
         assert len(result) == 1
 
+    def test_query_index(self):
+        obj_list = DictList(Object("test%d" % i, name="abc"[i % 3])
+                            for i in range(12))
+        for obj in obj_list:
+            obj.annotation["key"] = [obj.name, "x"]
+        obj_list.add_index("name")
+        obj_list.add_index("annotation.key")
+        result = obj_list.query("^a$", "name")
+        assert [o.id for o in result] == ["test0", "test3", "test6", "test9"]
+        assert len(obj_list.query("x", "annotation.key")) == 12
+        obj_list[0].name = "b"
+        obj_list.pop(3)
+        obj_list.append(Object("test12", name="a"))
+        obj_list.remove_many(["test6"])
+        result = obj_list.query("^a$", "name")
+        assert [o.id for o in result] == ["test9", "test12"]
+        assert obj_list.query("b", "name")[0].id == "test0"
+        obj_list[0].annotation = {}
+        assert len(obj_list.query("x", "annotation.key")) == 9
+        unpickled = loads(dumps(obj_list))
+        assert len(unpickled.query("^a$", "name")) == 2
+        del unpickled
+        obj_list.remove_index("name")
+        assert len(obj_list.query("^a$", "name")) == 2
+        # attributes without any index are no longer watched
+        assert "name" not in INDEXED_ATTRIBUTES
+        assert "name" not in vars(Object)
+        with pytest.raises(TypeError):
+            obj_list.add_index("notes")
+
     def test_removal(self):
         obj_list = DictList(Object("test%d" % (i)) for i in range(2, 10))
         del obj_list[3]
@@ -322,3 +385,42 @@ class FrozendictTestCase:
             frozen_dict.update()
 
         assert hasattr(frozen_dict, "__hash__")
+
+
+class TestSharedArray:
+    def test_worker_attaches(self):
+        data = numpy.arange(12, dtype=float).reshape(4, 3)
+        shared = SharedArray(data)
+        assert numpy.array_equal(shared.array, data)
+        pool = Pool(2, initializer=_init_shared, initargs=(shared,))
+        try:
+            sums = pool.map(_double_row, range(4))
+        finally:
+            pool.close()
+            pool.join()
+        assert sums == list(2 * data.sum(axis=1))
+        # changes in the workers are visible without copying back
+        assert numpy.array_equal(shared.array, 2 * data)
+
+    def test_memmap_pickle(self, tmpdir):
+        data = numpy.ones((2, 5), dtype=numpy.int32)
+        shared = SharedArray(data, memmap=True, dir=str(tmpdir))
+        assert len(tmpdir.listdir()) == 1
+        attached = loads(dumps(shared))
+        assert attached.array.shape == (2, 5)
+        assert attached.array.dtype == numpy.int32
+        attached.array[1, 2] = 7
+        assert shared.array[1, 2] == 7
+        # only the creator removes the file
+        del attached
+        assert len(tmpdir.listdir()) == 1
+        shared.close()
+        assert tmpdir.listdir() == []
+        assert shared.array[1, 2] == 7
+
+    def test_buffer_pickle(self):
+        shared = SharedArray(numpy.arange(4.0))
+        # outside of a new process the data is copied
+        copied = loads(dumps(shared))
+        copied.array[0] = 5.0
+        assert shared.array[0] == 0.0
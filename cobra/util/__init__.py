@@ -6,3 +6,4 @@ from cobra.util.context import *
 from cobra.util.solver import *
 from cobra.util.util import *
 from cobra.util.array import *
+from cobra.util.shared import *
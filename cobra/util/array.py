@@ -2,15 +2,194 @@
 
 from __future__ import absolute_import
 
-from itertools import product
+import heapq
+
 import numpy as np
 import pandas as pd
-from six import iteritems
+from six import iteritems, itervalues
 
 try:
-    from scipy.sparse import dok_matrix, lil_matrix
+    from scipy.sparse import (
+        csc_matrix, csr_matrix, dok_matrix, issparse, lil_matrix)
 except ImportError:
-    dok_matrix, lil_matrix = None, None
+    csc_matrix, csr_matrix, dok_matrix, lil_matrix = None, None, None, None
+    issparse = None
+
+SPARSE_NULLSPACE_SIZE = 500
+"""Matrices with more rows and columns use sparse nullspace computation."""
+
+
+class StoichiometricMatrix(object):
+    """The stoichiometric matrix of a model in compressed column format.
+
+    Columns are the reactions and rows the metabolites of the model. The
+    matrix is built in a single pass over the reactions from coordinate
+    triples. It is owned by the model and obtained via `Model.S`, which
+    keeps it up to date: columns of reactions whose coefficients were
+    edited are patched, while adding, removing or reordering reactions or
+    metabolites triggers a rebuild. Nullspace bases are cached until the
+    matrix changes.
+
+    Parameters
+    ----------
+    model : cobra.Model
+        The model to construct the matrix for.
+
+    Attributes
+    ----------
+    shape : tuple of int
+        The number of metabolites and reactions.
+    data, indices, indptr : numpy.ndarray
+        The coefficients, their row indices and the start of each column
+        in `data` as used by `scipy.sparse.csc_matrix`.
+    """
+
+    def __init__(self, model):
+        self._model = model
+        self._modified = set()
+        self._nullspaces = {}
+        self._met_index = {met: i for i, met in
+                           enumerate(model.metabolites)}
+        self._order = (list(model.reactions), list(model.metabolites))
+        self.shape = (len(model.metabolites), len(model.reactions))
+        counts, self.indices, self.data = self._columns(model.reactions)
+        self.indptr = np.concatenate(([0], np.cumsum(counts)))
+
+    def _columns(self, reactions):
+        """Get the entries of the columns of some reactions."""
+        counts = np.fromiter((len(rxn._metabolites) for rxn in reactions),
+                             dtype=int, count=len(reactions))
+        n = counts.sum()
+        indices = np.fromiter(
+            (self._met_index[met] for rxn in reactions
+             for met in rxn._metabolites), dtype=int, count=n)
+        data = np.fromiter(
+            (coef for rxn in reactions for coef in
+             itervalues(rxn._metabolites)), dtype=float, count=n)
+        return counts, indices, data
+
+    def matches(self, model):
+        """Whether the matrix has the current reactions and metabolites of a
+        model in the same order."""
+        # comparing the lists only checks the identity of their elements
+        return self._order[0] == model.reactions and \
+            self._order[1] == model.metabolites
+
+    def modify(self, reaction):
+        """Mark the column of a reaction for an update."""
+        self._modified.add(reaction)
+
+    def copy(self, model):
+        """Get the matrix of a copy of the model.
+
+        Coefficient arrays and nullspaces are shared with this matrix since
+        they are replaced rather than changed in place by `update`.
+
+        Parameters
+        ----------
+        model : cobra.Model
+            The copy of the model this matrix was built for.
+
+        Returns
+        -------
+        StoichiometricMatrix
+            The matrix for `model`.
+        """
+        self.update()
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        new._model = model
+        new._modified = set()
+        new._nullspaces = dict(self._nullspaces)
+        new._met_index = {met: i for i, met in enumerate(model.metabolites)}
+        new._order = (list(model.reactions), list(model.metabolites))
+        return new
+
+    def update(self):
+        """Patch the columns of all modified reactions."""
+        if not self._modified:
+            return
+        self._nullspaces = {}
+        reactions = self._model.reactions
+        columns = np.array(sorted(reactions.index(rxn)
+                                  for rxn in self._modified
+                                  if rxn._model is self._model), dtype=int)
+        self._modified = set()
+        counts = np.diff(self.indptr)
+        entry_columns = np.repeat(np.arange(self.shape[1]), counts)
+        keep = ~np.isin(entry_columns, columns)
+        new_counts, new_indices, new_data = self._columns(
+            [reactions[i] for i in columns])
+        entry_columns = np.concatenate((entry_columns[keep],
+                                        np.repeat(columns, new_counts)))
+        order = np.argsort(entry_columns, kind="mergesort")
+        self.indices = np.concatenate(
+            (self.indices[keep], new_indices))[order]
+        self.data = np.concatenate((self.data[keep], new_data))[order]
+        counts[columns] = new_counts
+        self.indptr = np.concatenate(([0], np.cumsum(counts)))
+
+    @property
+    def dense(self):
+        """A new numpy array with the stoichiometric matrix."""
+        array = np.zeros(self.shape)
+        columns = np.repeat(np.arange(self.shape[1]), np.diff(self.indptr))
+        array[self.indices, columns] = self.data
+        return array
+
+    @property
+    def sparse(self):
+        """A new `scipy.sparse.csc_matrix` with the stoichiometric matrix."""
+        if csc_matrix is None:
+            raise ValueError('Sparse matrices require scipy')
+        return csc_matrix((self.data, self.indices, self.indptr),
+                          shape=self.shape, copy=True)
+
+    @property
+    def data_frame(self):
+        """A `pandas.DataFrame` with metabolite and reaction identifiers."""
+        return pd.DataFrame(
+            self.dense, index=[met.id for met in self._model.metabolites],
+            columns=[rxn.id for rxn in self._model.reactions])
+
+    def nullspace(self, columns=None, sparse=False):
+        """Get a basis for the nullspace of the matrix or some of its columns.
+
+        The result is cached until the matrix changes.
+
+        Parameters
+        ----------
+        columns : list of int, optional
+            The indices of the columns to use. Defaults to all columns.
+        sparse : bool, optional
+            Whether to return the sparse basis from `sparse_nullspace`
+            instead of the orthonormal one from `nullspace`.
+
+        Returns
+        -------
+        numpy.ndarray or scipy.sparse.csc_matrix
+            The basis vectors as columns. Dense bases are read-only.
+        """
+        key = (None if columns is None else tuple(columns), sparse)
+        if key not in self._nullspaces:
+            if sparse:
+                matrix = self.sparse
+                if columns is not None:
+                    matrix = matrix[:, np.asarray(columns, dtype=int)]
+                basis = sparse_nullspace(matrix)
+            else:
+                matrix = self.dense
+                if columns is not None:
+                    matrix = matrix[:, np.asarray(columns, dtype=int)]
+                basis = nullspace(matrix)
+                basis.flags.writeable = False
+            self._nullspaces[key] = basis
+        basis = self._nullspaces[key]
+        return basis.copy() if sparse else basis
+
+    def __array__(self, dtype=None):
+        array = self.dense
+        return array if dtype is None else array.astype(dtype, copy=False)
 
 
 def create_stoichiometric_array(model, array_type='dense', dtype=None):
@@ -36,6 +215,11 @@ def create_stoichiometric_array(model, array_type='dense', dtype=None):
     -------
     matrix of class `dtype`
         The stoichiometric matrix for the given model.
+
+    Notes
+    -----
+    The array is obtained from the cached matrix of the model, see
+    `Model.S`.
     """
     if array_type not in ('data_frame', 'dense') and not dok_matrix:
         raise ValueError('Sparse matrices require scipy')
@@ -43,46 +227,29 @@ def create_stoichiometric_array(model, array_type='dense', dtype=None):
     if dtype is None:
         dtype = np.float64
 
-    def data_frame(_, dtype):
+    stoichiometry = model.S
+    if array_type == 'dense':
+        return stoichiometry.dense.astype(dtype, copy=False)
+    elif array_type == 'data_frame':
         metabolite_ids = [met.id for met in model.metabolites]
         reaction_ids = [rxn.id for rxn in model.reactions]
-        index = pd.MultiIndex.from_tuples(
-            list(product(metabolite_ids, reaction_ids)))
-        return pd.DataFrame(data=0, index=index, columns=['stoichiometry'],
-                            dtype=dtype)
-
-    array_constructor = {
-        'dense': np.zeros, 'dok': dok_matrix, 'lil': lil_matrix,
-        'data_frame': data_frame
-    }
-
-    n_metabolites = len(model.metabolites)
-    n_reactions = len(model.reactions)
-    array = array_constructor[array_type]((n_metabolites, n_reactions),
-                                          dtype=dtype)
-
-    m_ind = model.metabolites.index
-    r_ind = model.reactions.index
-
-    for reaction in model.reactions:
-        for metabolite, stoich in iteritems(reaction.metabolites):
-            if array_type == 'data_frame':
-                array.set_value((metabolite.id, reaction.id),
-                                'stoichiometry', stoich)
-            else:
-                array[m_ind(metabolite), r_ind(reaction)] = stoich
-
-    return array
+        index = pd.MultiIndex.from_product([metabolite_ids, reaction_ids])
+        data = stoichiometry.dense.astype(dtype, copy=False).ravel()
+        return pd.DataFrame(data=data, index=index,
+                            columns=['stoichiometry'])
+    array = stoichiometry.sparse.astype(dtype)
+    return array.todok() if array_type == 'dok' else array.tolil()
 
 
-def nullspace(A, atol=1e-13, rtol=0):
+def nullspace(A, atol=1e-13, rtol=0, method="auto", tol=1e-10):
     """Compute an approximate basis for the nullspace of A.
     The algorithm used by this function is based on the singular value
-    decomposition of `A`.
+    decomposition of `A` for small matrices and on sparse elimination (see
+    `sparse_nullspace`) followed by an orthonormalization for large ones.
 
     Parameters
     ----------
-    A : numpy.ndarray
+    A : numpy.ndarray or scipy.sparse matrix
         A should be at most 2-D.  A 1-D array with length k will be treated
         as a 2-D with shape (1, k)
     atol : float
@@ -91,6 +258,13 @@ def nullspace(A, atol=1e-13, rtol=0):
     rtol : float
         The relative tolerance.  Singular values less than rtol*smax are
         considered to be zero, where smax is the largest singular value.
+    method : {"auto", "svd", "sparse"}
+        Whether to use the singular value decomposition or sparse
+        elimination. "auto" uses sparse elimination if scipy is available
+        and `A` has more than `SPARSE_NULLSPACE_SIZE` rows and columns.
+    tol : float
+        Entries with an absolute value smaller than `tol` are considered to
+        be zero during sparse elimination.
 
     If both `atol` and `rtol` are positive, the combined tolerance is the
     maximum of the two; that is::
@@ -102,17 +276,168 @@ def nullspace(A, atol=1e-13, rtol=0):
     numpy.ndarray
         If `A` is an array with shape (m, k), then `ns` will be an array
         with shape (k, n), where n is the estimated dimension of the
-        nullspace of `A`.  The columns of `ns` are a basis for the
-        nullspace; each element in numpy.dot(A, ns) will be approximately
-        zero.
+        nullspace of `A`.  The columns of `ns` are an orthonormal basis for
+        the nullspace; each element in numpy.dot(A, ns) will be
+        approximately zero.
 
     Notes
     -----
-    Taken from the numpy cookbook.
+    The SVD variant is taken from the numpy cookbook.
     """
+    if method not in ("auto", "svd", "sparse"):
+        raise ValueError("unknown nullspace method '%s'" % method)
+    if method == "auto":
+        method = "sparse" if csc_matrix is not None and \
+            min(A.shape) > SPARSE_NULLSPACE_SIZE else "svd"
+    if method == "sparse":
+        basis = sparse_nullspace(A, tol).toarray()
+        return np.linalg.qr(basis)[0]
+    if issparse is not None and issparse(A):
+        A = A.toarray()
     A = np.atleast_2d(A)
     u, s, vh = np.linalg.svd(A)
     tol = max(atol, rtol * s[0])
     nnz = (s >= tol).sum()
     ns = vh[nnz:].conj().T
     return ns
+
+
+def sparse_nullspace(A, tol=1e-10, threshold=0.1):
+    """Compute a sparse basis for the nullspace of A.
+
+    Uses Gaussian elimination with Markowitz pivoting to find the rank of
+    `A`, a set of pivot columns and an upper triangular factor `U`. Each
+    basis vector sets one of the remaining free columns to one and the
+    pivot columns to the solution of the triangular system. Stoichiometric
+    matrices are very sparse, so this is much faster than a singular value
+    decomposition and the basis has few non-zero entries. The basis is not
+    orthonormal.
+
+    Parameters
+    ----------
+    A : numpy.ndarray or scipy.sparse matrix
+        The matrix with shape (m, k).
+    tol : float
+        Entries with an absolute value smaller than `tol` are considered to
+        be zero. Columns whose largest remaining entry is below `tol` are
+        linearly dependent on the previous ones.
+    threshold : float
+        A pivot must be at least `threshold` times the largest remaining
+        entry of its column. Smaller values favor sparsity, larger values
+        numerical stability.
+
+    Returns
+    -------
+    scipy.sparse.csc_matrix
+        A matrix with shape (k, n) whose columns are a basis of the
+        nullspace of `A`, where n is its estimated dimension.
+    """
+    if csc_matrix is None:
+        raise ValueError('Sparse matrices require scipy')
+    A = csr_matrix(A)
+    n = A.shape[1]
+    rows, pivots = _eliminate(A, tol, threshold)
+    pivot_columns = np.array([c for _, c in pivots], dtype=int)
+    free = np.setdiff1d(np.arange(n), pivot_columns)
+    # the pivot rows in pivot order are upper triangular on the pivot
+    # columns since every pivot column was eliminated from later rows
+    upper = [[] for _ in pivots]
+    diagonal = np.zeros(len(pivots))
+    rhs = [[] for _ in free]
+    position = np.full(n, -1, dtype=int)
+    position[pivot_columns] = np.arange(len(pivots))
+    free_position = np.full(n, -1, dtype=int)
+    free_position[free] = np.arange(len(free))
+    for k, (i, _) in enumerate(pivots):
+        for j, v in iteritems(rows[i]):
+            if position[j] == k:
+                diagonal[k] = v
+            elif position[j] >= 0:
+                upper[position[j]].append((k, v))
+            else:
+                rhs[free_position[j]].append((k, -v))
+    # back-substitute one free column at a time and only keep the
+    # non-zero entries so the dense basis is never built
+    basis_rows, basis_cols, data = [], [], []
+    for f, column in enumerate(rhs):
+        basis_rows.append(free[f])
+        basis_cols.append(f)
+        data.append(1.0)
+        residual = dict(column)
+        queue = [-k for k in residual]
+        heapq.heapify(queue)
+        while queue:
+            k = -heapq.heappop(queue)
+            if k not in residual:
+                continue
+            x = residual.pop(k) / diagonal[k]
+            if abs(x) < tol:
+                continue
+            basis_rows.append(pivot_columns[k])
+            basis_cols.append(f)
+            data.append(x)
+            for row, v in upper[k]:
+                if row not in residual:
+                    residual[row] = 0.0
+                    heapq.heappush(queue, -row)
+                residual[row] -= v * x
+    return csc_matrix((data, (basis_rows, basis_cols)),
+                      shape=(n, len(free)))
+
+
+def _eliminate(A, tol, threshold):
+    """Reduce a sparse matrix to upper triangular form.
+
+    Returns the reduced rows as dictionaries {column: value} and the
+    (row, column) positions of the pivots in elimination order.
+    """
+    m, n = A.shape
+    rows = [dict(zip(A.indices[A.indptr[i]:A.indptr[i + 1]],
+                     A.data[A.indptr[i]:A.indptr[i + 1]]))
+            for i in range(m)]
+    columns = [set() for _ in range(n)]
+    for i, row in enumerate(rows):
+        for j in row:
+            columns[j].add(i)
+    eliminated = np.zeros(n, dtype=bool)
+    # columns with the fewest entries first, outdated counts are skipped
+    queue = [(len(c), j) for j, c in enumerate(columns) if c]
+    heapq.heapify(queue)
+    pivots = []
+    while queue:
+        count, col = heapq.heappop(queue)
+        if eliminated[col] or count != len(columns[col]) or count == 0:
+            continue
+        largest = max(abs(rows[i][col]) for i in columns[col])
+        if largest < tol:
+            for i in columns[col]:
+                del rows[i][col]
+            columns[col].clear()
+            continue
+        pivot = min((i for i in columns[col]
+                     if abs(rows[i][col]) >= threshold * largest),
+                    key=lambda i: len(rows[i]))
+        pivot_row = rows[pivot]
+        eliminated[col] = True
+        pivots.append((pivot, col))
+        for j in pivot_row:
+            columns[j].discard(pivot)
+        for i in list(columns[col]):
+            row = rows[i]
+            factor = row.pop(col) / pivot_row[col]
+            for j, value in iteritems(pivot_row):
+                if j == col:
+                    continue
+                value = row.get(j, 0.0) - factor * value
+                if abs(value) >= tol:
+                    if j not in row:
+                        columns[j].add(i)
+                    row[j] = value
+                elif j in row:
+                    del row[j]
+                    columns[j].discard(i)
+        columns[col].clear()
+        for j in pivot_row:
+            if not eliminated[j]:
+                heapq.heappush(queue, (len(columns[j]), j))
+    return rows, pivots
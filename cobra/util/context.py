@@ -2,14 +2,26 @@
 
 from __future__ import absolute_import
 
+from array import array
 from functools import partial
 
+import numpy as np
+from six import string_types
+
+_BOUND_ATTRIBUTES = frozenset(["lower_bound", "upper_bound", "bounds"])
+
 
 class HistoryManager(object):
     """Record a list of actions to be taken at a later time. Used to
     implement context managers that allow temporary changes to a
     :class:`~cobra.core.Model`.
 
+    Arbitrary actions are recorded as functions. The common operations,
+    changes of reaction bounds, of the objective and adding or removing
+    variables and constraints, are recorded in typed undo logs instead.
+    Consecutive changes of the same type share a log which is reverted in
+    a single update of the solver.
+
     """
 
     def __init__(self):
@@ -29,6 +41,79 @@ class HistoryManager(object):
 
         self._history.append(operation)
 
+    def _log(self, log_type, model, *key):
+        """Get the undo log on top of the stack or start a new one"""
+        try:
+            log = self._history[-1]
+        except IndexError:
+            log = None
+        if log.__class__ is not log_type or log.model is not model or \
+                log.key != key:
+            log = log_type(model, *key)
+            self._history.append(log)
+        return log
+
+    def record_bounds(self, reaction, lower_bound, upper_bound):
+        """Record the bounds of a reaction to be restored on reset.
+
+        Parameters
+        ----------
+        reaction : cobra.Reaction
+            The reaction whose bounds are changed.
+        lower_bound, upper_bound : float
+            The bounds prior to the change.
+        """
+        self._log(_BoundLog, reaction.model).append(
+            reaction, lower_bound, upper_bound)
+
+    def records_objective(self, model):
+        """Whether the objective of a model is already restored by the most
+        recent entry, in which case later changes need no record."""
+        return bool(self._history) and \
+            self._history[-1].__class__ is _ObjectiveLog and \
+            self._history[-1].model is model
+
+    def record_objective(self, model, objective):
+        """Record an objective to be restored on reset.
+
+        Parameters
+        ----------
+        model : cobra.Model
+            The model whose objective is changed.
+        objective : optlang.interface.Objective
+            The objective prior to the change.
+        """
+        if not self.records_objective(model):
+            self._history.append(_ObjectiveLog(model, objective))
+
+    def record_objective_coefficients(self, model, coefficients):
+        """Record linear objective coefficients to be restored on reset.
+
+        Parameters
+        ----------
+        model : cobra.Model
+            The model whose objective is changed.
+        coefficients : dict
+            The coefficients of the solver variables prior to the change.
+        """
+        if not self.records_objective(model):
+            self._log(_CoefficientLog, model).extend(coefficients)
+
+    def record_problem_change(self, model, method, what):
+        """Record variables and constraints to be added or removed on reset.
+
+        Parameters
+        ----------
+        model : cobra.Model
+            The model whose solver is changed.
+        method : string
+            Either "add" or "remove", the solver method reverting the
+            change.
+        what : list or tuple of optlang variables or constraints
+            The variables and constraints to add or remove.
+        """
+        self._log(_ProblemLog, model, method).append(what)
+
     def reset(self):
         """Trigger executions for all items in the stack in reverse order"""
         while self._history:
@@ -36,6 +121,111 @@ class HistoryManager(object):
             entry()
 
 
+class _BoundLog(object):
+    """Undo log of reaction bounds.
+
+    The bounds prior to each change are stored in arrays and restored in a
+    single vectorized update. If a reaction was changed several times, the
+    bounds prior to its first change are restored.
+    """
+
+    __slots__ = ("model", "key", "reactions", "lower_bounds", "upper_bounds")
+
+    def __init__(self, model):
+        self.model = model
+        self.key = ()
+        self.reactions = []
+        self.lower_bounds = array("d")
+        self.upper_bounds = array("d")
+
+    def __len__(self):
+        return len(self.reactions)
+
+    def append(self, reaction, lower_bound, upper_bound):
+        self.reactions.append(reaction)
+        self.lower_bounds.append(lower_bound)
+        self.upper_bounds.append(upper_bound)
+
+    def __call__(self):
+        from cobra.util.solver import update_variable_bounds
+        # the first recorded index of each reaction wins
+        first = {}
+        for i in range(len(self.reactions) - 1, -1, -1):
+            first[self.reactions[i]] = i
+        index = np.fromiter(first.values(), dtype=int, count=len(first))
+        lower = np.frombuffer(self.lower_bounds)[index].tolist()
+        upper = np.frombuffer(self.upper_bounds)[index].tolist()
+        reactions = list(first)
+        for rxn, lb, ub in zip(reactions, lower, upper):
+            rxn._lower_bound, rxn._upper_bound = lb, ub
+        update_variable_bounds([rxn for rxn in reactions
+                                if rxn.model is self.model])
+
+
+class _ObjectiveLog(object):
+    """Undo log of the objective of a model."""
+
+    __slots__ = ("model", "key", "objective")
+
+    def __init__(self, model, objective):
+        self.model = model
+        self.key = ()
+        self.objective = objective
+
+    def __call__(self):
+        self.model.solver.objective = self.objective
+        self.model.solver.objective.direction = self.objective.direction
+
+
+class _CoefficientLog(object):
+    """Undo log of linear objective coefficients, restored in a single
+    update of the objective. If a variable was changed several times, the
+    coefficient prior to its first change is restored."""
+
+    __slots__ = ("model", "key", "variables", "coefficients")
+
+    def __init__(self, model):
+        self.model = model
+        self.key = ()
+        self.variables = []
+        self.coefficients = array("d")
+
+    def extend(self, coefficients):
+        self.variables.extend(coefficients)
+        self.coefficients.extend(coefficients.values())
+
+    def __call__(self):
+        variables, coefficients = self.variables, self.coefficients
+        first = {}
+        for i in range(len(variables) - 1, -1, -1):
+            first[variables[i]] = coefficients[i]
+        self.model.solver.objective.set_linear_coefficients(first)
+
+
+class _ProblemLog(object):
+    """Undo log of variables and constraints added to or removed from the
+    solver, reverted by a single call of the solver's add or remove."""
+
+    __slots__ = ("model", "key", "entries")
+
+    def __init__(self, model, method):
+        self.model = model
+        self.key = (method,)
+        self.entries = []
+
+    def append(self, what):
+        # the solver also accepts a single variable, constraint or name
+        if isinstance(what, string_types) or not hasattr(what, "__iter__"):
+            what = (what,)
+        self.entries.append(what)
+
+    def __call__(self):
+        from cobra.util.solver import _change_problem
+        what = [item for entry in reversed(self.entries) for item in entry]
+        _change_problem(self.model, getattr(self.model.solver, self.key[0]),
+                        what)
+
+
 def get_context(obj):
     """Search for a context manager"""
     try:
@@ -51,6 +241,21 @@ def get_context(obj):
     return None
 
 
+def get_batch(obj):
+    """Search for an active batch edit (see `Model.batch_edit`)"""
+    try:
+        return obj._batch
+    except AttributeError:
+        pass
+
+    try:
+        return obj._model._batch
+    except AttributeError:
+        pass
+
+    return None
+
+
 def resettable(f):
     """A decorator to simplify the context management of simple object
     attributes. Gets the value of the attribute prior to setting it, and stores
@@ -64,7 +269,15 @@ def resettable(f):
             # Don't clutter the context with unchanged variables
             if old_value == new_value:
                 return
-            context(partial(f, self, old_value))
+            # An active batch edit records a single undo entry on exit
+            batch = get_batch(self)
+            if batch is None or not batch.record(self, f.__name__, context):
+                if f.__name__ in _BOUND_ATTRIBUTES:
+                    # Typed undo log for the most common change
+                    context.record_bounds(self, self._lower_bound,
+                                          self._upper_bound)
+                else:
+                    context(partial(f, self, old_value))
 
         f(self, new_value)
 
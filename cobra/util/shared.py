@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+"""Numpy arrays which can be attached to by worker processes without
+copying their content."""
+
+from __future__ import absolute_import
+
+import ctypes
+import os
+from multiprocessing.sharedctypes import RawArray
+from tempfile import mkstemp
+
+import numpy as np
+
+try:
+    from multiprocessing.context import get_spawning_popen
+except ImportError:  # Python 2
+    from multiprocessing.forking import Popen
+
+    def _spawning():
+        return Popen.thread_is_spawning()
+else:
+    def _spawning():
+        return get_spawning_popen() is not None
+
+
+class SharedArray(object):
+    """A numpy array stored in memory shared between processes.
+
+    The data lives either in a `multiprocessing` shared buffer or in a
+    temporary memory-mapped file. Pickling a `SharedArray` only transfers a
+    handle to that memory and the unpickled object attaches to it without
+    copying. Shared buffers can only be passed to child processes on their
+    creation, e.g. as `initargs` of a `multiprocessing.Pool`, and are copied
+    when pickled otherwise. Memory-mapped files can be passed to any process
+    on the same machine.
+
+    Parameters
+    ----------
+    array : array-like
+        The data to place in shared memory.
+    memmap : bool, optional
+        Whether to store the data in a memory-mapped file instead of a
+        shared buffer. The file belongs to this object and is removed by
+        `close` or when the object is garbage collected.
+    dir : str, optional
+        The directory of the memory-mapped file. Defaults to the directory
+        for temporary files.
+
+    Attributes
+    ----------
+    array : numpy.ndarray
+        A view on the shared data. Changes to it are visible in all
+        processes attached to the same memory.
+    filename : str
+        The memory-mapped file or None for shared buffers.
+    """
+
+    def __init__(self, array, memmap=False, dir=None):
+        array = np.ascontiguousarray(array)
+        self.shape = array.shape
+        self.dtype = array.dtype
+        self.filename = None
+        self._buffer = None
+        self._owner = memmap
+        if memmap:
+            handle, self.filename = mkstemp(suffix=".dat", dir=dir)
+            os.close(handle)
+            np.memmap(self.filename, dtype=self.dtype, mode="w+",
+                      shape=max(array.size, 1)).flush()
+        else:
+            self._buffer = RawArray(ctypes.c_char, max(array.nbytes, 1))
+        self._attach()
+        self.array[...] = array
+
+    def _attach(self):
+        if self.filename is None:
+            data = np.frombuffer(self._buffer, dtype=self.dtype,
+                                 count=int(np.prod(self.shape)))
+        else:
+            data = np.memmap(self.filename, dtype=self.dtype, mode="r+")
+            data = data[:int(np.prod(self.shape))]
+        self.array = data.reshape(self.shape)
+
+    def close(self):
+        """Release the shared memory.
+
+        Removes the memory-mapped file if this object created it. The data
+        stays available in `array` as a private copy.
+        """
+        self.array = np.array(self.array)
+        self._buffer = None
+        if self._owner and self.filename is not None:
+            try:
+                os.remove(self.filename)
+            except OSError:
+                pass
+        self._owner = False
+        self.filename = None
+
+    def __del__(self):
+        if getattr(self, "_owner", False):
+            self.close()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_owner"] = False
+        if self._buffer is not None and not _spawning():
+            # shared buffers can not be passed to an existing process
+            state["_buffer"] = None
+        else:
+            del state["array"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "array" not in state:
+            self._attach()
+
+
+def share_arrays(obj, names, memmap=False, dir=None):
+    """Move array attributes of an object into shared memory.
+
+    Replaces each attribute by a view on a `SharedArray`. The shared arrays
+    are kept in the `_shared` dictionary of the object and are only created
+    again if an attribute was reassigned since the last call, so repeated
+    calls do not copy the data.
+
+    Parameters
+    ----------
+    obj : object
+        The object owning the arrays.
+    names : iterable of str
+        The names of the array attributes.
+    memmap : bool, optional
+        Whether to use temporary memory-mapped files instead of shared
+        buffers.
+    dir : str, optional
+        The directory of the memory-mapped files.
+
+    Returns
+    -------
+    dict
+        The `_shared` dictionary of the object mapping attribute names to
+        shared arrays.
+    """
+    shared = obj.__dict__.setdefault("_shared", {})
+    for name in names:
+        array = getattr(obj, name)
+        if array is None:
+            if name in shared:
+                shared.pop(name).close()
+            continue
+        if name not in shared or shared[name].array is not array:
+            if name in shared:
+                shared[name].close()
+            shared[name] = SharedArray(array, memmap, dir)
+            setattr(obj, name, shared[name].array)
+    return shared
+
+
+def attach_arrays(obj, state):
+    """Restore the state of an object with arrays in shared memory.
+
+    Counterpart to `share_arrays` to be called in `__setstate__`. The array
+    attributes are set to views on the shared arrays from `state`.
+
+    Parameters
+    ----------
+    obj : object
+        The object being unpickled.
+    state : dict
+        The pickled state including a `_shared` dictionary.
+    """
+    obj.__dict__.update(state)
+    for name, array in state.get("_shared", {}).items():
+        setattr(obj, name, array.array)
+
+
+def detach_arrays(obj):
+    """Get the state of an object without copies of its shared arrays.
+
+    Counterpart to `share_arrays` to be called in `__getstate__`.
+
+    Parameters
+    ----------
+    obj : object
+        The object being pickled.
+
+    Returns
+    -------
+    dict
+        The state of the object without the attributes stored in shared
+        memory.
+    """
+    state = dict(obj.__dict__)
+    for name in state.get("_shared", {}):
+        del state[name]
+    return state
+
+
+def unshare_arrays(obj):
+    """Move the shared array attributes of an object back to private memory.
+
+    Counterpart to `share_arrays` once the arrays are no longer needed by
+    other processes. The shared memory is released and memory-mapped files
+    are removed.
+
+    Parameters
+    ----------
+    obj : object
+        The object owning the arrays.
+    """
+    for name, array in obj.__dict__.pop("_shared", {}).items():
+        array.close()
+        setattr(obj, name, array.array)
@@ -13,10 +13,10 @@ allow you to implement custom flux analysis methods with ease.
 from __future__ import absolute_import
 
 import re
-from functools import partial
 from types import ModuleType
 from warnings import warn
 
+import numpy as np
 import optlang
 import sympy
 
@@ -114,25 +114,34 @@ def set_objective(model, value, additive=False):
         an empty objective.
     """
     interface = model.problem
-    reverse_value = model.solver.objective.expression
-    reverse_value = interface.Objective(
-        reverse_value, direction=model.solver.objective.direction,
-        sloppy=True)
+    if isinstance(value, dict) and not model.objective.is_Linear:
+        raise ValueError('can only update non-linear objectives '
+                         'additively using object of class '
+                         'model.problem.Objective, not %s' %
+                         type(value))
+
+    # Only the objective prior to a run of changes needs to be restored and
+    # only the changed coefficients if they are added to a linear objective
+    context = get_context(model)
+    if context and additive and isinstance(value, dict):
+        variables = [variable for reaction in value for variable in
+                     (reaction.forward_variable, reaction.reverse_variable)]
+        context.record_objective_coefficients(
+            model, model.solver.objective.get_linear_coefficients(variables))
+    elif context and not context.records_objective(model):
+        context.record_objective(model, interface.Objective(
+            model.solver.objective.expression,
+            direction=model.solver.objective.direction, sloppy=True))
 
     if isinstance(value, dict):
-        if not model.objective.is_Linear:
-            raise ValueError('can only update non-linear objectives '
-                             'additively using object of class '
-                             'model.problem.Objective, not %s' %
-                             type(value))
-
         if not additive:
             model.solver.objective = interface.Objective(
                 sympy.S.Zero, direction=model.solver.objective.direction)
+        coefficients = {}
         for reaction, coef in value.items():
-            model.solver.objective.set_linear_coefficients(
-                {reaction.forward_variable: coef,
-                 reaction.reverse_variable: -coef})
+            coefficients[reaction.forward_variable] = coef
+            coefficients[reaction.reverse_variable] = -coef
+        model.solver.objective.set_linear_coefficients(coefficients)
 
     elif isinstance(value, (sympy.Basic, optlang.interface.Objective)):
         if isinstance(value, sympy.Basic):
@@ -152,14 +161,6 @@ def set_objective(model, value, additive=False):
         raise TypeError(
             '%r is not a valid objective for %r.' % (value, model.solver))
 
-    context = get_context(model)
-    if context:
-        def reset():
-            model.solver.objective = reverse_value
-            model.solver.objective.direction = reverse_value.direction
-
-        context(reset)
-
 
 def interface_to_str(interface):
     """Give a string representation for an optlang interface.
@@ -293,9 +294,9 @@ def add_cons_vars_to_problem(model, what, **kwargs):
     """
     context = get_context(model)
 
-    model.solver.add(what, **kwargs)
+    _change_problem(model, model.solver.add, what, **kwargs)
     if context:
-        context(partial(model.solver.remove, what))
+        context.record_problem_change(model, "remove", what)
 
 
 def remove_cons_vars_from_problem(model, what):
@@ -315,9 +316,18 @@ def remove_cons_vars_from_problem(model, what):
     """
     context = get_context(model)
 
-    model.solver.remove(what)
+    _change_problem(model, model.solver.remove, what)
     if context:
-        context(partial(model.solver.add, what))
+        context.record_problem_change(model, "add", what)
+
+
+def _change_problem(model, method, what, **kwargs):
+    """Add or remove variables and constraints and invalidate the cached
+    solver positions used by `cobra.core.solution.get_solution` as well as
+    the cached stoichiometric matrix."""
+    model._solution_cache = None
+    model._stoichiometry = None
+    method(what, **kwargs)
 
 
 def add_absolute_expression(model, expression, name="abs_var", ub=None):
@@ -400,4 +410,119 @@ def check_solver_status(status):
         raise OptimizationError("solver status is '{}'".format(status))
 
 
+class BatchEdit(object):
+    """Buffer changes to reaction bounds and objective coefficients.
+
+    Inside the batch, setting `Reaction.lower_bound`, `upper_bound` or
+    `bounds` only updates the reaction itself and assigning
+    `Reaction.objective_coefficient` is buffered. On exit, all buffered
+    changes are pushed to the solver in one vectorized update and, if the
+    model is used as a context, a single entry reverting all bound changes
+    is added to the history. Use via `Model.batch_edit`.
+
+    Parameters
+    ----------
+    model : cobra.Model
+        The model to edit.
+
+    Notes
+    -----
+    The solver is only synchronized when leaving the batch, so the model
+    should not be optimized within it.
+    """
+
+    _bound_attributes = frozenset(["lower_bound", "upper_bound", "bounds"])
+
+    def __init__(self, model):
+        self.model = model
+        self._active = False
+        self._context = None
+        self._pending_bounds = {}
+        self._original_bounds = {}
+        self._objective = {}
+
+    def __enter__(self):
+        if getattr(self.model, "_batch", None) is None:
+            self._active = True
+            self._context = get_context(self.model)
+            self.model._batch = self
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if not self._active:
+            return
+        self._active = False
+        self.model._batch = None
+        self.flush()
+
+    def record(self, obj, attribute, context):
+        """Remember the original bounds of a reaction for a single undo.
+
+        Returns True if the batch takes care of reverting the change, in
+        which case no individual history entry needs to be recorded.
+        """
+        if attribute not in self._bound_attributes or \
+                context is not self._context:
+            return False
+        if obj not in self._original_bounds:
+            self._original_bounds[obj] = (obj._lower_bound, obj._upper_bound)
+        return True
+
+    def add_bounds(self, reaction):
+        """Mark the bounds of a reaction for synchronization on exit."""
+        self._pending_bounds[reaction] = True
+
+    def set_objective_coefficient(self, reaction, value):
+        """Buffer a new objective coefficient for a reaction."""
+        self._objective[reaction] = value
+
+    def get_objective_coefficient(self, reaction, default=None):
+        """Get a buffered objective coefficient."""
+        return self._objective.get(reaction, default)
+
+    def flush(self):
+        """Push all buffered changes to the solver."""
+        model = self.model
+        reactions = [rxn for rxn in self._pending_bounds
+                     if rxn.model is model]
+        update_variable_bounds(reactions)
+        if self._context is not None and self._original_bounds:
+            for rxn, (lb, ub) in self._original_bounds.items():
+                self._context.record_bounds(rxn, lb, ub)
+        if self._objective:
+            set_objective(model, {rxn: coef for rxn, coef in
+                                  self._objective.items()
+                                  if rxn.model is model}, additive=True)
+        self._pending_bounds = {}
+        self._original_bounds = {}
+        self._objective = {}
+
+
+def update_variable_bounds(reactions):
+    """Set the forward and reverse variable bounds of many reactions.
+
+    Vectorized equivalent of calling
+    `cobra.core.reaction.update_forward_and_reverse_bounds` for each
+    reaction.
+
+    Parameters
+    ----------
+    reactions : list of cobra.Reaction
+        Reactions that are part of the same model.
+    """
+    if len(reactions) == 0:
+        return
+    bounds = np.array([(rxn._lower_bound, rxn._upper_bound)
+                       for rxn in reactions], dtype=float)
+    lower, upper = bounds[:, 0], bounds[:, 1]
+    zero = np.zeros(len(reactions))
+    forward_lb = np.maximum(lower, zero).tolist()
+    forward_ub = np.maximum(upper, zero).tolist()
+    reverse_lb = np.maximum(-upper, zero).tolist()
+    reverse_ub = np.maximum(-lower, zero).tolist()
+    for i, rxn in enumerate(reactions):
+        rxn.forward_variable.set_bounds(forward_lb[i], forward_ub[i])
+        rxn.reverse_variable.set_bounds(reverse_lb[i], reverse_ub[i])
+
+
 import cobra.solvers as legacy_solvers  # noqa